@@ -2,17 +2,50 @@ from flask import Flask
 from models import db
 from routes.repo_routes import repo_bp
 from routes.issue_routes import issue_bp
+from migrations import init_db_command, upgrade_db_command
+from tree_store import pack_trees_command
+from counters import repair_counters_command
+from branch_heads import rebuild_branch_heads_command
+from commit_graph import rebuild_commit_graph_command
+from lru import LRUCache
+from cache import create_cache
+from compression import init_compression
+from config import Config
+from json_provider import json_provider_class
+from database import configure_engines, engine_options, create_replica_engine, mark_sticky
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///bithub.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.from_object(Config)
+    app.config.from_prefixed_env('BITHUB')
+    # Overrides must be applied before db.init_app, which creates the engine
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.json = json_provider_class(app.config['JSON_PROVIDER'])(app)
 
     db.init_app(app)
+    app.extensions['replica_engine'] = create_replica_engine(app)
+    configure_engines(app, db)
+    app.extensions['tree_cache'] = LRUCache(app.config['TREE_CACHE_MAX_BYTES'])
+    app.extensions['commit_graphs'] = LRUCache(app.config['COMMIT_GRAPH_CACHE_MAX_BYTES'])
+    app.extensions['response_cache'] = create_cache(app)
+
+    app.after_request(mark_sticky)
+    init_compression(app)
 
     app.register_blueprint(repo_bp)
     app.register_blueprint(issue_bp)
 
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(pack_trees_command)
+    app.cli.add_command(repair_counters_command)
+    app.cli.add_command(rebuild_branch_heads_command)
+    app.cli.add_command(rebuild_commit_graph_command)
+
     return app
 
 # if __name__ == '__main__':
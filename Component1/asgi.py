@@ -0,0 +1,86 @@
+"""ASGI entry point for the REST app.
+
+    pip install asgiref uvicorn aiosqlite
+    uvicorn --factory asgi:create_asgi_app --workers 4
+
+The blueprints, responses and configuration are the ones ``create_app``
+builds for WSGI. The event loop accepts and holds connections (slow clients,
+keep-alive, streamed NDJSON) without tying up a thread each.
+
+GET and HEAD requests run on the event loop itself when ASGI_ASYNC_READS is
+on and every database has an async driver (see ``create_async_engines``).
+The route handlers are unchanged: each request runs in a greenlet, and its
+session's queries go through the async driver, so while one request waits for
+the database the loop serves others. At most ASGI_THREADS of them run at
+once; more in flight only share the loop's time more thinly and stretch the
+slowest responses (see benchmarks/bench_load.py). Requests
+that write run synchronously on threads, at most ASGI_THREADS at a time,
+with the synchronous engines.
+asgiref's own ``WsgiToAsgi`` would run every request on one shared thread;
+entering a ``ThreadSensitiveContext`` per request gives each one a thread of
+its own.
+"""
+import asyncio
+
+try:
+    from asgiref.sync import ThreadSensitiveContext
+    from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+except ImportError:
+    raise RuntimeError("The ASGI entry point needs the asgiref package: pip install asgiref")
+from sqlalchemy.util import await_only, greenlet_spawn
+
+from app import create_app
+from database import EVENT_LOOP_KEY, READ_METHODS, create_async_engines
+from models import db
+
+class EventLoopWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """WsgiToAsgiInstance running the WSGI app in a greenlet on the event loop rather than on a thread."""
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await super().__call__(scope, receive, send)
+
+    def build_environ(self, scope, body):
+        environ = super().build_environ(scope, body)
+        environ[EVENT_LOOP_KEY] = True
+        return environ
+
+    async def run_wsgi_app(self, body):
+        # The threaded version's body, sending from the greenlet instead
+        self.sync_send = lambda message: await_only(self.send(message))
+        await greenlet_spawn(WsgiToAsgiInstance.run_wsgi_app.__wrapped__, self, body)
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running up to ``max_threads`` requests concurrently, with lifespan support.
+
+    With ``async_reads``, GET and HEAD requests run on the event loop instead,
+    also at most ``max_threads`` at a time; the app's ``async_engines`` must
+    have been created.
+    """
+    def __init__(self, wsgi_application, max_threads, async_reads=False):
+        super().__init__(wsgi_application)
+        self.threads = asyncio.Semaphore(max_threads)
+        self.async_reads = async_reads
+        self.reads = asyncio.Semaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    for engine in self.wsgi_application.extensions.get('async_engines', {}).values():
+                        await engine.dispose()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if self.async_reads and scope['type'] == 'http' and scope['method'] in READ_METHODS:
+            async with self.reads:
+                await EventLoopWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+            return
+        async with self.threads, ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+def create_asgi_app(config=None):
+    flask_app = create_app(config)
+    async_reads = flask_app.config['ASGI_ASYNC_READS'] and create_async_engines(flask_app, db)
+    return PooledWsgiToAsgi(flask_app, flask_app.config['ASGI_THREADS'], async_reads)
@@ -0,0 +1,87 @@
+"""Merge-base and compare walks on a synthetic history of N commits.
+
+Usage: python benchmarks/bench_commit_graph.py [--commits 1000000] [--branches 20] [--queries 1000]
+
+The history has a main line and `--branches` topic branches that fork from
+main, take a few commits and merge back, like a busy repository. Queries pair
+recent commits at most D commits apart: a walk visits roughly the commits
+between the two, so its cost follows the distance, not the history size. One
+worst case walks the whole history. Last, the graph without its newest 100
+commits is extended with them, as a cached graph is when they are pushed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from commit_graph import CommitGraph
+
+def history(n, branches, rng):
+    """(id, generation) and (commit id, parent id) rows; ids start at 1."""
+    edges = []
+    main = 1
+    tips = {}
+    for commit in range(2, n + 1):
+        branch = rng.randrange(branches + 1)
+        if branch == 0 or branch not in tips:
+            if branch and rng.random() < 0.5:
+                tips[branch] = main  # fork from main
+            edges.append((commit, main))
+            main = commit
+        elif rng.random() < 0.1:
+            # merge the topic branch into main
+            edges += [(commit, main), (commit, tips.pop(branch))]
+            main = commit
+        else:
+            edges.append((commit, tips[branch]))
+            tips[branch] = commit
+    return [(commit, None) for commit in range(1, n + 1)], edges, main
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[int(len(samples) * p / 100)] * 1e6 for p in (50, 90, 99)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commits", type=int, default=1_000_000)
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    commits, edges, tip = history(args.commits, args.branches, rng)
+    start = time.perf_counter()
+    graph = CommitGraph.from_rows(commits, edges)
+    print(f"{len(graph)} commits, {len(edges)} parent edges: built in {time.perf_counter() - start:.1f}s, "
+          f"{graph.size / 2**20:.1f} MiB")
+
+    print(f"{'walk':>12} {'D':>7} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9}")
+    for distance in (100, 1000, 10_000):
+        heads = [rng.randrange(len(graph) - args.commits // 100, len(graph)) for _ in range(args.queries)]
+        pairs = [(head, head - rng.randrange(distance)) for head in heads]
+        for name, walk in (("merge-base", graph.merge_bases), ("compare", graph.only)):
+            samples = []
+            for a, b in pairs:
+                start = time.perf_counter()
+                walk(a, b)
+                samples.append(time.perf_counter() - start)
+            print(f"{name:>12} {distance:>7} " + " ".join(f"{value:>9.0f}" for value in percentiles(samples)))
+
+    start = time.perf_counter()
+    ahead = graph.only(graph.index(tip), 0)
+    print(f"root...tip: {len(ahead)} commits ahead in {time.perf_counter() - start:.2f}s")
+
+    # What a worker's cached graph pays for commits pushed since it was built
+    new = 100
+    older = CommitGraph.from_rows(commits[:-new], [edge for edge in edges if edge[0] <= len(commits) - new])
+    rows = [(commit_id, graph.generations[commit_id - 1]) for commit_id, _ in commits[-new:]]
+    new_edges = [edge for edge in edges if edge[0] > len(commits) - new]
+    start = time.perf_counter()
+    older.extended(rows, new_edges)
+    print(f"{new} new commits added to the graph in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+if __name__ == '__main__':
+    main()
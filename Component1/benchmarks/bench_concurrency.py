@@ -0,0 +1,85 @@
+"""Throughput of concurrent issue reads and comment writes against a SQLite file,
+with the default rollback journal (before) and with WAL tuning (after).
+
+Usage: python benchmarks/bench_concurrency.py [--threads 8] [--seconds 5] [--write-ratio 0.2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from models import db, Repository, Issue, Comment
+
+N_ISSUES = 200
+
+def seed(app):
+    with app.app_context():
+        db.create_all()
+        db.session.add(Repository(name="Bench Repo", author_id=1))
+        db.session.flush()
+        db.session.add_all(Issue(repository_id=1, title=f"Issue {i}", description="x" * 200, status="Open", submitter_id=1)
+                           for i in range(N_ISSUES))
+        db.session.flush()
+        db.session.add_all(Comment(issue_id=1 + i % N_ISSUES, content="seed comment") for i in range(N_ISSUES * 5))
+        db.session.commit()
+
+def worker(app, deadline, write_ratio, results, seed_value):
+    client = app.test_client()
+    rng = random.Random(seed_value)
+    reads = writes = errors = 0
+    while time.perf_counter() < deadline:
+        issue_id = rng.randint(1, N_ISSUES)
+        if rng.random() < write_ratio:
+            response = client.post(f"/repositories/1/issues/{issue_id}/comments", json={"content": "benchmark comment"})
+            ok = response.status_code == 201
+            writes += ok
+        else:
+            response = client.get(f"/repositories/1/issues/{issue_id}/comments?limit=20")
+            ok = response.status_code == 200
+            reads += ok
+        errors += not ok
+    results.append((reads, writes, errors))
+
+def run(tuned, threads, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            "SQLITE_TUNING": tuned,
+            # One connection per thread, so no thread waits on the pool
+            "DB_POOL_SIZE": threads,
+        })
+        seed(app)
+        results = []
+        deadline = time.perf_counter() + seconds
+        workers = [threading.Thread(target=worker, args=(app, deadline, write_ratio, results, i)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+
+    reads, writes, errors = (sum(column) for column in zip(*results))
+    return reads / seconds, writes / seconds, errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes")
+    print(f"{'mode':>20} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+    for label, tuned in (("rollback journal", False), ("WAL + tuning", True)):
+        reads, writes, errors = run(tuned, args.threads, args.seconds, args.write_ratio)
+        print(f"{label:>20} {reads:>10.0f} {writes:>10.0f} {errors:>8}")
+
+if __name__ == '__main__':
+    main()
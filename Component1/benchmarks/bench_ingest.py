@@ -0,0 +1,73 @@
+"""Compare issue ingestion through the single-row route and the :batch route.
+
+Usage: python benchmarks/bench_ingest.py [--rows 5000] [--batch-size 1000] [--ndjson]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from models import db, Repository
+
+
+def new_app(tmp, name, batch_size):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, name)}",
+        "BATCH_MAX_ITEMS": batch_size,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(Repository(name="Bench Repo", author_id=1))
+        db.session.commit()
+    return app
+
+
+def issues(n):
+    return [{"title": f"Imported {i}", "description": "x" * 200, "submitter_id": i % 50} for i in range(n)]
+
+
+def single_rows(client, rows):
+    start = time.perf_counter()
+    for row in rows:
+        assert client.post("/repositories/1/issues", json=row).status_code == 201
+    return time.perf_counter() - start
+
+
+def batches(client, rows, batch_size, ndjson):
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        chunk = rows[offset:offset + batch_size]
+        if ndjson:
+            body = "\n".join(json.dumps(row) for row in chunk)
+            response = client.post("/repositories/1/issues:batch", data=body, content_type="application/x-ndjson")
+        else:
+            response = client.post("/repositories/1/issues:batch", json=chunk)
+        assert response.status_code == 201
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--ndjson", action="store_true", help="Send batches as NDJSON instead of a JSON array")
+    args = parser.parse_args()
+
+    rows = issues(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        single = single_rows(new_app(tmp, "single.db", args.batch_size).test_client(), rows)
+        batch = batches(new_app(tmp, "batch.db", args.batch_size).test_client(), rows, args.batch_size, args.ndjson)
+
+    print(f"{args.rows} issues, batches of {args.batch_size}")
+    print(f"{'path':>8} {'seconds':>9} {'rows/s':>10}")
+    print(f"{'single':>8} {single:>9.2f} {args.rows / single:>10.0f}")
+    print(f"{'batch':>8} {batch:>9.2f} {args.rows / batch:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
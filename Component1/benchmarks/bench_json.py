@@ -0,0 +1,75 @@
+"""Time JSON serialization of a large commit list and a deep tree with each provider.
+
+Usage: python benchmarks/bench_json.py [--commits 100000] [--depth 6] [--fanout 6] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from json_provider import PROVIDERS, orjson
+
+
+def commits(n, native):
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        created_at = start + timedelta(seconds=i)
+        rows.append({
+            "commit id": i,
+            "hash": f"{i:040x}",
+            "message": f"Commit number {i}",
+            "created_at": created_at if native else created_at.isoformat(sep=' ', timespec='seconds'),
+        })
+    return rows
+
+
+def tree(depth, fanout):
+    if depth == 0:
+        return {"content": "x" * 64, "size": 64}
+    return {"children": {f"entry{i}": tree(depth - 1, fanout) for i in range(fanout)}}
+
+
+def timed(func, repeat):
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commits", type=int, default=100000)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = {
+        "commits (formatted)": commits(args.commits, native=False),
+        "commits (datetime)": commits(args.commits, native=True),
+        "tree": tree(args.depth, args.fanout),
+    }
+    names = [name for name in PROVIDERS if name != 'orjson' or orjson is not None]
+
+    print(f"{args.commits} commits; tree of depth {args.depth}, fanout {args.fanout}; ms per response")
+    print(f"{'payload':>20}" + "".join(f"{name:>10}" for name in names))
+    for label, payload in payloads.items():
+        times = []
+        for name in names:
+            app = Flask(__name__)
+            app.json = PROVIDERS[name](app)
+            with app.app_context():
+                times.append(timed(lambda: app.json.response(payload), args.repeat))
+        print(f"{label:>20}" + "".join(f"{ms:>10.1f}" for ms in times))
+    if orjson is None:
+        print("orjson is not installed; pip install orjson to compare")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Latency percentiles under concurrent load, served through WSGI (threaded
+werkzeug server) and through the ASGI entry point (uvicorn), with reads on
+the event loop (async) or on threads (async-threads, ASGI_ASYNC_READS off).
+
+Usage: python benchmarks/bench_load.py [--concurrency 200] [--requests 5000] [--modes sync,async-threads,async]
+
+The async modes need `pip install asgiref uvicorn aiosqlite` and are skipped otherwise.
+Each mode runs in its own server process against the same seeded SQLite file;
+the client keeps `--concurrency` requests in flight over fresh connections and
+reports p50/p90/p99/max latency and throughput.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from models import db, Repository, Branch, Commit, Issue
+
+N_COMMITS = 2000
+N_ISSUES = 500
+
+PATHS = [
+    "/repositories/1/branches/main/commits?limit=50",
+    "/repositories/1/issues?page=1&size=20",
+    "/repositories/1/issues/{n}",
+    "/repositories/1/branches",
+]
+
+def seed(uri):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri})
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Repository(name="Bench Repo", author_id=1), Branch(name="main", repository_id=1)])
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        db.session.add_all(Commit(hash=f"{i:040x}", message=f"Commit {i}", branch_id=1, created_at=start + timedelta(minutes=i))
+                           for i in range(N_COMMITS))
+        db.session.add_all(Issue(repository_id=1, title=f"Issue {i}", description="x" * 200, status="Open", submitter_id=1)
+                           for i in range(N_ISSUES))
+        db.session.commit()
+        db.engine.dispose()
+
+def serve(mode, uri, port, threads):
+    config = {"SQLALCHEMY_DATABASE_URI": uri, "DB_POOL_SIZE": threads, "ASGI_THREADS": threads,
+              "ASGI_ASYNC_READS": mode == "async"}
+    if mode == "sync":
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        make_server("127.0.0.1", port, create_app(config), threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(config), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+def async_available():
+    try:
+        import aiosqlite, asgiref, uvicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(port, timeout=15):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+async def load(port, concurrency, total):
+    latencies, errors = [], 0
+    next_request = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        for n in next_request:
+            path = PATHS[n % len(PATHS)].format(n=1 + n % N_ISSUES)
+            start = time.perf_counter()
+            try:
+                ok = await fetch(port, path) == 200
+            except OSError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def run(mode, uri, concurrency, total, threads):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--uri", uri,
+                               "--port", str(port), "--threads", str(threads)])
+    try:
+        wait_for(port)
+        asyncio.run(load(port, min(concurrency, 20), 200))  # warm up
+        latencies, errors, elapsed = asyncio.run(load(port, concurrency, total))
+    finally:
+        server.terminate()
+        server.wait()
+    ordered = sorted(latencies)
+    ms = [percentile(ordered, p) * 1000 for p in (50, 90, 99)] + [ordered[-1] * 1000]
+    print(f"{mode:>13} {total / elapsed:>8.0f} " + " ".join(f"{value:>8.1f}" for value in ms) + f" {errors:>7}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32, help="Server threads (ASGI_THREADS and DB pool size)")
+    parser.add_argument("--modes", default="sync,async-threads,async")
+    parser.add_argument("--serve", choices=["sync", "async-threads", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--uri", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.uri, args.port, args.threads)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(uri)
+        print(f"{args.requests} requests, {args.concurrency} concurrent, {args.threads} server threads")
+        print(f"{'mode':>13} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+        for mode in args.modes.split(","):
+            if mode != "sync" and not async_available():
+                print(f"{mode:>13} skipped: pip install asgiref uvicorn aiosqlite")
+                continue
+            run(mode, uri, args.concurrency, args.requests, args.threads)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare OFFSET (page/size) and keyset (after/limit) pagination of issues.
+
+Usage: python benchmarks/bench_pagination.py [--issues 50000] [--size 20] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from models import db, Repository, Issue
+from pagination import encode_cursor
+
+
+def seed(app, n_issues):
+    with app.app_context():
+        db.create_all()
+        db.session.add(Repository(name="Bench Repo", author_id=1))
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        db.session.execute(Issue.__table__.insert(), [
+            {"repository_id": 1, "title": f"Issue {i}", "description": "x" * 200, "status": "Open",
+             "submitter_id": i % 50, "created_at": start + timedelta(seconds=i)}
+            for i in range(n_issues)
+        ])
+        db.session.commit()
+
+
+def cursor_before(app, position):
+    # The cursor a client would hold after reading `position` issues
+    if position == 0:
+        return None
+    with app.app_context():
+        issue = Issue.query.order_by(Issue.created_at, Issue.id).offset(position - 1).first()
+        return encode_cursor(issue.created_at, issue.id)
+
+
+def timed(client, url, repeat):
+    client.get(url)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url)
+        assert response.status_code == 200
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=50000)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        seed(app, args.issues)
+        client = app.test_client()
+
+        print(f"{args.issues} issues, {args.size} per page")
+        print(f"{'page':>6} {'offset (ms)':>12} {'cursor (ms)':>12}")
+        for page in (1, 1000):
+            if (page - 1) * args.size >= args.issues:
+                print(f"{page:>6} skipped: fewer than {page * args.size} issues")
+                continue
+            offset_url = f"/repositories/1/issues?page={page}&size={args.size}"
+            cursor = cursor_before(app, (page - 1) * args.size)
+            cursor_url = f"/repositories/1/issues?limit={args.size}" + (f"&after={cursor}" if cursor else "")
+            print(f"{page:>6} {timed(client, offset_url, args.repeat):>12.2f} {timed(client, cursor_url, args.repeat):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Maintained branch heads: ``Branch.head_commit_id`` points at the branch's
+latest commit (newest ``created_at``, then highest id), so the repository
+default view reads it by primary key instead of sorting the branch's commits.
+
+After every flush that adds, deletes or moves commits, the heads of the
+branches involved are recomputed in one UPDATE in the same transaction.
+Commits written without the ORM session (Core inserts, imports, manual
+fixes) leave heads stale; ``flask --app app rebuild-branch-heads`` recomputes
+them all, rewriting only the ones that are wrong.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm.util import identity_key
+
+from database import RoutingSession
+from models import db, Branch, Commit
+
+def latest_commit_id():
+    return (
+        select(Commit.id)
+        .where(Commit.branch_id == Branch.id)
+        .order_by(Commit.created_at.desc(), Commit.id.desc())
+        .limit(1)
+        .correlate(Branch)
+        .scalar_subquery()
+    )
+
+def _affected_branches(session):
+    branch_ids = set()
+    for commit in session.new | session.deleted:
+        if isinstance(commit, Commit):
+            branch_ids.add(commit.branch_id)
+    for commit in session.dirty:
+        if isinstance(commit, Commit):
+            attrs = inspect(commit).attrs
+            for history in (attrs.branch_id.history, attrs.created_at.history):
+                if history.has_changes():
+                    # Both the branch the commit left and the one it joined
+                    branch_ids.update(history.deleted or ())
+                    branch_ids.add(commit.branch_id)
+    branch_ids.discard(None)
+    return branch_ids
+
+@event.listens_for(RoutingSession, 'after_flush')
+def update_branch_heads(session, flush_context):
+    branch_ids = _affected_branches(session)
+    if not branch_ids:
+        return
+    session.execute(
+        update(Branch)
+        .where(Branch.id.in_(branch_ids))
+        .values(head_commit_id=latest_commit_id())
+        .execution_options(synchronize_session=False)
+    )
+    for branch_id in branch_ids:
+        branch = session.identity_map.get(identity_key(Branch, branch_id))
+        if branch is not None:
+            session.expire(branch, ['head_commit_id'])
+
+def rebuild_branch_heads(connection):
+    """Point every branch at its latest commit; return the number of branches fixed."""
+    latest = latest_commit_id()
+    return connection.execute(
+        update(Branch)
+        .where(Branch.head_commit_id.is_distinct_from(latest))
+        .values(head_commit_id=latest)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+@click.command('rebuild-branch-heads')
+@with_appcontext
+def rebuild_branch_heads_command():
+    """Recompute the head commit of every branch."""
+    fixed = rebuild_branch_heads(db.session)
+    db.session.commit()
+    click.echo(f"Fixed head commit on {fixed} branches")
@@ -0,0 +1,174 @@
+"""Response cache shared by the REST workers.
+
+The backend is chosen with CACHE_TYPE:
+
+* ``null``   (default) caching disabled
+* ``memory`` per-process dict, for development and single-worker deployments
+* ``sqlite`` an on-disk SQLite file at CACHE_PATH, shared by the workers of one host
+* ``redis``  a Redis server at CACHE_REDIS_URL, shared by every host; needs the
+             optional ``redis`` package
+
+Every backend stores bytes under string keys with a timeout in seconds, and
+supports get/set/delete. Keys are prefixed with CACHE_KEY_PREFIX.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, make_response
+
+from database import is_sticky, reads_from_replica, replica_engine
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+class MemoryCache:
+    def __init__(self):
+        self._data = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.time() + timeout, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+class SQLiteCache:
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+
+    # One short-lived connection per operation, so the file can be shared
+    # between threads and processes
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key):
+        with self._connect() as connection:
+            row = connection.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, timeout):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + timeout)
+            )
+
+    def delete(self, *keys):
+        with self._connect() as connection:
+            connection.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+
+class RedisCache:
+    # `client` is anything speaking the redis-py API (get, set with ex=, delete)
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_TYPE 'redis' needs the redis package: pip install redis")
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, timeout):
+        self.client.set(key, value, ex=timeout)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+def create_cache(app):
+    cache_type = app.config['CACHE_TYPE']
+    if cache_type == 'null':
+        return NullCache()
+    if cache_type == 'memory':
+        return MemoryCache()
+    if cache_type == 'sqlite':
+        path = app.config.get('CACHE_PATH') or os.path.join(app.instance_path, 'response_cache.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SQLiteCache(path)
+    if cache_type == 'redis':
+        return RedisCache.from_url(app.config['CACHE_REDIS_URL'])
+    raise ValueError(f"Unknown CACHE_TYPE: {cache_type}")
+
+def response_cache():
+    return current_app.extensions['response_cache']
+
+def _key(name):
+    return current_app.config['CACHE_KEY_PREFIX'] + name
+
+def cached(key):
+    """Cache the body of a route's 200 responses under `key`, formatted with the route's arguments.
+
+    With a read replica, a body cached after an invalidation may have been read
+    before the write reached the replica. A client that just wrote therefore
+    skips the cache and reads the primary, and bodies read from the replica
+    are kept no longer than REPLICA_STICKY_SECONDS, the lag the replica is allowed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            cache = response_cache()
+            cache_key = _key(key.format(**kwargs))
+            sticky = replica_engine() is not None and is_sticky()
+            body = None if sticky else cache.get(cache_key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                timeout = current_app.config['CACHE_DEFAULT_TIMEOUT']
+                if replica_engine() is not None and reads_from_replica():
+                    timeout = min(timeout, current_app.config['REPLICA_STICKY_SECONDS'])
+                cache.set(cache_key, response.get_data(), timeout)
+            return response
+        return wrapper
+    return decorator
+
+# Keys of the cached views that depend on a repository's data
+REPOSITORY_KEYS = (
+    "repositories:{id}",
+    "repositories:{id}:branches",
+    "repositories:{id}:tags",
+)
+
+def invalidate_repository(id):
+    response_cache().delete(*(_key(key.format(id=id)) for key in REPOSITORY_KEYS))
@@ -0,0 +1,310 @@
+"""Commit graph: parent edges, generation numbers and an in-memory ancestry
+index for the compare and merge-base routes.
+
+Parent edges are stored in ``commit_parents`` and each commit carries a
+generation number (1 for a root, otherwise one more than its highest parent),
+assigned when the commit is flushed. A commit's ancestors all have lower
+generations, so walks that visit commits in decreasing generation order never
+need to revisit one, and can stop as soon as the answer is settled instead of
+walking the whole history (as git's commit-graph file does).
+
+For those walks a repository's graph is loaded into a ``CommitGraph``: flat
+integer arrays of about 20 bytes per commit, so a history of millions of
+commits fits in tens of megabytes. Graphs are kept in an LRUCache bounded by
+COMMIT_GRAPH_CACHE_MAX_BYTES. A commit's parents are set when it is written,
+so a cached graph stays correct for every commit it holds; asked about a commit
+it does not know yet, it reads only the commits with higher ids than its own
+and adds them. The one exception is
+``--infer-parents`` below, which gives existing commits parents: it bumps
+``Repository.graph_version``, and a graph cached for an older version is
+reloaded.
+
+Commits written without the ORM session have no generation; the graph works
+them out when it loads. ``flask --app app rebuild-commit-graph`` recomputes
+every stored generation, and with ``--infer-parents`` first links each
+commit without parents to the previous commit of its branch, for histories
+recorded before parent edges existed.
+"""
+from array import array
+from bisect import bisect_left
+from heapq import heapify, heappop, heappush
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event, insert, select, update
+from sqlalchemy.orm import aliased
+
+from database import RoutingSession
+from models import db, Branch, Commit, CommitParent, Repository
+
+# Flags of the graph walks
+INCLUDE, EXCLUDE = 1, 2
+PARENT1, PARENT2, STALE = 1, 2, 4
+
+def compute_generations(offsets, parents, generations=None):
+    """Generation numbers for a graph in offsets/parents form, keeping the known ones in ``generations``."""
+    n = len(offsets) - 1
+    result = array('i', bytes(4 * n))
+    if generations is not None:
+        for i, generation in enumerate(generations):
+            result[i] = generation or 0
+    for start in range(n):
+        if result[start]:
+            continue
+        stack = [start]
+        while stack:
+            i = stack[-1]
+            if result[i]:
+                stack.pop()
+                continue
+            own = parents[offsets[i]:offsets[i + 1]]
+            pending = [p for p in own if not result[p]]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            result[i] = 1 + max((result[p] for p in own), default=0)
+    return result
+
+class CommitGraph:
+    """Ancestry of a set of commits in flat arrays.
+
+    Commits are numbered by their position in id order: ``ids[i]`` is the
+    commit id, ``generations[i]`` its generation, and the numbers of its
+    parents are ``parents[offsets[i]:offsets[i + 1]]``.
+    """
+    def __init__(self, ids, generations, offsets, parents):
+        self.ids = ids
+        self.generations = generations
+        self.offsets = offsets
+        self.parents = parents
+
+    @classmethod
+    def from_rows(cls, commits, edges):
+        """Build from (id, generation) rows and (commit id, parent id) rows in parent order.
+
+        Edges to commits outside ``commits`` are dropped; missing generations are computed.
+        """
+        return cls(array('q'), array('i'), array('q', [0]), array('i')).extended(commits, edges)
+
+    def extended(self, commits, edges):
+        """This graph plus ``commits``, all with higher ids than it holds, and their ``edges``.
+
+        Rows are as for ``from_rows``; edges of commits already held are ignored.
+        The arrays are copied rather than appended to, since other threads may
+        be walking this graph.
+        """
+        commits = sorted(commits)
+        base = len(self.ids)
+        graph = CommitGraph(self.ids + array('q', (row[0] for row in commits)), None, None, None)
+        edges = sorted(((i, position, p) for position, (i, p) in enumerate(
+            (graph.index(commit_id), graph.index(parent_id)) for commit_id, parent_id in edges
+        ) if i is not None and i >= base and p is not None))
+
+        offsets = self.offsets + array('q', bytes(8 * len(commits)))
+        for i, _, _ in edges:
+            offsets[i + 1] += 1
+        for i in range(base, len(graph.ids)):
+            offsets[i + 1] += offsets[i]
+        graph.offsets = offsets
+        graph.parents = self.parents + array('i', (p for _, _, p in edges))
+
+        known = [row[1] for row in commits]
+        if all(known):
+            graph.generations = self.generations + array('i', known)
+        else:
+            graph.generations = compute_generations(offsets, graph.parents, list(self.generations) + known)
+        return graph
+
+    @property
+    def size(self):
+        return sum(a.itemsize * len(a) for a in (self.ids, self.generations, self.offsets, self.parents))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, commit_id):
+        """The number of a commit id, or None if the graph does not hold it."""
+        i = bisect_left(self.ids, commit_id)
+        return i if i < len(self.ids) and self.ids[i] == commit_id else None
+
+    def parents_of(self, i):
+        return self.parents[self.offsets[i]:self.offsets[i + 1]]
+
+    def only(self, include, exclude):
+        """Commits reachable from ``include`` but not from ``exclude``, highest generation first."""
+        if include == exclude:
+            return []
+        generations = self.generations
+        flags = {include: INCLUDE, exclude: EXCLUDE}
+        queue = [(-generations[include], include), (-generations[exclude], exclude)]
+        heapify(queue)
+        wanted = 1  # queued commits not known to be reachable from exclude
+        found = []
+        while wanted:
+            _, i = heappop(queue)
+            flag = flags[i]
+            if flag == INCLUDE:
+                wanted -= 1
+                found.append(i)
+            for p in self.parents_of(i):
+                old = flags.get(p)
+                if old is None:
+                    flags[p] = flag
+                    heappush(queue, (-generations[p], p))
+                    wanted += flag == INCLUDE
+                elif flag == EXCLUDE and old == INCLUDE:
+                    # Still queued: parents come out after all their children
+                    flags[p] = EXCLUDE
+                    wanted -= 1
+        return found
+
+    def merge_bases(self, a, b):
+        """The best common ancestors of ``a`` and ``b`` (none is an ancestor of another), highest generation first."""
+        if a == b:
+            return [a]
+        generations = self.generations
+        flags = {a: PARENT1, b: PARENT2}
+        queue = [(-generations[a], a), (-generations[b], b)]
+        heapify(queue)
+        active = 2  # queued commits without STALE
+        found = []
+        while active:
+            _, i = heappop(queue)
+            flag = flags[i]
+            if not flag & STALE:
+                active -= 1
+                if flag == PARENT1 | PARENT2:
+                    found.append(i)
+                    # Its ancestors are common too, but not best
+                    flag |= STALE
+            for p in self.parents_of(i):
+                old = flags.get(p, 0)
+                if old & flag == flag:
+                    continue
+                flags[p] = old | flag
+                if not old:
+                    heappush(queue, (-generations[p], p))
+                    active += not flag & STALE
+                elif not old & STALE and flag & STALE:
+                    active -= 1
+        return found
+
+def load_commit_graph(session, repository_id=None, graph=None):
+    """The graph of one repository's commits, or of every commit when repository_id is None.
+
+    Given the ``graph`` loaded earlier, only the commits with higher ids are read and added to it.
+    """
+    after = graph.ids[-1] if graph is not None and len(graph) else 0
+    commits = select(Commit.id, Commit.generation).where(Commit.id > after)
+    child = aliased(Commit)
+    edges = (select(CommitParent.commit_id, CommitParent.parent_id).where(CommitParent.commit_id > after)
+             .order_by(CommitParent.commit_id, CommitParent.position))
+    if repository_id is not None:
+        commits = commits.join(Branch, Commit.branch_id == Branch.id).where(Branch.repository_id == repository_id)
+        edges = (edges.join(child, CommitParent.commit_id == child.id)
+                 .join(Branch, child.branch_id == Branch.id).where(Branch.repository_id == repository_id))
+    commits, edges = session.execute(commits).all(), session.execute(edges).all()
+    if graph is None:
+        return CommitGraph.from_rows(commits, edges)
+    return graph.extended(commits, edges)
+
+def commit_graphs():
+    return current_app.extensions['commit_graphs']
+
+def repository_graph(repository_id, version, *commit_ids):
+    """The cached graph of a repository at ``graph_version`` ``version``, holding all of ``commit_ids`` that exist.
+
+    Commits newer than the cached graph are added to it; it is only loaded
+    whole for a new version, or for a commit whose id is lower than ones it
+    already holds (written out of id order).
+    """
+    cache = commit_graphs()
+    entry = cache.get(repository_id)
+    graph = entry[1] if entry is not None and entry[0] == version else None
+    missing = [commit_id for commit_id in commit_ids if graph is not None and graph.index(commit_id) is None]
+    if graph is None or missing:
+        newer = graph is not None and (not len(graph) or min(missing) > graph.ids[-1])
+        graph = load_commit_graph(db.session, repository_id, graph if newer else None)
+        cache.put(repository_id, (version, graph), graph.size)
+    return graph
+
+@event.listens_for(RoutingSession, 'before_flush')
+def assign_generations(session, flush_context, instances):
+    new = {commit for commit in session.new if isinstance(commit, Commit)}
+    done = set()
+    for commit in new:
+        # Parents first; they may be new in this flush too
+        stack = [commit]
+        while stack:
+            top = stack[-1]
+            if top in done:
+                stack.pop()
+                continue
+            pending = [parent for parent in top.parents if parent in new and parent not in done]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            done.add(top)
+            generations = [parent.generation for parent in top.parents]
+            # Unknown when a parent predates generations; the graph computes it on load
+            top.generation = 1 + max(generations, default=0) if None not in generations else None
+
+def link_branch_parents(connection):
+    """Link each commit without parents to the previous commit of its branch; return the number linked.
+
+    The graph_version of every repository with a linked commit is bumped.
+    """
+    has_parent = select(CommitParent.commit_id).where(CommitParent.commit_id == Commit.id).exists()
+    previous = aliased(Commit)
+    previous_id = (
+        select(previous.id)
+        .where(previous.branch_id == Commit.branch_id)
+        .where((previous.created_at < Commit.created_at)
+               | ((previous.created_at == Commit.created_at) & (previous.id < Commit.id)))
+        .order_by(previous.created_at.desc(), previous.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = connection.execute(select(Commit.id, previous_id, Commit.branch_id).where(~has_parent)).all()
+    links = [{"commit_id": commit_id, "parent_id": parent_id, "position": 0}
+             for commit_id, parent_id, _ in rows if parent_id is not None]
+    if links:
+        connection.execute(insert(CommitParent), links)
+        branch_ids = {branch_id for _, parent_id, branch_id in rows if parent_id is not None}
+        connection.execute(
+            update(Repository)
+            .where(Repository.id.in_(select(Branch.repository_id).where(Branch.id.in_(branch_ids))))
+            .values(graph_version=Repository.graph_version + 1)
+        )
+    return len(links)
+
+def rebuild_commit_graph(connection):
+    """Recompute every stored generation number; return the number of commits fixed."""
+    graph = load_commit_graph(connection)
+    stored = dict(connection.execute(select(Commit.id, Commit.generation)).all())
+    computed = compute_generations(graph.offsets, graph.parents)
+    changes = [{"commit_id": commit_id, "generation": generation}
+               for commit_id, generation in zip(graph.ids, computed) if stored[commit_id] != generation]
+    if changes:
+        commits = Commit.__table__
+        connection.execute(update(commits).where(commits.c.id == bindparam('commit_id')), changes)
+    return len(changes)
+
+
+@click.command('rebuild-commit-graph')
+@click.option('--infer-parents', is_flag=True,
+              help="First link each commit without parents to the previous commit of its branch.")
+@with_appcontext
+def rebuild_commit_graph_command(infer_parents):
+    """Recompute commit generation numbers."""
+    if infer_parents:
+        linked = link_branch_parents(db.session)
+        click.echo(f"Linked {linked} commits to their branch predecessor")
+    fixed = rebuild_commit_graph(db.session)
+    db.session.commit()
+    # Workers notice the new graph_version; this process's graphs are simply dropped
+    commit_graphs().clear()
+    click.echo(f"Fixed generation on {fixed} commits")
@@ -0,0 +1,96 @@
+"""Response compression negotiated through Accept-Encoding.
+
+JSON responses of at least COMPRESS_MIN_SIZE bytes are compressed with the
+best encoding the client accepts, in the server's order of preference:
+
+* ``br``   brotli, needs the optional ``brotli`` package
+* ``zstd`` Zstandard, needs the optional ``zstandard`` package
+* ``gzip`` always available
+
+Compressed responses keep their ETag as a weak validator, as the bytes differ
+per encoding but If-None-Match still matches with weak comparison. 304s carry
+Vary: Accept-Encoding too, and the commit-hash routes answer them with the ETag
+in the strength the client sent. Responses
+with a strong ETag (the commit-hash routes) have their compressed
+bytes kept in a byte-bounded LRU cache keyed by (ETag, encoding), so a tree
+is compressed once rather than on every request. Streamed responses (NDJSON
+histories) are sent uncompressed.
+"""
+import gzip
+
+from flask import current_app, request
+
+from lru import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+def _gzip(data):
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def _brotli(data):
+    return brotli.compress(data, quality=5)
+
+def _zstd(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+# Encodings in order of preference, with their compressor (None when the
+# package is not installed)
+CODECS = {
+    'br': _brotli if brotli is not None else None,
+    'zstd': _zstd if zstandard is not None else None,
+    'gzip': _gzip,
+}
+
+def available_encodings(preferred):
+    return [name for name in preferred if CODECS.get(name) is not None]
+
+def compressed_cache():
+    return current_app.extensions['compressed_cache']
+
+def init_compression(app):
+    app.extensions['compressed_cache'] = LRUCache(app.config['COMPRESS_CACHE_MAX_BYTES'])
+    app.after_request(compress_response)
+
+def compress_response(response):
+    """after_request hook: compress the body if the client accepts an encoding we have."""
+    config = current_app.config
+    if config['COMPRESS_ENABLED'] and response.status_code == 304:
+        # The 200 this stands for varied by Accept-Encoding, so caches must key the 304 the same way
+        response.vary.add('Accept-Encoding')
+        return response
+    if (not config['COMPRESS_ENABLED'] or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings(config['COMPRESS_ALGORITHMS']))
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (etag, encoding) if etag and not weak else None
+    body = compressed_cache().get(key) if key else None
+    if body is None:
+        body = CODECS[encoding](response.get_data())
+        if key:
+            compressed_cache().put(key, body, len(body))
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,60 @@
+"""Default configuration for create_app.
+
+Any key can be overridden from the environment with a BITHUB_ prefix, e.g.
+BITHUB_SQLALCHEMY_DATABASE_URI=postgresql://... or BITHUB_DB_POOL_SIZE=20
+(values are parsed as JSON when possible), or by passing a config object or
+mapping to create_app.
+"""
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///bithub.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool; None keeps SQLAlchemy's default for the database
+    DB_POOL_SIZE = None
+    DB_MAX_OVERFLOW = None
+    DB_POOL_RECYCLE = None  # seconds before a pooled connection is replaced
+    DB_POOL_TIMEOUT = None  # seconds to wait for a free connection
+    DB_POOL_PRE_PING = False
+
+    # SQLite only: applied to every new connection (see database.py)
+    SQLITE_TUNING = True
+    SQLITE_CACHE_SIZE_KB = 64 * 1024
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+
+    # Read replica for GET requests, e.g. 'sqlite:///file:replica.db?mode=ro&uri=true';
+    # None sends everything to SQLALCHEMY_DATABASE_URI
+    REPLICA_DATABASE_URI = None
+    # How long a client keeps reading the primary after a write
+    REPLICA_STICKY_SECONDS = 5
+
+    # 'auto' uses orjson when installed; 'orjson' or 'stdlib' to force one (see json_provider.py)
+    JSON_PROVIDER = 'auto'
+
+    # Threads running route handlers under the ASGI entry point (asgi.py)
+    ASGI_THREADS = 32
+    # Run GET requests under asgi.py on the event loop, with an async database
+    # driver (aiosqlite), instead of on those threads
+    ASGI_ASYNC_READS = True
+
+    # Largest number of items accepted by the :batch and :lookup endpoints
+    BATCH_MAX_ITEMS = 1000
+
+    TREE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # In-memory commit graphs for compare and merge-base (see commit_graph.py)
+    COMMIT_GRAPH_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Commits listed by a compare response; ahead_by and behind_by count them all
+    COMPARE_MAX_COMMITS = 250
+
+    # Response compression (see compression.py); encodings in order of preference,
+    # brotli and zstd are used only when their packages are installed
+    COMPRESS_ENABLED = True
+    COMPRESS_ALGORITHMS = ['br', 'zstd', 'gzip']
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+    CACHE_TYPE = 'null'
+    CACHE_KEY_PREFIX = 'bithub:'
+    CACHE_DEFAULT_TIMEOUT = 300
@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Records every SQL statement sent to the database inside the `with` block:
+#     with record_queries() as queries:
+#         client.get(...)
+#     assert len(queries) == 1
+@pytest.fixture
+def record_queries():
+    @contextmanager
+    def recording():
+        queries = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            queries.append((statement, parameters))
+
+        event.listen(Engine, 'before_cursor_execute', listener)
+        try:
+            yield queries
+        finally:
+            event.remove(Engine, 'before_cursor_execute', listener)
+
+    return recording
@@ -0,0 +1,88 @@
+"""Denormalized counters: ``Issue.comment_count`` and the per-repository
+``open_issue_count`` / ``closed_issue_count``.
+
+The create routes bump them with ``col = col + n`` in the same transaction as
+the insert, so concurrent writers never lose an increment. The same updates
+bump the repository's ``issues_version`` and ``issues_updated_at``, which the
+issue list serves as its validators. Rows written any
+other way (imports, manual fixes, status changes made in the database) can
+leave them stale; ``flask --app app repair-counters`` recomputes them in id
+ranges, rewriting only rows whose stored value is wrong.
+"""
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_, select, update
+
+from models import db, Repository, Issue, Comment
+
+def count_new_issues(repository, n=1):
+    # New issues are always Open
+    repository.open_issue_count = Repository.open_issue_count + n
+    repository.issues_version = Repository.issues_version + 1
+    repository.issues_updated_at = datetime.now()
+
+def count_new_comments(issue, n=1):
+    issue.comment_count = Issue.comment_count + n
+    # The issue list shows comment_count
+    db.session.execute(
+        update(Repository)
+        .where(Repository.id == issue.repository_id)
+        .values(issues_version=Repository.issues_version + 1, issues_updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+def _issues_with_status(status):
+    return (
+        select(func.count(Issue.id))
+        .where(Issue.repository_id == Repository.id, Issue.status == status)
+        .scalar_subquery()
+    )
+
+def repair_issue_counts(connection, start, stop):
+    """Recompute comment_count for issues with start < id <= stop; return the number of rows fixed."""
+    actual = select(func.count(Comment.id)).where(Comment.issue_id == Issue.id).scalar_subquery()
+    return connection.execute(
+        update(Issue)
+        .where(Issue.id > start, Issue.id <= stop, Issue.comment_count != actual)
+        .values(comment_count=actual)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def repair_repository_counts(connection, start, stop):
+    """Recompute the issue totals of repositories with start < id <= stop; return the number of rows fixed."""
+    open_count, closed_count = _issues_with_status('Open'), _issues_with_status('Closed')
+    return connection.execute(
+        update(Repository)
+        .where(Repository.id > start, Repository.id <= stop)
+        .where(or_(Repository.open_issue_count != open_count, Repository.closed_issue_count != closed_count))
+        .values(open_issue_count=open_count, closed_issue_count=closed_count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def id_ranges(connection, id_column, batch_size):
+    top = connection.execute(select(func.max(id_column))).scalar() or 0
+    for start in range(0, top, batch_size):
+        yield start, start + batch_size
+
+def repair_counters(connection, batch_size=10000):
+    """Recompute every counter in one transaction; return (issues fixed, repositories fixed)."""
+    issues = sum(repair_issue_counts(connection, *r) for r in id_ranges(connection, Issue.id, batch_size))
+    repositories = sum(repair_repository_counts(connection, *r) for r in id_ranges(connection, Repository.id, batch_size))
+    return issues, repositories
+
+
+@click.command('repair-counters')
+@click.option('--batch-size', default=10000, show_default=True, help="Rows recomputed per transaction.")
+@with_appcontext
+def repair_counters_command(batch_size):
+    """Recompute issue comment counts and repository issue totals."""
+    fixed = {}
+    for name, id_column, repair in (('issues', Issue.id, repair_issue_counts),
+                                    ('repositories', Repository.id, repair_repository_counts)):
+        fixed[name] = 0
+        for start, stop in id_ranges(db.session, id_column, batch_size):
+            fixed[name] += repair(db.session, start, stop)
+            db.session.commit()
+    click.echo(f"Fixed counters on {fixed['issues']} issues and {fixed['repositories']} repositories")
@@ -0,0 +1,158 @@
+import time
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# WSGI environ key set by asgi.py for requests it runs on the event loop
+EVENT_LOOP_KEY = 'bithub.event_loop'
+# Async driver for each database that has one
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite'}
+# Holds the time until which a client that just wrote keeps reading the primary
+STICKY_COOKIE = 'bithub_read_primary'
+
+# Config keys mapped to create_engine() pool arguments
+POOL_OPTIONS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+}
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS with the DB_POOL_* settings merged in; explicit engine options win."""
+    options = {}
+    for key, option in POOL_OPTIONS.items():
+        if config.get(key) is not None:
+            options[option] = config[key]
+    if config.get('DB_POOL_PRE_PING'):
+        options['pool_pre_ping'] = True
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return options
+
+# WAL lets readers run alongside the single writer instead of blocking on it,
+# and synchronous=NORMAL is durable in WAL mode while skipping an fsync per
+# commit. A larger page cache and memory-mapped reads cut syscalls.
+# The journal mode is a property of the file, so a read-only connection (the
+# replica) leaves it alone; changing it there fails.
+def tune_sqlite(engine, config, read_only=False):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}")
+        cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.close()
+
+# The replica is not a Flask-SQLAlchemy bind: binds get their own metadata, and
+# db.create_all() would then try to create the tables on the replica too.
+def create_replica_engine(app):
+    """The engine for REPLICA_DATABASE_URI, or None when no replica is configured."""
+    if not app.config.get('REPLICA_DATABASE_URI'):
+        return None
+    return create_engine(app.config['REPLICA_DATABASE_URI'], **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+
+def replica_engine():
+    return current_app.extensions.get('replica_engine')
+
+# For the requests asgi.py runs on the event loop. Their sessions keep their
+# synchronous API: SQLAlchemy runs them in a greenlet and each query awaits the
+# driver, so the loop serves other requests meanwhile.
+def create_async_engines(app, db):
+    """Engines on an async driver for the primary and replica databases, keyed by
+    their sync engines, in app.extensions['async_engines']. Returns False, and
+    creates none, when a database has no async driver."""
+    with app.app_context():
+        engines = list(db.engines.values())
+    if app.extensions.get('replica_engine') is not None:
+        engines.append(app.extensions['replica_engine'])
+    # An in-memory database would be a different, empty one on another connection
+    if any(engine.dialect.name not in ASYNC_DRIVERS or engine.url.database in (None, '', ':memory:')
+           for engine in engines):
+        return False
+
+    async_engines = {}
+    for engine in engines:
+        url = engine.url.set(drivername=f"{engine.dialect.name}+{ASYNC_DRIVERS[engine.dialect.name]}")
+        try:
+            # A pool like the sync engine's; for SQLite files aiosqlite defaults to
+            # NullPool, which would start a connection thread per request
+            async_engines[engine] = create_async_engine(
+                url, **{'poolclass': AsyncAdaptedQueuePool, **app.config['SQLALCHEMY_ENGINE_OPTIONS']})
+        except ImportError:
+            driver = ASYNC_DRIVERS[engine.dialect.name]
+            raise RuntimeError(f"Async reads need the {driver} package: pip install {driver}, or set ASGI_ASYNC_READS to False")
+        if app.config['SQLITE_TUNING'] and engine.dialect.name == 'sqlite':
+            tune_sqlite(async_engines[engine].sync_engine, app.config,
+                        read_only=engine is app.extensions.get('replica_engine'))
+    app.extensions['async_engines'] = async_engines
+    return True
+
+def configure_engines(app, db):
+    if not app.config['SQLITE_TUNING']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                tune_sqlite(engine, app.config)
+    replica = app.extensions.get('replica_engine')
+    if replica is not None and replica.dialect.name == 'sqlite':
+        tune_sqlite(replica, app.config, read_only=True)
+
+
+def read_only(view):
+    """Mark a route that only reads although its method is not GET (a lookup
+    taking its keys in a POST body), so it reads the replica like a GET."""
+    view.read_only = True
+    return view
+
+def is_read_request():
+    if request.method in READ_METHODS:
+        return True
+    return getattr(current_app.view_functions.get(request.endpoint), 'read_only', False)
+
+def is_sticky():
+    """Whether the client wrote within the last REPLICA_STICKY_SECONDS and so must read the primary."""
+    try:
+        sticky_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        sticky_until = 0
+    return sticky_until >= time.time()
+
+def reads_from_replica():
+    if not has_request_context() or not is_read_request():
+        return False
+    return not is_sticky()
+
+class RoutingSession(Session):
+    """Sends the queries of GET requests to the replica, and everything else to the primary.
+
+    Queries outside a request (CLI commands, tests) always use the primary, and
+    so does a client for REPLICA_STICKY_SECONDS after it wrote something, so it
+    reads its own writes while the replica catches up. Requests that asgi.py
+    runs on the event loop use the async-driver engine for the same database.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and reads_from_replica() and replica_engine() is not None:
+            return on_event_loop(replica_engine())
+        return on_event_loop(super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs))
+
+def on_event_loop(engine):
+    """`engine`, or its async-driver counterpart in a request served on the event loop."""
+    if has_request_context() and request.environ.get(EVENT_LOOP_KEY):
+        return current_app.extensions['async_engines'][engine].sync_engine
+    return engine
+
+def mark_sticky(response):
+    """after_request hook: pin a client that wrote successfully to the primary for a while."""
+    if (not is_read_request() and response.status_code < 400
+            and replica_engine() is not None):
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True)
+    return response
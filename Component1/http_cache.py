@@ -0,0 +1,92 @@
+"""HTTP validators (ETag / Last-Modified) and Cache-Control for the REST routes.
+
+Commits are immutable, so anything addressed by a commit hash can carry a
+strong ETag computed from the URL alone and be cached for a year; a client
+that already holds it gets a 304 before the route touches the database.
+Routes whose answer also depends on something that can change, such as the
+commit graph, add a version to that ETag and are revalidated instead.
+Mutable collections such as issue lists get a weak ETag computed from values
+that change with the collection, and must be revalidated.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import make_response, request
+from werkzeug.http import is_resource_modified
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _digest(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def _not_modified(etag, weak=False, last_modified=None):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=weak)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def _url_validated(view, version, cache_control):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = _digest(request.path, version(*args, **kwargs)) if version else _digest(request.path)
+        if not is_resource_modified(request.environ, etag=etag):
+            # Echo the validator as the client holds it: weak when its 200 was
+            # compressed (see compression.py), strong otherwise
+            response = _not_modified(etag, weak=request.if_none_match.is_weak(etag))
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+        return response
+    return wrapper
+
+def immutable(view):
+    """Mark a route whose response for a given URL never changes (it is addressed by commit hash)."""
+    return _url_validated(view, None, IMMUTABLE_CACHE_CONTROL)
+
+def versioned(version):
+    """Mark a route whose response for a given URL changes only when ``version`` does.
+
+    ``version`` is called with the route's arguments, e.g. to read a
+    repository's graph_version. It is part of the strong ETag, and the
+    response is sent with ``no-cache``, so clients revalidate it on every use
+    and a 304 costs only the version lookup.
+    """
+    return lambda view: _url_validated(view, version, 'no-cache')
+
+def collection_etag(*versions):
+    """Weak ETag for the current URL of a list, from values that change whenever the list does.
+
+    E.g. the row count and newest row, plus anything shown that is updated in
+    place, or a version number maintained with the rows.
+    """
+    return _digest(request.full_path, *versions)
+
+def _settled(last_modified):
+    # Last-Modified has whole seconds, so a list that changed during the current
+    # second can change again without moving it; only the ETag validates it until then
+    if last_modified is None or last_modified.replace(microsecond=0) >= datetime.now().replace(microsecond=0):
+        return None
+    return last_modified
+
+def check_collection(etag, last_modified=None):
+    """A 304 response if the client's copy of the list is current, otherwise None."""
+    last_modified = _settled(last_modified)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _not_modified(etag, weak=True, last_modified=last_modified)
+
+def with_collection_validators(response, etag, last_modified=None):
+    response = make_response(response)
+    if response.status_code == 200:
+        response.set_etag(etag, weak=True)
+        last_modified = _settled(last_modified)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,66 @@
+"""JSON encoding for responses and request bodies.
+
+``JSON_PROVIDER`` picks the encoder:
+
+* ``auto``   (default) orjson when it is installed, otherwise the standard library
+* ``orjson`` the optional ``orjson`` package, several times faster on large lists
+* ``stdlib`` Python's ``json`` module
+
+Both providers serialize ``datetime`` and ``date`` values as ISO 8601
+(``2024-01-31T12:00:00.123456``), so routes can put them in a payload without
+formatting them first, and both honour Flask's ``sort_keys`` and ``compact``
+settings, so the choice does not change the bytes of a response except that
+orjson writes non-ASCII characters as UTF-8 instead of ``\\u`` escapes.
+"""
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        # Flask's default would format dates as HTTP dates
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+class OrjsonJSONProvider(StdlibJSONProvider):
+    def _options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # orjson has no other formatting options; honour the ones Flask passes
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+PROVIDERS = {
+    'stdlib': StdlibJSONProvider,
+    'orjson': OrjsonJSONProvider,
+}
+
+def json_provider_class(name):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER: {name}")
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER 'orjson' needs the orjson package: pip install orjson")
+    return PROVIDERS[name]
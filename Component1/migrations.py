@@ -0,0 +1,151 @@
+"""Versioned schema migrations for existing Bithub databases.
+
+``db.create_all()`` only creates missing tables, so changes to existing tables
+(new indexes, new columns) are shipped as numbered migrations. Each migration
+runs once, in order, in its own short transaction, and the applied versions
+are recorded in ``schema_migrations``. Migrations only ever add objects, so a
+running server keeps working against both the old and the new schema while
+``flask --app app upgrade-db`` is applied underneath it.
+"""
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from models import db, CommitParent, TreeObject
+from search import create_search_index
+from counters import repair_counters
+from branch_heads import rebuild_branch_heads
+from commit_graph import rebuild_commit_graph
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+def create_index(connection, name, table, *columns):
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+def add_column(connection, table, name, ddl):
+    # Fresh databases built by create_all() already have the column
+    if name not in {column['name'] for column in inspect(connection).get_columns(table)}:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+@migration(1, "Composite indexes for route lookups")
+def add_route_indexes(connection):
+    create_index(connection, 'ix_branches_repository_id_name', 'branches', 'repository_id', 'name')
+    create_index(connection, 'ix_commits_branch_id_created_at', 'commits', 'branch_id', 'created_at')
+    create_index(connection, 'ix_issues_repository_id_status_created_at', 'issues', 'repository_id', 'status', 'created_at')
+    create_index(connection, 'ix_issues_repository_id_created_at', 'issues', 'repository_id', 'created_at')
+    create_index(connection, 'ix_comments_issue_id_created_at', 'comments', 'issue_id', 'created_at')
+    create_index(connection, 'ix_tags_commit_id', 'tags', 'commit_id')
+
+@migration(2, "Content-addressed tree store")
+def add_tree_store(connection):
+    # Run `flask --app app pack-trees` afterwards to move existing trees over
+    TreeObject.__table__.create(connection, checkfirst=True)
+    add_column(connection, 'commits', 'root_tree_hash', 'VARCHAR(40) REFERENCES tree_objects (hash)')
+
+@migration(3, "Full-text search index over issues and comments")
+def add_issue_search(connection):
+    if connection.dialect.name == 'sqlite':
+        create_search_index(connection)
+
+@migration(4, "Issue and repository counters")
+def add_counters(connection):
+    add_column(connection, 'issues', 'comment_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(connection, 'repositories', 'open_issue_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(connection, 'repositories', 'closed_issue_count', 'INTEGER NOT NULL DEFAULT 0')
+    repair_counters(connection)
+
+@migration(5, "Maintained branch head commits")
+def add_branch_heads(connection):
+    add_column(connection, 'branches', 'head_commit_id', 'INTEGER REFERENCES commits (id) ON DELETE SET NULL')
+    rebuild_branch_heads(connection)
+
+@migration(6, "Commit graph: parent edges and generation numbers")
+def add_commit_graph(connection):
+    # Existing commits have no parents; `flask --app app rebuild-commit-graph
+    # --infer-parents` links each to the previous commit of its branch
+    CommitParent.__table__.create(connection, checkfirst=True)
+    add_column(connection, 'commits', 'generation', 'INTEGER')
+    rebuild_commit_graph(connection)
+
+@migration(7, "Commit graph versions")
+def add_graph_versions(connection):
+    add_column(connection, 'repositories', 'graph_version', 'INTEGER NOT NULL DEFAULT 0')
+
+@migration(8, "Issue list versions")
+def add_issue_list_versions(connection):
+    add_column(connection, 'repositories', 'issues_version', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(connection, 'repositories', 'issues_updated_at', 'DATETIME')
+    # The newest issue, as the list's Last-Modified was before
+    connection.execute(text(
+        "UPDATE repositories SET issues_updated_at = "
+        "(SELECT MAX(created_at) FROM issues WHERE issues.repository_id = repositories.id)"
+    ))
+
+
+def applied_versions(engine):
+    with engine.begin() as connection:
+        migration_metadata.create_all(connection)
+        return set(connection.scalars(select(schema_migrations.c.version)))
+
+def _record(connection, version, description):
+    connection.execute(schema_migrations.insert().values(
+        version=version, description=description, applied_at=datetime.now()
+    ))
+
+def upgrade(engine):
+    """Apply pending migrations in order; return the (version, description) pairs applied."""
+    done = applied_versions(engine)
+    applied = []
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            func(connection)
+            _record(connection, version, description)
+        applied.append((version, description))
+    return applied
+
+def stamp(engine):
+    """Mark every migration as applied, for databases created from the current models."""
+    done = applied_versions(engine)
+    with engine.begin() as connection:
+        for version, description, _ in MIGRATIONS:
+            if version not in done:
+                _record(connection, version, description)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create all tables for a new database."""
+    db.create_all()
+    stamp(db.engine)
+    click.echo("Database ready")
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Apply pending schema migrations to an existing database."""
+    applied = upgrade(db.engine)
+    for version, description in applied:
+        click.echo(f"Applied migration {version}: {description}")
+    if not applied:
+        click.echo("Database is up to date")
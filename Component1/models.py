@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy.types import JSON
 from datetime import datetime
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Repository(db.Model):
     __tablename__ = 'repositories'
@@ -11,6 +14,15 @@ class Repository(db.Model):
     description = db.Column(db.String(500), nullable=True)
     author_id = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now())
+    # Maintained by the issue routes; `flask --app app repair-counters` recomputes them
+    open_issue_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    closed_issue_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped when existing commits get new parent edges (see commit_graph.py)
+    graph_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped whenever the issue list changes, new comments included (see counters.py);
+    # the list's ETag and Last-Modified
+    issues_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    issues_updated_at = db.Column(db.DateTime, nullable=True)
 
     branches = db.relationship('Branch', backref='repository')
     issues = db.relationship('Issue', backref='repository')
@@ -20,8 +32,16 @@ class Branch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     repository_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
+    # Latest commit on the branch, maintained on flush (see branch_heads.py).
+    # use_alter breaks the branches <-> commits foreign key cycle
+    head_commit_id = db.Column(db.Integer, db.ForeignKey('commits.id', use_alter=True, name='fk_branches_head_commit_id',
+                                                         ondelete='SET NULL'), nullable=True)
 
-    commits = db.relationship('Commit', backref='branch')
+    commits = db.relationship('Commit', backref='branch', foreign_keys='Commit.branch_id')
+
+    __table_args__ = (
+        db.Index('ix_branches_repository_id_name', 'repository_id', 'name'),
+    )
 
 class Tag(db.Model):
     __tablename__ = 'tags'
@@ -29,6 +49,10 @@ class Tag(db.Model):
     name = db.Column(db.String(100), nullable=False)
     commit_id = db.Column(db.Integer, db.ForeignKey('commits.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_tags_commit_id', 'commit_id'),
+    )
+
 class Commit(db.Model):
     __tablename__ = 'commits'
     id = db.Column(db.Integer, primary_key=True)
@@ -36,22 +60,67 @@ class Commit(db.Model):
     message = db.Column(db.String(500), nullable=True)
     branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now())
-    tree_structure = db.Column(JSON, nullable=True)
+    # legacy: whole tree in one blob. Deferred so loading a Commit does not pull
+    # it in; the tree routes and pack-trees undefer it
+    tree_structure = db.deferred(db.Column(JSON, nullable=True))
+    root_tree_hash = db.Column(db.String(40), db.ForeignKey('tree_objects.hash'), nullable=True)
+    # 1 for a root commit, otherwise 1 + the largest generation of its parents;
+    # set on flush (see commit_graph.py)
+    generation = db.Column(db.Integer, nullable=True)
 
     tags = db.relationship('Tag', backref='commit')
+    parent_links = db.relationship('CommitParent', foreign_keys='CommitParent.commit_id', order_by='CommitParent.position',
+                                   collection_class=ordering_list('position'), cascade='all, delete-orphan')
+    # Commit(parents=[...]) in order, first parent first
+    parents = association_proxy('parent_links', 'parent', creator=lambda parent: CommitParent(parent=parent))
+
+    __table_args__ = (
+        db.Index('ix_commits_branch_id_created_at', 'branch_id', 'created_at'),
+    )
+
+# Parent edges of the commit graph, one row per (commit, parent) in parent order
+class CommitParent(db.Model):
+    __tablename__ = 'commit_parents'
+    commit_id = db.Column(db.Integer, db.ForeignKey('commits.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('commits.id'), nullable=False)
+
+    parent = db.relationship('Commit', foreign_keys=[parent_id])
+
+    __table_args__ = (
+        db.Index('ix_commit_parents_parent_id', 'parent_id'),
+    )
+
+# Content-addressed tree storage (see tree_store.py). Each directory or file
+# node is stored once under the hash of its content and shared by every
+# commit that contains it. A tree's data lists its entries by hash, so a
+# path is resolved by loading one object per level.
+class TreeObject(db.Model):
+    __tablename__ = 'tree_objects'
+    hash = db.Column(db.String(40), primary_key=True)
+    kind = db.Column(db.String(4), nullable=False)  # kind: tree or blob
+    data = db.Column(JSON, nullable=False)
 
 class Issue(db.Model):
     __tablename__ = 'issues'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text, nullable=True)
+    # Deferred: only the issue detail view reads it (undefer it there)
+    description = db.deferred(db.Column(db.Text, nullable=True))
     status = db.Column(db.String(10), default='Open')  #  status: Open or Closed
     repository_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now())
     submitter_id = db.Column(db.Integer, nullable=False)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     comments = db.relationship('Comment', backref='issue')
 
+    __table_args__ = (
+        db.Index('ix_issues_repository_id_status_created_at', 'repository_id', 'status', 'created_at'),
+        # Serves the (created_at, id) keyset order when no status filter is given
+        db.Index('ix_issues_repository_id_created_at', 'repository_id', 'created_at'),
+    )
+
 class Comment(db.Model):
     __tablename__ = 'comments'
     id = db.Column(db.Integer, primary_key=True)
@@ -59,3 +128,6 @@ class Comment(db.Model):
     issue_id = db.Column(db.Integer, db.ForeignKey('issues.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now())
 
+    __table_args__ = (
+        db.Index('ix_comments_issue_id_created_at', 'issue_id', 'created_at'),
+    )
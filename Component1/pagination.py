@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Cursors are opaque to clients: a url-safe base64 encoding of [sort value, id]
+# taken from the last row of the previous page.
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, sort_type=datetime.fromisoformat):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_type(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def parse_limit(raw, default=DEFAULT_LIMIT):
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("Limit must be a positive integer")
+    if limit <= 0:
+        raise ValueError("Limit must be a positive integer")
+    return min(limit, MAX_LIMIT)
+
+def wants_cursor(args):
+    return 'after' in args or 'limit' in args
+
+def parse_cursor_args(args, sort_type=datetime.fromisoformat):
+    """Read ``after`` and ``limit`` from the query string; raise ValueError on bad input."""
+    limit = parse_limit(args.get('limit'))
+    after = args.get('after')
+    return (decode_cursor(after, sort_type) if after else None), limit
+
+# Seek past the cursor on (sort_column, id_column) instead of using OFFSET, so
+# the cost of a page does not grow with its depth.
+def seek(query, sort_column, id_column, after=None, descending=False):
+    if after is not None:
+        key = tuple_(sort_column, id_column)
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column, id_column)
+
+# Returns (rows, next_cursor); next_cursor is None on the last page.
+def keyset_page(query, sort_column, id_column, after=None, limit=DEFAULT_LIMIT, descending=False):
+    rows = seek(query, sort_column, id_column, after, descending).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
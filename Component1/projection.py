@@ -0,0 +1,38 @@
+"""Column projection for list endpoints.
+
+A list route describes its items as ``{field name: column}``. Clients may ask
+for a subset with ``?fields=name,other``; the route then selects only those
+columns (plus any it needs for ordering and cursors) and serializes only
+those fields, so neither the database nor the encoder touches the rest.
+"""
+
+def parse_fields(args, available):
+    """Field names requested with ``?fields=``, in request order; all of ``available`` when absent.
+
+    Raises ValueError for an empty list or unknown names.
+    """
+    raw = args.get('fields')
+    if raw is None:
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    if not names:
+        raise ValueError("fields must name at least one field")
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return names
+
+def columns_for(fields, available, *required):
+    """The columns to select for ``fields``, followed by ``required`` ones not already included."""
+    columns = [available[name] for name in fields]
+    return columns + [column for column in required if not any(column is c for c in columns)]
+
+def project(row, fields, available, formatters=None):
+    """Serialize the requested fields of a row, applying ``formatters[name]`` where given."""
+    formatters = formatters or {}
+    item = {}
+    for name in fields:
+        value = getattr(row, available[name].key)
+        format_value = formatters.get(name)
+        item[name] = format_value(value) if format_value and value is not None else value
+    return item
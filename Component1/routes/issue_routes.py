@@ -1,49 +1,216 @@
-from flask import Blueprint, jsonify, request
+import json
+from functools import partial
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import and_, func, insert, select
+from sqlalchemy.orm import undefer
 from models import db, Issue, Comment, Repository
+from cache import invalidate_repository
+from counters import count_new_comments, count_new_issues
+from http_cache import check_collection, collection_etag, with_collection_validators
+from pagination import keyset_page, parse_cursor_args, wants_cursor
+from projection import columns_for, parse_fields, project
+from search import search_issues, search_terms
 
 issue_bp = Blueprint('issue', __name__)
 
+# Resolve the repository and the issue in one query. Returns None when the
+# repository does not exist, otherwise a row whose Issue is None if the issue is missing.
+# `options` are loader options for the Issue, e.g. undefer(Issue.description).
+def find_issue(id, issue_id, *options):
+    return db.session.execute(
+        select(Repository.id, Issue)
+        .outerjoin(Issue, and_(Issue.repository_id == Repository.id, Issue.id == issue_id))
+        .where(Repository.id == id)
+        .options(*options)
+    ).first()
+
+# Fields of an issue in list responses; ?fields= selects a subset
+ISSUE_FIELDS = {
+    "id": Issue.id,
+    "title": Issue.title,
+    "status": Issue.status,
+    "submitter_id": Issue.submitter_id,
+    "comment_count": Issue.comment_count,
+}
+
+# A text field of a request body: a string, or null when the column is
+# nullable; ValueError otherwise
+def text_value(data, key, default=None, nullable=False):
+    value = data.get(key, default)
+    if value is None and nullable:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid input: {key} must be a string")
+    return value
+
+# Column values for a new issue or comment from a request body; ValueError on bad
+# input, so that nothing reaches the INSERT that the database would reject
+def new_issue_values(id, data):
+    if not isinstance(data, dict) or 'description' not in data or 'submitter_id' not in data:
+        raise ValueError("Invalid input: no issue description or submitter_id")
+    submitter_id = data['submitter_id']
+    if isinstance(submitter_id, bool):
+        raise ValueError("Invalid input: submitter_id must be an integer")
+    try:
+        submitter_id = int(submitter_id)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid input: submitter_id must be an integer")
+    return {
+        "repository_id": id,
+        "title": text_value(data, 'title', 'Untitled Issue'),
+        "description": text_value(data, 'description', nullable=True),
+        "status": 'Open',
+        "submitter_id": submitter_id
+    }
+
+def new_comment_values(issue_id, data):
+    if not isinstance(data, dict) or 'content' not in data:
+        raise ValueError("Invalid input, no commit content")
+    return {"issue_id": issue_id, "content": text_value(data, 'content')}
+
+# The items of a batch body: a JSON array, or one JSON object per line when
+# sent as application/x-ndjson. Raises ValueError on a malformed body.
+def read_batch():
+    if request.mimetype == 'application/x-ndjson':
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {number}")
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ValueError("Batch body must be a JSON array or NDJSON")
+    if not items:
+        raise ValueError("Batch is empty")
+    return items
+
+# Validate every item before anything is written; returns (rows, errors)
+def validate_batch(items, to_values):
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append(to_values(item))
+        except ValueError as e:
+            errors.append({"index": index, "message": str(e)})
+    return rows, errors
+
+# Insert all rows with multi-row INSERT ... RETURNING statements in the
+# request's transaction. RETURNING does not promise an order, but the ids are
+# assigned in row order, so sorting them lines them up with the rows.
+# (sort_by_parameter_order would make SQLite insert one row per statement.)
+def bulk_insert(model, rows):
+    return sorted(db.session.scalars(insert(model).returning(model.id), rows))
+
+# `count` is called with the number of rows inserted, to bump the counters
+def ingest_batch(id, model, to_values, count):
+    try:
+        items = read_batch()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    max_items = current_app.config['BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({"message": f"Batch too large: at most {max_items} items"}), 413
+
+    rows, errors = validate_batch(items, to_values)
+    if errors:
+        return jsonify({"message": "Invalid batch, nothing was created", "errors": errors}), 400
+
+    ids = bulk_insert(model, rows)
+    count(len(ids))
+    db.session.commit()
+    invalidate_repository(id)
+    return jsonify({"ids": ids, "message": f"{len(ids)} created"}), 201
+
 # 9. List repository issues
 @issue_bp.route('/repositories/<int:id>/issues', methods=['GET'])
 def list_repository_issues(id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    # Existence check and the list's validators, maintained with the counters, in one lookup
+    row = db.session.execute(
+        select(Repository.issues_version, Repository.issues_updated_at).where(Repository.id == id)
+    ).first()
+    if not row:
         return jsonify({"message": "Repository not found"}), 404
+    version, last_modified = row
+    etag = collection_etag(version)
+    not_modified = check_collection(etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    try:
+        fields = parse_fields(request.args, ISSUE_FIELDS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     status = request.args.get('status')
+    query = db.session.query(*columns_for(fields, ISSUE_FIELDS, Issue.created_at, Issue.id)).filter(Issue.repository_id == id)
+    if status:
+        query = query.filter(Issue.status == status)
+
+    def serialize(issue):
+        return project(issue, fields, ISSUE_FIELDS)
+
+    # Cursor mode: ?after=<cursor>&limit=N, ordered by (created_at, id)
+    if wants_cursor(request.args):
+        try:
+            after, limit = parse_cursor_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        issues, next_cursor = keyset_page(query, Issue.created_at, Issue.id, after, limit)
+        response = jsonify({"items": [serialize(issue) for issue in issues], "next_cursor": next_cursor})
+        return with_collection_validators(response, etag, last_modified)
+
     page = int(request.args.get('page', 1))
     size = int(request.args.get('size', 5))
 
-    query = Issue.query.filter_by(repository_id=id)
-    if status:
-        query = query.filter_by(status=status)
+    paginated_issues = query.order_by(Issue.created_at, Issue.id).paginate(page=page, per_page=size, error_out=False, count=False).items
+    return with_collection_validators(jsonify([serialize(issue) for issue in paginated_issues]), etag, last_modified)
+
+
+
+# 9b. Search repository issues: ?q=words&limit=N&after=<cursor>, best matches first
+@issue_bp.route('/repositories/<int:id>/issues/search', methods=['GET'])
+def search_repository_issues(id):
+    repository = db.session.get(Repository, id)
+    if not repository:
+        return jsonify({"message": "Repository not found"}), 404
 
-    paginated_issues = query.paginate(page=page, per_page=size, error_out=False).items
-    return jsonify([
-        {
-            "id": issue.id,
-            "title": issue.title,
-            "status": issue.status,
-            "submitter_id": issue.submitter_id
-        }
-        for issue in paginated_issues
-    ]), 200
+    terms = search_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({"message": "Missing search query"}), 400
+    try:
+        after, limit = parse_cursor_args(request.args, sort_type=float)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
+    results = search_issues(id, terms)
+    issues, next_cursor = keyset_page(db.session.query(results), results.c.rank, results.c.id, after, limit)
+    return jsonify({
+        "items": [
+            {"id": issue.id, "title": issue.title, "status": issue.status, "submitter_id": issue.submitter_id}
+            for issue in issues
+        ],
+        "next_cursor": next_cursor
+    })
 
 
 # 10. View a specific issue details
 @issue_bp.route('/repositories/<int:id>/issues/<int:issue_id>', methods=['GET'])
 def view_issue_details(id, issue_id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    row = find_issue(id, issue_id, undefer(Issue.description))
+    if not row:
         return jsonify({"message": "Repository not found"}), 404
-    issue = Issue.query.filter_by(repository_id=id, id=issue_id).first()
+    issue = row.Issue
     if not issue:
         return jsonify({"message": "Issue not found"}), 404
     page = int(request.args.get('page', 1))
     size = int(request.args.get('size', 5))
 
-    paginated_comments = Comment.query.filter_by(id=issue.id).order_by(Comment.created_at).paginate(page=page, per_page=size, error_out=False).items
+    paginated_comments = Comment.query.filter_by(issue_id=issue.id).order_by(Comment.created_at).paginate(page=page, per_page=size, error_out=False, count=False).items
 
     return jsonify({
         "id": issue.id,
@@ -51,7 +218,7 @@ def view_issue_details(id, issue_id):
         "description": issue.description,
         "status": issue.status,
         "submitter_id": issue.submitter_id,
-        "submission_date": issue.created_at.isoformat(),
+        "submission_date": issue.created_at,
         "comments": [
             {"id": comment.id, "content": comment.content}
             for comment in paginated_comments
@@ -66,32 +233,68 @@ def report_new_issue(id):
     if not repository:
         return jsonify({"message": "Repository not found"}), 404
 
-    data = request.get_json()
-    if not data or 'description' not in data or 'submitter_id' not in data:
-        return jsonify({"message": "Invalid input: no issue description or submitter_id"}), 400
-
-    issue = Issue(
-        repository_id=id,
-        title=data.get('title', 'Untitled Issue'),
-        description=data['description'],
-        status='Open',
-        submitter_id=int(data['submitter_id'])
-    )
+    try:
+        issue = Issue(**new_issue_values(id, request.get_json()))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     db.session.add(issue)
+    count_new_issues(repository)
+    # Read the id at flush time; after commit it would be reloaded with another query
+    db.session.flush()
+    issue_id = issue.id
     db.session.commit()
+    invalidate_repository(id)
+
+    return jsonify({"id": issue_id, "message": "Issue created successfully"}), 201
+
+
+# 11b. Report many issues at once (JSON array or NDJSON)
+@issue_bp.route('/repositories/<int:id>/issues:batch', methods=['POST'])
+def report_new_issues_batch(id):
+    repository = db.session.get(Repository, id)
+    if not repository:
+        return jsonify({"message": "Repository not found"}), 404
 
-    return jsonify({"id": issue.id, "message": "Issue created successfully"}), 201
+    return ingest_batch(id, Issue, lambda data: new_issue_values(id, data), partial(count_new_issues, repository))
 
 
 # 12. Paginate comments for an issue
 @issue_bp.route('/repositories/<int:id>/issues/<int:issue_id>/comments', methods=['GET'])
 def paginate_issue_comments(id, issue_id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    # Repository, issue and the list's validators in one query
+    row = db.session.execute(
+        select(Repository.id, Issue.id, func.count(Comment.id), func.max(Comment.id), func.max(Comment.created_at),
+               Issue.comment_count)
+        .outerjoin(Issue, and_(Issue.repository_id == Repository.id, Issue.id == issue_id))
+        .outerjoin(Comment, Comment.issue_id == Issue.id)
+        .where(Repository.id == id)
+        .group_by(Repository.id, Issue.id, Issue.comment_count)
+    ).first()
+    if not row:
         return jsonify({"message": "Repository not found"}), 404
-    issue = Issue.query.filter_by(repository_id=id, id=issue_id).first()
-    if not issue:
+    _, found_issue_id, count, max_id, last_modified, comment_count = row
+    if found_issue_id is None:
         return jsonify({"message": "Issue not found"}), 404
+    etag = collection_etag(count, max_id, last_modified, comment_count)
+    not_modified = check_collection(etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    query = Comment.query.filter_by(issue_id=issue_id)
+
+    # Cursor mode: ?after=<cursor>&limit=N, ordered by (created_at, id)
+    if wants_cursor(request.args):
+        try:
+            after, limit = parse_cursor_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        comments, next_cursor = keyset_page(query, Comment.created_at, Comment.id, after, limit)
+        response = jsonify({
+            "items": [{"id": comment.id, "content": comment.content} for comment in comments],
+            "next_cursor": next_cursor
+        })
+        return with_collection_validators(response, etag, last_modified)
 
     try:
         page = int(request.args.get('page', 1))
@@ -102,34 +305,47 @@ def paginate_issue_comments(id, issue_id):
     if page <= 0 or size <= 0:
         return jsonify({"message": "Page and size must be positive integers"}), 400
 
-    paginated_comments = Comment.query.filter_by(issue_id=issue.id).order_by(Comment.created_at).paginate(page=page, per_page=size, error_out=False).items
+    paginated_comments = query.order_by(Comment.created_at).paginate(page=page, per_page=size, error_out=False, count=False).items
 
-    return jsonify([
+    response = jsonify([
         {"id": comment.id, "content": comment.content}
         for comment in paginated_comments
-    ]), 200
+    ])
+    return with_collection_validators(response, etag, last_modified)
 
 
 # 13. Submit a new comment
 @issue_bp.route('/repositories/<int:id>/issues/<int:issue_id>/comments', methods=['POST'])
 def submit_new_comment(id, issue_id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    row = find_issue(id, issue_id)
+    if not row:
         return jsonify({"message": "Repository not found"}), 404
-
-    issue = Issue.query.filter_by(repository_id=id, id=issue_id).first()
+    issue = row.Issue
     if not issue:
         return jsonify({"message": "Issue not found"}), 404
 
-    data = request.get_json()
-    if not data or 'content' not in data:
-        return jsonify({"message": "Invalid input, no commit content"}), 400
+    try:
+        comment = Comment(**new_comment_values(issue_id, request.get_json()))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    comment = Comment(
-        issue_id=issue_id,
-        content=data['content']
-    )
     db.session.add(comment)
+    count_new_comments(issue)
+    db.session.flush()
+    comment_id = comment.id
     db.session.commit()
+    invalidate_repository(id)
+
+    return jsonify({"id": comment_id, "message": "Comment added successfully"}), 201
+
+
+# 13b. Submit many comments at once (JSON array or NDJSON)
+@issue_bp.route('/repositories/<int:id>/issues/<int:issue_id>/comments:batch', methods=['POST'])
+def submit_new_comments_batch(id, issue_id):
+    row = find_issue(id, issue_id)
+    if not row:
+        return jsonify({"message": "Repository not found"}), 404
+    if not row.Issue:
+        return jsonify({"message": "Issue not found"}), 404
 
-    return jsonify({"id": comment.id, "message": "Comment added successfully"}), 201
+    return ingest_batch(id, Comment, lambda data: new_comment_values(issue_id, data), partial(count_new_comments, row.Issue))
@@ -1,18 +1,37 @@
-from flask import Blueprint, jsonify, request
-from models import db, Repository, Branch, Tag, Commit
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import and_, join, select
+from sqlalchemy.orm import undefer
+from models import db, Repository, Branch, Tag, Commit, TreeObject
+from cache import cached
+from database import read_only
+from commit_graph import repository_graph
+from http_cache import immutable, versioned
+from pagination import decode_cursor, keyset_page, parse_cursor_args, seek, wants_cursor
+from projection import columns_for, parse_fields, project
+from tree_cache import ResolvedTree, tree_cache
 
 repo_bp = Blueprint('repository', __name__)
 
+# Each route resolves the repository together with the rows it needs in a
+# single query: the repository is the outer side of a LEFT JOIN, so no row
+# means "repository missing" and a NULL child means "child missing".
+
 # 1. Get repository default view (the latest commit on the main branch.)
+# The branch's maintained head pointer makes this one lookup by primary keys
 @repo_bp.route('/repositories/<int:id>', methods=['GET'])
+@cached('repositories:{id}')
 def get_repository_default(id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    row = db.session.execute(
+        select(Repository, Branch, Commit)
+        .outerjoin(Branch, and_(Branch.repository_id == Repository.id, Branch.name == 'main'))
+        .outerjoin(Commit, Commit.id == Branch.head_commit_id)
+        .where(Repository.id == id)
+    ).first()
+    if not row:
         return jsonify({"message": "Repository_id Error. Repository not found"}), 404
-    main_branch = Branch.query.filter_by(repository_id=id, name='main').one_or_none()
+    repository, main_branch, latest_commit = row
     if not main_branch:
         return jsonify({"message": "Main branch not found in the repository"}), 404
-    latest_commit = Commit.query.filter_by(branch_id=main_branch.id).order_by(Commit.created_at.desc()).first()
     if not latest_commit:
         return jsonify({"message": "No commits found on the main branch"}), 404
 
@@ -21,7 +40,9 @@ def get_repository_default(id):
             "id": repository.id,
             "name": repository.name,
             "description": repository.description,
-            "author_id": repository.author_id
+            "author_id": repository.author_id,
+            "open_issue_count": repository.open_issue_count,
+            "closed_issue_count": repository.closed_issue_count
         },
         "main_branch": {
             "id": main_branch.id,
@@ -35,38 +56,109 @@ def get_repository_default(id):
         }
     }), 200
 
+# Fields of a commit in list responses; ?fields= selects a subset
+COMMIT_FIELDS = {
+    "commit id": Commit.id,
+    "hash": Commit.hash,
+    "message": Commit.message,
+    "created_at": Commit.created_at,
+}
+COMMIT_FORMATTERS = {"created_at": lambda value: value.isoformat(sep=' ', timespec='seconds')}
+
+def serialize_commit(row, fields=tuple(COMMIT_FIELDS)):
+    return project(row, fields, COMMIT_FIELDS, COMMIT_FORMATTERS)
+
+# Rows fetched per round trip when streaming a commit history
+STREAM_BATCH_SIZE = 1000
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def wants_history_mode():
+    return wants_cursor(request.args) or wants_ndjson()
+
+# Commit history of a branch, newest first, in one of two modes:
+#   ?limit=N&after=<cursor>  one page as {"items": [...], "next_cursor": ...}
+#   ?format=ndjson           the whole history (from `after`, if given) as
+#                            newline-delimited JSON, streamed from a server-side
+#                            cursor so memory stays flat however long it is
+def commit_history(branch_id, fields):
+    columns = columns_for(fields, COMMIT_FIELDS, Commit.created_at, Commit.id)
+    query = db.session.query(*columns).filter(Commit.branch_id == branch_id)
+
+    if wants_ndjson():
+        after = request.args.get('after')
+        try:
+            after = decode_cursor(after) if after else None
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        rows = seek(query, Commit.created_at, Commit.id, after, descending=True).yield_per(STREAM_BATCH_SIZE)
+        dumps = current_app.json.dumps
+
+        def generate():
+            for row in rows:
+                yield dumps(serialize_commit(row, fields)) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        after, limit = parse_cursor_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    commits, next_cursor = keyset_page(query, Commit.created_at, Commit.id, after, limit, descending=True)
+    return jsonify({"items": [serialize_commit(commit, fields) for commit in commits], "next_cursor": next_cursor}), 200
+
 # 2. Navigate to commits in the main branch
 @repo_bp.route('/repositories/<int:id>/branches/main/commits', methods=['GET'])
 def navigate_to_commits_in_main_branch(id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    try:
+        fields = parse_fields(request.args, COMMIT_FIELDS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if wants_history_mode():
+        row = db.session.execute(
+            select(Repository.id, Branch.id)
+            .outerjoin(Branch, and_(Branch.repository_id == Repository.id, Branch.name == 'main'))
+            .where(Repository.id == id)
+        ).first()
+        if not row:
+            return jsonify({"message": "Repository not found"}), 404
+        if row[1] is None:
+            return jsonify({"message": "Main branch not found"}), 404
+        return commit_history(row[1], fields)
+
+    rows = db.session.execute(
+        select(Repository.id.label('repository_id'), Branch.id.label('branch_id'), *columns_for(fields, COMMIT_FIELDS, Commit.id))
+        .outerjoin(Branch, and_(Branch.repository_id == Repository.id, Branch.name == 'main'))
+        .outerjoin(Commit, Commit.branch_id == Branch.id)
+        .where(Repository.id == id)
+        .order_by(Commit.id)
+    ).all()
+    if not rows:
         return jsonify({"message": "Repository not found"}), 404
-    main_branch = Branch.query.filter_by(repository_id=id, name='main').one_or_none()
-    if not main_branch:
+    if rows[0][1] is None:
         return jsonify({"message": "Main branch not found"}), 404
 
-    commits = Commit.query.filter_by(branch_id=main_branch.id).all()
-    return jsonify([
-        {
-            "commit id": commit.id,
-            "hash": commit.hash,
-            "message": commit.message,
-            "created_at": commit.created_at.isoformat(sep=' ', timespec='seconds')
-        }
-        for commit in commits
-    ]), 200
+    return jsonify([serialize_commit(row, fields) for row in rows if row.id is not None]), 200
 
 # 3. Select commit by hash
 @repo_bp.route('/repositories/<int:id>/commits/<string:hash>', methods=['GET'])
+@immutable
 def select_commit_by_hash(id, hash):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    row = db.session.execute(
+        select(Repository.id, Commit)
+        .outerjoin(
+            join(Commit, Branch, Commit.branch_id == Branch.id),
+            and_(Branch.repository_id == Repository.id, Commit.hash == hash)
+        )
+        .where(Repository.id == id)
+    ).first()
+    if not row:
         return jsonify({"message": "Repository not found"}), 404
-
-    commit = Commit.query.join(Branch).filter(
-        Branch.repository_id == id,
-        Commit.hash == hash
-    ).one_or_none()
+    commit = row.Commit
     if not commit:
         return jsonify({"message": "Commit not found"}), 404
 
@@ -79,80 +171,249 @@ def select_commit_by_hash(id, hash):
     }), 200
 
 
+# Commits of a repository by hash in one query: None when the repository does
+# not exist, otherwise {hash: row} for the hashes found
+def find_commits(id, hashes):
+    rows = db.session.execute(
+        select(Repository.id.label('repository_id'), Repository.graph_version, *COMMIT_FIELDS.values(), Commit.branch_id)
+        .outerjoin(
+            join(Commit, Branch, Commit.branch_id == Branch.id),
+            and_(Branch.repository_id == Repository.id, Commit.hash.in_(hashes))
+        )
+        .where(Repository.id == id)
+    ).all()
+    if not rows:
+        return None
+    return {row.hash: row for row in rows if row.id is not None}
+
+# Base and head commits with the repository's commit graph. Returns
+# ((graph, base row, head row), None), or (None, reason) where reason is
+# "repository" or "commit" for whichever is not found.
+def load_commit_pair(id, base, head):
+    commits = find_commits(id, [base, head])
+    if commits is None:
+        return None, "repository"
+    if base not in commits or head not in commits:
+        return None, "commit"
+    base_row, head_row = commits[base], commits[head]
+    return (repository_graph(id, base_row.graph_version, base_row.id, head_row.id), base_row, head_row), None
+
+# Version of the repository's commit graph, for the ETags of the routes that walk it
+def graph_version(id, **kwargs):
+    return db.session.scalar(select(Repository.graph_version).where(Repository.id == id))
+
+# Commit rows for graph positions, in the order given; rows already at hand
+# in `known` ({id: row}) are not fetched again
+def commit_rows(graph, positions, known):
+    ids = [graph.ids[i] for i in positions]
+    wanted = [commit_id for commit_id in ids if commit_id not in known]
+    if wanted:
+        known = {**known, **{row.id: row for row in db.session.execute(
+            select(*COMMIT_FIELDS.values()).where(Commit.id.in_(wanted))
+        )}}
+    return [known[commit_id] for commit_id in ids if commit_id in known]
+
+# 3b. Compare two commits: the commits on head since it diverged from base
+# (oldest first, up to COMPARE_MAX_COMMITS) and how far each is ahead
+@repo_bp.route('/repositories/<int:id>/compare/<string:base>...<string:head>', methods=['GET'])
+@versioned(graph_version)
+def compare_commits(id, base, head):
+    pair, missing = load_commit_pair(id, base, head)
+    if missing == "repository":
+        return jsonify({"message": "Repository not found"}), 404
+    if missing == "commit":
+        return jsonify({"message": "Base or head commit not found"}), 404
+    graph, base_row, head_row = pair
+
+    b, h = graph.index(base_row.id), graph.index(head_row.id)
+    ahead, behind = graph.only(h, b), graph.only(b, h)
+    if not ahead and not behind:
+        status = "identical"
+    elif not behind:
+        status = "ahead"
+    elif not ahead:
+        status = "behind"
+    else:
+        status = "diverged"
+
+    known = {base_row.id: base_row, head_row.id: head_row}
+    listed = list(reversed(ahead))[:current_app.config['COMPARE_MAX_COMMITS']]
+    merge_bases = graph.merge_bases(b, h)[:1]
+    rows = commit_rows(graph, merge_bases + listed, known)
+    merge_base = rows.pop(0) if merge_bases else None
+
+    return jsonify({
+        "status": status,
+        "ahead_by": len(ahead),
+        "behind_by": len(behind),
+        "base_commit": serialize_commit(base_row),
+        "head_commit": serialize_commit(head_row),
+        "merge_base_commit": serialize_commit(merge_base) if merge_base else None,
+        "commits": [serialize_commit(row) for row in rows]
+    }), 200
+
+# 3c. Merge base of two commits: their best common ancestors (several after
+# criss-cross merges, none for unrelated histories)
+@repo_bp.route('/repositories/<int:id>/merge-base/<string:base>...<string:head>', methods=['GET'])
+@versioned(graph_version)
+def get_merge_base(id, base, head):
+    pair, missing = load_commit_pair(id, base, head)
+    if missing == "repository":
+        return jsonify({"message": "Repository not found"}), 404
+    if missing == "commit":
+        return jsonify({"message": "Base or head commit not found"}), 404
+    graph, base_row, head_row = pair
+
+    merge_bases = graph.merge_bases(graph.index(base_row.id), graph.index(head_row.id))
+    rows = commit_rows(graph, merge_bases, {base_row.id: base_row, head_row.id: head_row})
+    return jsonify({"merge_bases": [serialize_commit(row) for row in rows]}), 200
+
+
+# 3d. Look up many commits by hash: the body is a JSON array of hashes, resolved
+# with one IN query; found commits in request order, unknown hashes listed apart
+@repo_bp.route('/repositories/<int:id>/commits:lookup', methods=['POST'])
+@read_only
+def lookup_commits(id):
+    hashes = request.get_json(silent=True)
+    if not isinstance(hashes, list) or not all(isinstance(hash, str) and hash for hash in hashes):
+        return jsonify({"message": "Body must be a JSON array of commit hashes"}), 400
+    if not hashes:
+        return jsonify({"message": "No hashes given"}), 400
+    max_items = current_app.config['BATCH_MAX_ITEMS']
+    if len(hashes) > max_items:
+        return jsonify({"message": f"Too many hashes: at most {max_items}"}), 413
+
+    hashes = list(dict.fromkeys(hashes))
+    commits = find_commits(id, hashes)
+    if commits is None:
+        return jsonify({"message": "Repository not found"}), 404
+
+    return jsonify({
+        "found": [{**serialize_commit(commits[hash]), "branch id": commits[hash].branch_id}
+                  for hash in hashes if hash in commits],
+        "missing": [hash for hash in hashes if hash not in commits]
+    }), 200
+
 # 4. List all branches
 @repo_bp.route('/repositories/<int:id>/branches', methods=['GET'])
+@cached('repositories:{id}:branches')
 def list_all_branches(id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    rows = db.session.execute(
+        select(Repository.id, Branch.id.label('branch_id'), Branch.name)
+        .outerjoin(Branch, Branch.repository_id == Repository.id)
+        .where(Repository.id == id)
+        .order_by(Branch.id)
+    ).all()
+    if not rows:
         return jsonify({"message": "Repository not found"}), 404
 
-    branches = Branch.query.filter_by(repository_id=id).all()
-    return jsonify([{"branch id": branch.id, "branch name": branch.name} for branch in branches]), 200
+    return jsonify([{"branch id": row.branch_id, "branch name": row.name} for row in rows if row.branch_id]), 200
 
 # 5. List all tags
 @repo_bp.route('/repositories/<int:id>/tags', methods=['GET'])
+@cached('repositories:{id}:tags')
 def list_all_tags(id):
-    repository = db.session.get(Repository, id)
-    if not repository:
+    # An IN subquery keeps SQLite on the indexes; a nested join on the right
+    # of the LEFT JOIN would be materialized from a scan of every tag
+    repository_commits = select(Commit.id).join(Branch, Commit.branch_id == Branch.id).where(Branch.repository_id == id)
+    rows = db.session.execute(
+        select(Repository.id, Tag.id.label('tag_id'), Tag.name)
+        .outerjoin(Tag, Tag.commit_id.in_(repository_commits))
+        .where(Repository.id == id)
+        .order_by(Tag.id)
+    ).all()
+    if not rows:
         return jsonify({"message": "Repository not found"}), 404
 
-    tags = Tag.query.join(Commit).join(Branch).filter(Branch.repository_id == id).all()
-    return jsonify([{"tag id": tag.id, "tag name": tag.name} for tag in tags]), 200
+    return jsonify([{"tag id": row.tag_id, "tag name": row.name} for row in rows if row.tag_id]), 200
 
 # 6. List all commits in a branch
 @repo_bp.route('/repositories/<int:id>/branches/<string:branch>/commits', methods=['GET'])
 def list_all_commits(id, branch):
-    branch_obj = Branch.query.filter_by(repository_id=id, name=branch).one_or_none()
-    if not branch_obj:
+    try:
+        fields = parse_fields(request.args, COMMIT_FIELDS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if wants_history_mode():
+        branch_id = db.session.scalar(select(Branch.id).where(Branch.repository_id == id, Branch.name == branch))
+        if branch_id is None:
+            return jsonify({"message": "Repository or branch not found"}), 404
+        return commit_history(branch_id, fields)
+
+    rows = db.session.execute(
+        select(Branch.id.label('branch_id'), *columns_for(fields, COMMIT_FIELDS, Commit.id))
+        .outerjoin(Commit, Commit.branch_id == Branch.id)
+        .where(Branch.repository_id == id, Branch.name == branch)
+        .order_by(Commit.id)
+    ).all()
+    if not rows:
         return jsonify({"message": "Repository or branch not found"}), 404
 
-    commits = Commit.query.filter_by(branch_id=branch_obj.id).all()
-    return jsonify([{"commit id": commit.id, "hash": commit.hash, "message": commit.message, 
-                     "created_at": commit.created_at.isoformat(sep=' ', timespec='seconds') } 
-                     for commit in commits]), 200
+    return jsonify([serialize_commit(row, fields) for row in rows if row.id is not None]), 200
+
+# Commit and its root tree object (None for commits still on the legacy
+# tree_structure column) in one query
+def find_commit_tree(id, branch, hash):
+    return db.session.execute(
+        select(Commit, TreeObject)
+        .options(undefer(Commit.tree_structure))
+        .join(Branch, Commit.branch_id == Branch.id)
+        .outerjoin(TreeObject, TreeObject.hash == Commit.root_tree_hash)
+        .where(Branch.repository_id == id, Branch.name == branch, Commit.hash == hash)
+    ).first()
+
+# The commit's resolved tree, from the tree cache when possible. Returns
+# (tree, None), or (None, reason) where reason is "commit" when the commit is
+# not found and "tree" when it has no tree stored.
+def load_tree(id, branch, hash):
+    cache = tree_cache()
+    key = (id, branch, hash)
+    tree = cache.get(key)
+    if tree is not None:
+        return tree, None
+
+    row = find_commit_tree(id, branch, hash)
+    if not row:
+        return None, "commit"
+    commit, root = row
+    if root:
+        tree = ResolvedTree.from_store(root)
+    elif commit.tree_structure:
+        tree = ResolvedTree.from_legacy(commit.tree_structure)
+    else:
+        return None, "tree"
+    cache.put(key, tree, tree.size)
+    return tree, None
 
 # 7. Get top-level tree in a commit
 @repo_bp.route('/repositories/<int:id>/branches/<string:branch>/commits/<string:hash>/tree', methods=['GET'])
+@immutable
 def get_top_level_tree(id, branch, hash):
-    commit = Commit.query.join(Branch).filter(
-        Branch.repository_id == id,
-        Branch.name == branch,
-        Commit.hash == hash
-    ).one_or_none()
-    if not commit:
+    tree, missing = load_tree(id, branch, hash)
+    if missing == "commit":
         return jsonify({"message": "Repository, branch, or commit not found"}), 404
-    if not commit.tree_structure:
+    if missing == "tree":
         return jsonify({"message": "No top-level tree available for this commit"}), 404
 
-    return jsonify({"tree": commit.tree_structure}), 200
+    return jsonify({"tree": tree.root}), 200
 
 
 # 8. View file or sub-tree
 @repo_bp.route('/repositories/<int:id>/branches/<string:branch>/commits/<string:hash>/tree/<path:path>', methods=['GET'])
+@immutable
 def view_file_or_subtree(id, branch, hash, path):
-    commit = Commit.query.join(Branch).filter(
-        Branch.repository_id == id,
-        Branch.name == branch,
-        Commit.hash == hash
-    ).first()
-    if not commit:
+    tree, missing = load_tree(id, branch, hash)
+    if missing == "commit":
         return jsonify({"message": "Repository, branch, or commit not found"}), 404
-    if not commit.tree_structure:
+    if missing == "tree":
         return jsonify({"message": "No directory tree available for this commit"}), 404
 
-    def get_tree_at_path(tree, path):
-        segments = path.split('/')
-        current = tree
-
-        for segment in segments:
-            if "children" in current and segment in current["children"]:
-                current = current["children"][segment]
-            else:
-                return None
-        return current
-
-    subtree = get_tree_at_path(commit.tree_structure, path)
-    if not subtree:
+    subtree, grew = tree.lookup(path)
+    if grew:
+        # Account for the newly cached paths
+        tree_cache().put((id, branch, hash), tree, tree.size)
+    if subtree is None:
         return jsonify({"message": "File or directory not found"}), 404
 
     return jsonify(subtree), 200
@@ -0,0 +1,96 @@
+"""Full-text search over issues and their comments.
+
+On SQLite, ``issue_search`` is an FTS5 table with one row per issue (rowid =
+issue id) holding its title, description and the text of all its comments.
+Triggers on ``issues`` and ``comments`` keep it in sync, so every insert path
+(the single-row routes, the batch routes, the CLI) is indexed without the
+routes doing anything. Results are ranked with bm25, weighting the title above
+the description above the comments.
+
+Other databases fall back to ``LIKE`` over the same columns, unranked.
+"""
+import re
+
+from sqlalchemy import DDL, and_, column, event, exists, func, literal, literal_column, or_, select, table, text
+
+from models import db, Issue, Comment
+
+# bm25 weights for (title, description, comments)
+WEIGHTS = (10.0, 5.0, 1.0)
+
+issue_search = table('issue_search', column('rowid'))
+
+# The table stores its own copy of the text: an external-content table could
+# not hold the comments, and contentless tables cannot be updated in place.
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS issue_search USING fts5(title, description, comments, tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS issue_search_issue_insert AFTER INSERT ON issues BEGIN
+        INSERT INTO issue_search (rowid, title, description, comments)
+        VALUES (new.id, new.title, coalesce(new.description, ''), '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_search_issue_update AFTER UPDATE OF title, description ON issues BEGIN
+        UPDATE issue_search SET title = new.title, description = coalesce(new.description, '') WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_search_issue_delete AFTER DELETE ON issues BEGIN
+        DELETE FROM issue_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_search_comment_insert AFTER INSERT ON comments BEGIN
+        UPDATE issue_search SET comments = comments || char(10) || new.content WHERE rowid = new.issue_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_search_comment_delete AFTER DELETE ON comments BEGIN
+        UPDATE issue_search SET comments = coalesce(
+            (SELECT group_concat(content, char(10)) FROM comments WHERE issue_id = old.issue_id), ''
+        ) WHERE rowid = old.issue_id;
+    END""",
+]
+
+REBUILD_SQL = [
+    "DELETE FROM issue_search",
+    """INSERT INTO issue_search (rowid, title, description, comments)
+    SELECT issues.id, issues.title, coalesce(issues.description, ''), coalesce(
+        (SELECT group_concat(content, char(10)) FROM comments WHERE comments.issue_id = issues.id), ''
+    ) FROM issues""",
+]
+
+for statement in SEARCH_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL("DROP TABLE IF EXISTS issue_search").execute_if(dialect='sqlite'))
+
+def create_search_index(connection):
+    """Create the index and its triggers on an existing database and fill it."""
+    for statement in SEARCH_DDL + REBUILD_SQL:
+        connection.execute(text(statement))
+
+def search_terms(q):
+    """The words of a query, or [] if it has none; punctuation is dropped."""
+    return re.findall(r"\w+", q or "")
+
+# Every word must match; quoting keeps FTS5 operators in user input literal
+def match_expression(terms):
+    return " ".join(f'"{term}"' for term in terms)
+
+def search_issues(id, terms):
+    """Subquery of the repository's issues matching every term, with a ``rank`` column (lower is better)."""
+    columns = (Issue.id, Issue.title, Issue.status, Issue.submitter_id)
+    if db.session.get_bind().dialect.name == 'sqlite':
+        rank = func.bm25(literal_column('issue_search'), *WEIGHTS)
+        query = (
+            select(*columns, rank.label('rank'))
+            .join_from(issue_search, Issue, Issue.id == issue_search.c.rowid)
+            .where(text("issue_search MATCH :match").bindparams(match=match_expression(terms)))
+            .where(Issue.repository_id == id)
+        )
+    else:
+        query = (
+            select(*columns, literal(0.0).label('rank'))
+            .where(Issue.repository_id == id)
+            .where(and_(*(
+                or_(
+                    Issue.title.icontains(term, autoescape=True),
+                    Issue.description.icontains(term, autoescape=True),
+                    exists().where(Comment.issue_id == Issue.id, Comment.content.icontains(term, autoescape=True))
+                )
+                for term in terms
+            )))
+        )
+    return query.subquery('results')
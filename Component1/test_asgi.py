@@ -0,0 +1,237 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+import flask
+from sqlalchemy.util import await_only
+
+pytest.importorskip("asgiref")
+
+from asgi import PooledWsgiToAsgi, create_asgi_app
+from app import create_app
+from database import create_async_engines
+from models import db, Repository, Branch, Commit
+
+@pytest.fixture
+def flask_app(tmp_path):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'asgi.db'}"})
+    with app.app_context():
+        db.create_all()
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commits = [Commit(hash=f"{n:06x}", message=f"Commit {n}", branch_id=1) for n in range(20)]
+        db.session.add_all([repository, branch_main, *commits])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+# The ASGI app with GET requests on the event loop; its async engines are disposed afterwards
+@pytest.fixture
+def async_app(flask_app):
+    pytest.importorskip("aiosqlite")
+    assert create_async_engines(flask_app, db)
+    yield PooledWsgiToAsgi(flask_app, 4, async_reads=True)
+    for engine in flask_app.extensions["async_engines"].values():
+        asyncio.run(engine.dispose())
+
+# Sends one HTTP request through an ASGI app; returns (status, headers, body chunks)
+async def call(asgi_app, method, path, body=b"", headers=()):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"content-length", str(len(body)).encode()), *headers],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = sent[0]
+    headers = {name.decode().lower(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers, [m["body"] for m in sent[1:] if m.get("body")]
+
+def request(asgi_app, method, path, **kwargs):
+    status, headers, chunks = asyncio.run(call(asgi_app, method, path, **kwargs))
+    return status, headers, b"".join(chunks)
+
+# Test: responses through ASGI are the ones the WSGI app gives
+def test_asgi_matches_wsgi(flask_app):
+    asgi_app = PooledWsgiToAsgi(flask_app, 4)
+    client = flask_app.test_client()
+    for path in ["/repositories/1", "/repositories/1/branches/main/commits", "/repositories/1/issues", "/repositories/99"]:
+        expected = client.get(path)
+        status, headers, body = request(asgi_app, "GET", path)
+        assert status == expected.status_code
+        assert body == expected.data
+        assert headers["content-type"] == expected.content_type
+
+# Test: POST bodies reach the route handlers
+def test_asgi_post(flask_app):
+    asgi_app = PooledWsgiToAsgi(flask_app, 4)
+    body = json.dumps({"title": "From ASGI", "description": "Async client", "submitter_id": 1}).encode()
+    status, _, data = request(asgi_app, "POST", "/repositories/1/issues", body=body,
+                              headers=[(b"content-type", b"application/json")])
+    assert status == 201
+    status, _, data = request(asgi_app, "GET", "/repositories/1/issues/1")
+    assert status == 200
+    assert json.loads(data)["title"] == "From ASGI"
+
+# Test: a streamed NDJSON history arrives in chunks, one line per commit
+def test_asgi_streams_ndjson(flask_app):
+    asgi_app = PooledWsgiToAsgi(flask_app, 4)
+    status, headers, chunks = asyncio.run(call(asgi_app, "GET", "/repositories/1/branches/main/commits?format=ndjson"))
+    assert status == 200
+    assert headers["content-type"] == "application/x-ndjson"
+    assert len(chunks) > 1
+    assert len(b"".join(chunks).splitlines()) == 20
+
+# Test: concurrent requests run on separate threads rather than one after another
+def test_asgi_runs_requests_concurrently(flask_app):
+    barrier = threading.Barrier(4, timeout=5)
+    threads = set()
+
+    @flask_app.before_request
+    def wait_for_others():
+        threads.add(threading.get_ident())
+        # Only passes when all four requests are in flight at once
+        barrier.wait()
+
+    asgi_app = PooledWsgiToAsgi(flask_app, 4)
+
+    async def main():
+        return await asyncio.gather(*(call(asgi_app, "GET", "/repositories/1") for _ in range(4)))
+
+    assert [status for status, _, _ in asyncio.run(main())] == [200] * 4
+    assert len(threads) == 4
+
+# Test: no more than max_threads requests run their handlers at once
+def test_asgi_limits_threads(flask_app):
+    lock = threading.Lock()
+    running = [0, 0]  # now, most at once
+
+    @flask_app.before_request
+    def count():
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    asgi_app = PooledWsgiToAsgi(flask_app, 2)
+
+    async def main():
+        return await asyncio.gather(*(call(asgi_app, "GET", "/repositories/1") for _ in range(6)))
+
+    assert [status for status, _, _ in asyncio.run(main())] == [200] * 6
+    assert running[1] == 2
+
+# Test: lifespan startup and shutdown are acknowledged
+def test_asgi_lifespan(flask_app):
+    asgi_app = PooledWsgiToAsgi(flask_app, 2)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi_app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+# Test: reads on the event loop give the responses the WSGI app gives, streamed ones included
+def test_async_reads_match_wsgi(flask_app, async_app):
+    client = flask_app.test_client()
+    paths = ["/repositories/1", "/repositories/1/branches/main/commits", "/repositories/1/issues", "/repositories/99",
+             "/repositories/1/branches/main/commits?format=ndjson"]
+
+    async def main():
+        return await asyncio.gather(*(call(async_app, "GET", path) for path in paths))
+
+    for path, (status, headers, chunks) in zip(paths, asyncio.run(main())):
+        expected = client.get(path)
+        assert status == expected.status_code
+        assert b"".join(chunks) == expected.data
+        assert headers["content-type"] == expected.content_type
+    assert len(chunks) > 1
+
+# Test: GET requests query through the async driver on the loop's thread, writes through the sync one on a thread
+def test_async_reads_use_async_driver(flask_app, async_app):
+    seen = []
+
+    @flask_app.before_request
+    def record():
+        seen.append((flask.request.path, threading.get_ident(), db.session.get_bind().dialect.driver))
+
+    body = json.dumps({"description": "From ASGI", "submitter_id": 1}).encode()
+
+    async def main():
+        await call(async_app, "GET", "/repositories/1")
+        status, _, _ = await call(async_app, "POST", "/repositories/1/issues", body=body,
+                                  headers=[(b"content-type", b"application/json")])
+        assert status == 201
+        status, _, data = await call(async_app, "GET", "/repositories/1/issues/1")
+        assert status == 200 and json.loads(b"".join(data))["description"] == "From ASGI"
+
+    asyncio.run(main())
+    loop_thread = threading.get_ident()
+    assert [(path, thread == loop_thread, driver) for path, thread, driver in seen] == [
+        ("/repositories/1", True, "aiosqlite"),
+        ("/repositories/1/issues", False, "pysqlite"),
+        ("/repositories/1/issues/1", True, "aiosqlite"),
+    ]
+
+# Test: a read waiting on the loop lets the others run, without a thread each, up to max_threads at once
+def test_async_reads_interleave(flask_app, async_app):
+    running = [0, 0]  # now, most at once
+
+    @flask_app.before_request
+    def wait():
+        running[0] += 1
+        running[1] = max(running)
+        # Stands in for a slow query: the greenlet waits on the loop
+        await_only(asyncio.sleep(0.05))
+        running[0] -= 1
+
+    async def main():
+        return await asyncio.gather(*(call(async_app, "GET", "/repositories/1") for _ in range(6)))
+
+    assert [status for status, _, _ in asyncio.run(main())] == [200] * 6
+    assert running[1] == 4
+
+# Test: the factory turns async reads on for a SQLite file and off for an in-memory database
+def test_create_asgi_app_async_reads(tmp_path):
+    pytest.importorskip("aiosqlite")
+    asgi_app = create_asgi_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'factory.db'}"})
+    assert asgi_app.async_reads
+    engines = list(asgi_app.wsgi_application.extensions["async_engines"].values())
+    assert [(engine.dialect.driver, type(engine.pool).__name__) for engine in engines] == [("aiosqlite", "AsyncAdaptedQueuePool")]
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    # Shutdown disposes of the async engines, which would otherwise keep the process alive
+    asyncio.run(asgi_app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert not create_asgi_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"}).async_reads
+    assert not create_asgi_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'off.db'}",
+                                "ASGI_ASYNC_READS": False}).async_reads
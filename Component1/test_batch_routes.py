@@ -0,0 +1,150 @@
+import json
+
+import pytest
+from app import create_app
+from models import db, Repository, Issue, Comment
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "BATCH_MAX_ITEMS": 10})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1)
+        db.session.add_all([repository, issue])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def ndjson(items):
+    return "\n".join(json.dumps(item) for item in items) + "\n"
+
+# Test: a JSON array of issues is created in order and the new ids are returned
+def test_issue_batch_json(client):
+    response = client.post('/repositories/1/issues:batch', json=[
+        {"title": "First", "description": "a", "submitter_id": 2},
+        {"description": "b", "submitter_id": "3"},
+    ])
+    assert response.status_code == 201
+    ids = response.get_json()["ids"]
+    assert ids == [2, 3]
+
+    assert client.get('/repositories/1/issues/2').get_json()["title"] == "First"
+    second = client.get('/repositories/1/issues/3').get_json()
+    assert second["title"] == "Untitled Issue"
+    assert second["status"] == "Open"
+    assert second["submitter_id"] == 3
+
+# Test: NDJSON bodies are accepted, blank lines are skipped
+def test_issue_batch_ndjson(client):
+    body = ndjson([{"description": f"Issue {n}", "submitter_id": 1} for n in range(3)]) + "\n"
+    response = client.post('/repositories/1/issues:batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert response.get_json()["ids"] == [2, 3, 4]
+
+# Test: one invalid item rejects the whole batch, with the index of every bad item
+def test_issue_batch_validates_up_front(app, client):
+    response = client.post('/repositories/1/issues:batch', json=[
+        {"description": "ok", "submitter_id": 1},
+        {"description": "no submitter"},
+        {"description": "bad submitter", "submitter_id": "abc"},
+        "not an object",
+    ])
+    assert response.status_code == 400
+    assert [error["index"] for error in response.get_json()["errors"]] == [1, 2, 3]
+    with app.app_context():
+        assert Issue.query.count() == 1
+
+# Test: malformed, empty and oversized batches are rejected
+@pytest.mark.parametrize("kwargs, status", [
+    ({"json": {"description": "not a list", "submitter_id": 1}}, 400),
+    ({"json": []}, 400),
+    ({"data": '{"description": "a", "submitter_id": 1}\n{oops', "content_type": "application/x-ndjson"}, 400),
+    ({"json": [{"description": "a", "submitter_id": 1}] * 11}, 413),
+])
+def test_issue_batch_bad_body(client, kwargs, status):
+    response = client.post('/repositories/1/issues:batch', **kwargs)
+    assert response.status_code == status
+
+# Test: batch into a missing repository
+def test_issue_batch_repository_not_found(client):
+    response = client.post('/repositories/99/issues:batch', json=[{"description": "a", "submitter_id": 1}])
+    assert response.status_code == 404
+    assert response.get_json()["message"] == "Repository not found"
+
+# Test: comments batch as JSON array and NDJSON
+def test_comment_batch(app, client):
+    response = client.post('/repositories/1/issues/1/comments:batch', json=[{"content": "one"}, {"content": "two"}])
+    assert response.status_code == 201
+    assert response.get_json()["ids"] == [1, 2]
+
+    response = client.post('/repositories/1/issues/1/comments:batch', data=ndjson([{"content": "three"}]),
+                           content_type='application/x-ndjson')
+    assert response.get_json()["ids"] == [3]
+    with app.app_context():
+        assert [comment.content for comment in Comment.query.order_by(Comment.id)] == ["one", "two", "three"]
+
+# Test: comments batch errors
+def test_comment_batch_errors(client):
+    assert client.post('/repositories/99/issues/1/comments:batch', json=[{"content": "x"}]).status_code == 404
+    response = client.post('/repositories/1/issues/99/comments:batch', json=[{"content": "x"}])
+    assert response.status_code == 404
+    assert response.get_json()["message"] == "Issue not found"
+    response = client.post('/repositories/1/issues/1/comments:batch', json=[{"content": "x"}, {}])
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [{"index": 1, "message": "Invalid input, no commit content"}]
+
+# Test: null and non-string values are rejected up front with the index of the item, not at the INSERT
+def test_batch_rejects_null_and_non_string_values(app, client):
+    response = client.post('/repositories/1/issues:batch', json=[
+        {"description": "ok", "submitter_id": 1},
+        {"description": [], "submitter_id": 1},
+        {"description": "a", "submitter_id": 1, "title": None},
+        {"description": 5, "submitter_id": 1},
+        {"description": "a", "submitter_id": 1, "title": ["list"]},
+        {"description": "a", "submitter_id": None},
+        {"description": "a", "submitter_id": True},
+    ])
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [error["index"] for error in errors] == [1, 2, 3, 4, 5, 6]
+    assert errors[0]["message"] == "Invalid input: description must be a string"
+    assert errors[1]["message"] == "Invalid input: title must be a string"
+
+    response = client.post('/repositories/1/issues/1/comments:batch', json=[{"content": None}, {"content": {"text": "x"}}, {"content": "ok"}])
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [
+        {"index": 0, "message": "Invalid input: content must be a string"},
+        {"index": 1, "message": "Invalid input: content must be a string"},
+    ]
+    with app.app_context():
+        assert Issue.query.count() == 1
+        assert Comment.query.count() == 0
+
+# Test: the single-row routes share the checks
+def test_single_routes_reject_non_string_values(client):
+    assert client.post('/repositories/1/issues', json={"description": 3, "submitter_id": 1}).status_code == 400
+    assert client.post('/repositories/1/issues/1/comments', json={"content": 3}).status_code == 400
+
+# Test: description is a nullable column, so null is still accepted, by both routes
+def test_null_description_accepted(app, client):
+    response = client.post('/repositories/1/issues', json={"description": None, "submitter_id": 1})
+    assert response.status_code == 201
+    response = client.post('/repositories/1/issues:batch', json=[{"description": None, "submitter_id": 1}])
+    assert response.status_code == 201
+    with app.app_context():
+        assert Issue.query.filter(Issue.description.is_(None)).count() == 2
+
+# Test: the single-row route now rejects a non-integer submitter_id instead of failing
+def test_single_issue_bad_submitter(client):
+    response = client.post('/repositories/1/issues', json={"description": "a", "submitter_id": "abc"})
+    assert response.status_code == 400
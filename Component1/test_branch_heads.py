@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from branch_heads import rebuild_branch_heads
+from models import db, Repository, Branch, Commit
+
+START = datetime(2024, 1, 1)
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Repository(name="Test Repo", description="A test repository", author_id=1),
+            Branch(name="main", repository_id=1),
+            Branch(name="feature", repository_id=1),
+        ])
+        db.session.flush()
+        db.session.add_all(Commit(hash=f"main{i}", message=f"Commit {i}", branch_id=1, created_at=START + timedelta(days=i))
+                           for i in range(3))
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+def head(branch_id):
+    commit_id = db.session.get(Branch, branch_id).head_commit_id
+    return db.session.get(Commit, commit_id).hash if commit_id else None
+
+# Test: new commits move the head to the latest one
+def test_head_follows_new_commits(app):
+    assert head(1) == "main2"
+    assert head(2) is None
+    db.session.add(Commit(hash="main3", message="Commit 3", branch_id=1, created_at=START + timedelta(days=3)))
+    db.session.commit()
+    assert head(1) == "main3"
+
+    response = app.test_client().get('/repositories/1')
+    assert response.status_code == 200
+    assert response.json["latest_commit"]["hash"] == "main3"
+
+# Test: a commit older than the head does not move it; equal timestamps go to the higher id
+def test_head_ordering(app):
+    db.session.add(Commit(hash="old", message="Backdated", branch_id=1, created_at=START - timedelta(days=1)))
+    db.session.commit()
+    assert head(1) == "main2"
+    db.session.add(Commit(hash="tie", message="Same time", branch_id=1, created_at=START + timedelta(days=2)))
+    db.session.commit()
+    assert head(1) == "tie"
+
+# Test: the head is visible on a branch already loaded in the session, before commit
+def test_head_refreshed_in_session(app):
+    branch = db.session.get(Branch, 2)
+    assert branch.head_commit_id is None
+    commit = Commit(hash="feature0", message="Feature work", branch_id=2, created_at=START)
+    db.session.add(commit)
+    db.session.flush()
+    assert branch.head_commit_id == commit.id
+
+# Test: deleting the head commit falls back to the previous one
+def test_head_after_delete(app):
+    db.session.delete(db.session.scalar(db.select(Commit).filter_by(hash="main2")))
+    db.session.commit()
+    assert head(1) == "main1"
+
+# Test: moving a commit between branches updates both heads
+def test_head_after_move(app):
+    commit = db.session.scalar(db.select(Commit).filter_by(hash="main2"))
+    commit.branch_id = 2
+    db.session.commit()
+    assert head(1) == "main1"
+    assert head(2) == "main2"
+
+# Test: rebuild fixes heads left stale by writes outside the session, and only those
+def test_rebuild_branch_heads(app):
+    db.session.execute(insert(Commit), [{"hash": "core", "message": "Imported", "branch_id": 2, "created_at": START}])
+    db.session.commit()
+    assert head(2) is None
+
+    assert rebuild_branch_heads(db.session) == 1
+    db.session.commit()
+    assert head(2) == "core"
+    assert rebuild_branch_heads(db.session) == 0
+
+# Test: the rebuild-branch-heads command
+def test_rebuild_branch_heads_command(app):
+    db.session.execute(insert(Commit), [{"hash": "core", "message": "Imported", "branch_id": 1,
+                                         "created_at": START + timedelta(days=9)}])
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['rebuild-branch-heads'])
+    assert result.exit_code == 0
+    assert "Fixed head commit on 1 branches" in result.output
+    assert head(1) == "core"
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+from app import create_app
+from cache import MemoryCache, RedisCache, SQLiteCache
+from models import db, Repository, Branch, Tag, Commit, Issue
+
+# In-process stand-in for a Redis server, covering the commands RedisCache uses
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        entry = self.data.get(name)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def set(self, name, value, ex=None):
+        self.data[name] = (time.time() + ex if ex else float("inf"), value)
+
+    def delete(self, *names):
+        for name in names:
+            self.data.pop(name, None)
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache()
+    if request.param == "sqlite":
+        return SQLiteCache(str(tmp_path / "cache.db"))
+    return RedisCache(FakeRedis())
+
+@pytest.fixture
+def app(backend):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    app.extensions["response_cache"] = backend
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commit = Commit(hash="abc123", message="Initial commit", branch_id=1)
+        tag = Tag(name="v1.0", commit_id=1)
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1)
+        db.session.add_all([repository, branch_main, commit, tag, issue])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+# Test: every backend stores, expires and deletes values
+def test_backend_get_set_delete(backend):
+    assert backend.get("missing") is None
+    backend.set("key", b"value", 60)
+    assert backend.get("key") == b"value"
+    backend.delete("key")
+    assert backend.get("key") is None
+
+    backend.set("short", b"value", -1)
+    assert backend.get("short") is None
+
+CACHED_URLS = ["/repositories/1", "/repositories/1/branches", "/repositories/1/tags"]
+
+# Test: cached views are answered from the cache on the second request
+@pytest.mark.parametrize("url", CACHED_URLS)
+def test_cached_view_skips_database(client, record_queries, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    with record_queries() as queries:
+        second = client.get(url)
+    assert queries == []
+    assert second.status_code == 200
+    assert second.get_json() == first.get_json()
+
+# Test: error responses are not cached
+def test_not_found_is_not_cached(client, backend):
+    assert client.get("/repositories/99").status_code == 404
+    assert backend.get("bithub:repositories:99") is None
+
+# Test: writes through the issue routes invalidate the repository's cached views
+@pytest.mark.parametrize("url, body", [
+    ("/repositories/1/issues", {"description": "New issue", "submitter_id": 1}),
+    ("/repositories/1/issues/1/comments", {"content": "New comment"}),
+])
+def test_writes_invalidate_repository_keys(client, backend, url, body):
+    for cached_url in CACHED_URLS:
+        client.get(cached_url)
+    assert backend.get("bithub:repositories:1") is not None
+
+    assert client.post(url, json=body).status_code == 201
+    for key in ("bithub:repositories:1", "bithub:repositories:1:branches", "bithub:repositories:1:tags"):
+        assert backend.get(key) is None
+
+# Test: CACHE_TYPE selects the backend - Error: unknown backend
+def test_cache_type_from_config(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "CACHE_TYPE": "sqlite", "CACHE_PATH": str(tmp_path / "c.db")})
+    assert isinstance(app.extensions["response_cache"], SQLiteCache)
+    with pytest.raises(ValueError):
+        create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "CACHE_TYPE": "bogus"})
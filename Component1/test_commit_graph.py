@@ -0,0 +1,260 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from commit_graph import CommitGraph, link_branch_parents, load_commit_graph, rebuild_commit_graph
+from models import db, Repository, Branch, Commit, CommitParent
+
+START = datetime(2024, 1, 1)
+
+# Repository 1:
+#   main     A-B-C---M-E
+#                \   /
+#   feature       F1-F2
+#   orphan   O
+# Repository 2: root R, X1 and X2 on top of it, and P and Q each merging both
+# X1 and X2 (a criss-cross merge, so P and Q have two merge bases)
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "COMPARE_MAX_COMMITS": 3})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Repository(name="Test Repo", description="A test repository", author_id=1),
+            Repository(name="Criss-cross", description="Two merge bases", author_id=1),
+            Branch(name="main", repository_id=1),
+            Branch(name="feature", repository_id=1),
+            Branch(name="orphan", repository_id=1),
+            Branch(name="main", repository_id=2),
+        ])
+        db.session.flush()
+
+        commits = {}
+        def commit(hash, branch_id, *parents):
+            commits[hash] = Commit(hash=hash, message=f"Commit {hash}", branch_id=branch_id,
+                                   created_at=START + timedelta(hours=len(commits)),
+                                   parents=[commits[parent] for parent in parents])
+        commit("A", 1)
+        commit("B", 1, "A")
+        commit("C", 1, "B")
+        commit("F1", 2, "B")
+        commit("F2", 2, "F1")
+        commit("M", 1, "C", "F2")
+        commit("E", 1, "M")
+        commit("O", 3)
+        commit("R", 4)
+        commit("X1", 4, "R")
+        commit("X2", 4, "R")
+        commit("P", 4, "X1", "X2")
+        commit("Q", 4, "X2", "X1")
+        db.session.add_all(commits.values())
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def hashes(commits):
+    return [commit["hash"] for commit in commits]
+
+# Test: generations are assigned on flush, parents first, and parents keep their order
+def test_generations_assigned(app):
+    generations = dict(db.session.execute(db.select(Commit.hash, Commit.generation)).all())
+    assert generations == {"A": 1, "B": 2, "C": 3, "F1": 3, "F2": 4, "M": 5, "E": 6, "O": 1,
+                           "R": 1, "X1": 2, "X2": 2, "P": 3, "Q": 3}
+    merge = db.session.scalar(db.select(Commit).filter_by(hash="M"))
+    assert [parent.hash for parent in merge.parents] == ["C", "F2"]
+
+# Test: 3b. Compare - head ahead of base, commits oldest first
+def test_compare_ahead(client):
+    response = client.get("/repositories/1/compare/B...F2")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data["status"], data["ahead_by"], data["behind_by"]) == ("ahead", 2, 0)
+    assert data["base_commit"]["hash"] == "B"
+    assert data["head_commit"]["hash"] == "F2"
+    assert data["merge_base_commit"]["hash"] == "B"
+    assert hashes(data["commits"]) == ["F1", "F2"]
+    assert set(data["commits"][0]) == {"commit id", "hash", "message", "created_at"}
+
+# Test: 3b. Compare - head behind base
+def test_compare_behind(client):
+    data = client.get("/repositories/1/compare/E...C").get_json()
+    assert (data["status"], data["ahead_by"], data["behind_by"]) == ("behind", 0, 4)
+    assert data["commits"] == []
+    assert data["merge_base_commit"]["hash"] == "C"
+
+# Test: 3b. Compare - diverged branches
+def test_compare_diverged(client):
+    data = client.get("/repositories/1/compare/C...F2").get_json()
+    assert (data["status"], data["ahead_by"], data["behind_by"]) == ("diverged", 2, 1)
+    assert data["merge_base_commit"]["hash"] == "B"
+    assert hashes(data["commits"]) == ["F1", "F2"]
+
+# Test: 3b. Compare - identical commits and unrelated histories
+def test_compare_identical_and_unrelated(client):
+    data = client.get("/repositories/1/compare/C...C").get_json()
+    assert (data["status"], data["ahead_by"], data["behind_by"]) == ("identical", 0, 0)
+    assert data["merge_base_commit"]["hash"] == "C"
+
+    data = client.get("/repositories/1/compare/O...C").get_json()
+    assert (data["status"], data["ahead_by"], data["behind_by"]) == ("diverged", 3, 1)
+    assert data["merge_base_commit"] is None
+
+# Test: 3b. Compare - the list stops at COMPARE_MAX_COMMITS (3 here), parents before children
+def test_compare_caps_commits(client):
+    data = client.get("/repositories/1/compare/A...E").get_json()
+    assert data["ahead_by"] == 6
+    listed = hashes(data["commits"])
+    assert len(listed) == 3
+    assert listed[0] == "B"
+    assert set(listed[1:]) == {"C", "F1"}
+
+# Test: 3b. Compare - Error: repository, commit, or commit of another repository not found
+def test_compare_not_found(client):
+    response = client.get("/repositories/99/compare/A...B")
+    assert response.status_code == 404
+    assert response.json["message"] == "Repository not found"
+    response = client.get("/repositories/1/compare/A...unknown")
+    assert response.status_code == 404
+    assert response.json["message"] == "Base or head commit not found"
+    assert client.get("/repositories/1/compare/A...R").status_code == 404
+
+# Test: 3c. Merge base - one base, several after a criss-cross merge, none for unrelated commits
+def test_merge_base(client):
+    response = client.get("/repositories/1/merge-base/E...F1")
+    assert response.status_code == 200
+    assert hashes(response.json["merge_bases"]) == ["F1"]
+    assert hashes(client.get("/repositories/1/merge-base/C...F2").json["merge_bases"]) == ["B"]
+    assert sorted(hashes(client.get("/repositories/2/merge-base/P...Q").json["merge_bases"])) == ["X1", "X2"]
+    assert client.get("/repositories/1/merge-base/O...E").json["merge_bases"] == []
+
+# Test: 3c. Merge base - Error: commit not found
+def test_merge_base_not_found(client):
+    response = client.get("/repositories/1/merge-base/A...unknown")
+    assert response.status_code == 404
+    assert response.json["message"] == "Base or head commit not found"
+
+# Test: a cached graph asked about a commit added after it was built reads only the new commits
+def test_graph_extended_for_new_commits(app, client, monkeypatch):
+    assert client.get("/repositories/1/compare/B...E").json["ahead_by"] == 5
+    before = app.extensions['commit_graphs'].get(1)[1]
+    tip = db.session.scalar(db.select(Commit).filter_by(hash="E"))
+    db.session.add(Commit(hash="G", message="Commit G", branch_id=1, created_at=START + timedelta(days=1), parents=[tip]))
+    db.session.commit()
+
+    def whole_load(*args):
+        raise AssertionError("graph loaded whole")
+    monkeypatch.setattr(CommitGraph, "from_rows", whole_load)
+    assert client.get("/repositories/1/compare/B...G").json["ahead_by"] == 6
+    after = app.extensions['commit_graphs'].get(1)[1]
+    assert len(after) == len(before) + 1 and after.ids[:len(before)] == before.ids
+
+# Test: a graph extended with newer commits equals one built from all of them at once
+def test_extended_graph_matches_whole_graph():
+    rng = random.Random(11)
+    for known in (True, False):
+        _, parents = random_dag(rng, 80)
+        whole = CommitGraph.from_rows([(i + 1, None) for i in range(80)], [(i + 1, p + 1) for i in range(80) for p in parents[i]])
+        generation = (lambda i: whole.generations[i]) if known else (lambda i: None)
+        rows = [(i + 1, generation(i)) for i in range(80)]
+        edges = [(i + 1, p + 1) for i in range(80) for p in parents[i]]
+        graph = CommitGraph.from_rows(rows[:50], [edge for edge in edges if edge[0] <= 50])
+        # Edges of commits already held are ignored
+        graph = graph.extended(rows[50:], edges)
+        for name in ("ids", "generations", "offsets", "parents"):
+            assert getattr(graph, name) == getattr(whole, name), name
+
+# Test: commits inserted without the session get their generation worked out on load
+def test_graph_computes_missing_generations(app):
+    db.session.execute(insert(Commit), [{"hash": "Z", "message": "Imported", "branch_id": 1, "created_at": START}])
+    z = db.session.scalar(db.select(Commit.id).filter_by(hash="Z"))
+    e = db.session.scalar(db.select(Commit.id).filter_by(hash="E"))
+    db.session.execute(insert(CommitParent), [{"commit_id": z, "parent_id": e, "position": 0}])
+    db.session.commit()
+
+    graph = load_commit_graph(db.session, 1)
+    assert graph.generations[graph.index(z)] == 7
+    assert graph.merge_bases(graph.index(z), graph.index(e)) == [graph.index(e)]
+
+# Test: rebuild-commit-graph --infer-parents chains parentless commits along their branch
+def test_rebuild_commit_graph_infer_parents(app, client):
+    db.session.add_all([Branch(name="legacy", repository_id=1)])
+    db.session.flush()
+    db.session.add_all(Commit(hash=f"L{i}", message=f"Legacy {i}", branch_id=5, created_at=START + timedelta(days=i))
+                       for i in range(4))
+    db.session.commit()
+    assert client.get("/repositories/1/compare/L0...L3").json["status"] == "diverged"
+
+    result = app.test_cli_runner().invoke(args=['rebuild-commit-graph', '--infer-parents'])
+    assert result.exit_code == 0
+    # L1-L3 get a parent; A, O and the other roots are the first commits of their branches
+    assert "Linked 3 commits to their branch predecessor" in result.output
+    assert "Fixed generation on 3 commits" in result.output
+    data = client.get("/repositories/1/compare/L0...L3").json
+    assert (data["status"], data["ahead_by"]) == ("ahead", 3)
+    assert db.session.get(Repository, 1).graph_version == 1
+    assert db.session.get(Repository, 2).graph_version == 0
+
+# Test: a graph cached by another worker before --infer-parents is reloaded, and the ETags change
+def test_graph_reloaded_after_infer_parents(app, client):
+    db.session.add_all([Branch(name="legacy", repository_id=1)])
+    db.session.flush()
+    db.session.add_all(Commit(hash=f"L{i}", message=f"Legacy {i}", branch_id=5, created_at=START + timedelta(days=i))
+                       for i in range(2))
+    db.session.commit()
+    before = client.get("/repositories/1/compare/L0...L1")
+    assert before.json["status"] == "diverged"
+    assert before.headers["Cache-Control"] == "no-cache"
+    assert client.get("/repositories/1/compare/L0...L1", headers={"If-None-Match": before.headers["ETag"]}).status_code == 304
+    merge_base = client.get("/repositories/1/merge-base/L0...L1").headers["ETag"]
+
+    # As another process would: link the commits without touching this app's cache
+    link_branch_parents(db.session)
+    rebuild_commit_graph(db.session)
+    db.session.commit()
+    assert app.extensions['commit_graphs'].get(1) is not None
+
+    after = client.get("/repositories/1/compare/L0...L1", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert (after.json["status"], after.json["ahead_by"]) == ("ahead", 1)
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert client.get("/repositories/1/merge-base/L0...L1").headers["ETag"] != merge_base
+
+def random_dag(rng, n):
+    parents = [sorted(rng.sample(range(i), min(i, rng.choice((0, 1, 1, 1, 2, 3))))) for i in range(n)]
+    rows = [(i + 1, None) for i in range(n)]
+    edges = [(i + 1, p + 1) for i in range(n) for p in parents[i]]
+    return CommitGraph.from_rows(rows, edges), parents
+
+def ancestors(parents, i):
+    seen, stack = {i}, [i]
+    while stack:
+        for p in parents[stack.pop()]:
+            if p not in seen:
+                seen.add(p)
+                stack.append(p)
+    return seen
+
+# Test: the generation-ordered walks agree with brute-force reachability on random graphs
+def test_graph_walks_match_brute_force():
+    rng = random.Random(7)
+    for _ in range(20):
+        graph, parents = random_dag(rng, 60)
+        reach = [ancestors(parents, i) for i in range(60)]
+        for i in range(60):
+            assert all(graph.generations[p] < graph.generations[i] for p in parents[i])
+        for _ in range(50):
+            a, b = rng.randrange(60), rng.randrange(60)
+            assert set(graph.only(a, b)) == reach[a] - reach[b]
+            common = reach[a] & reach[b]
+            best = {c for c in common if not any(c in reach[d] and c != d for d in common)}
+            assert set(graph.merge_bases(a, b)) == best
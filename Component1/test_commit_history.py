@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app
+from models import db, Repository, Branch, Commit
+
+@pytest.fixture
+def client():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        branch_feature = Branch(name="feature", repository_id=1)
+        db.session.add_all([repository, branch_main, branch_feature])
+        start = datetime(2024, 1, 1)
+        for i in range(5):
+            db.session.add(Commit(hash=f"main{i}", message=f"Commit {i}", branch_id=1, created_at=start + timedelta(days=i)))
+        db.session.add(Commit(hash="feature0", message="Feature work", branch_id=2, created_at=start))
+        db.session.commit()
+
+        yield app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+# Test: 2. Navigate to commits in the main branch - cursor pages, newest first
+def test_main_branch_commits_cursor_pagination(client):
+    hashes = []
+    url = "/repositories/1/branches/main/commits?limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data["items"]) <= 2
+        hashes += [commit["hash"] for commit in data["items"]]
+        url = f"/repositories/1/branches/main/commits?limit=2&after={data['next_cursor']}" if data["next_cursor"] else None
+    assert hashes == ["main4", "main3", "main2", "main1", "main0"]
+
+# Test: 6. List all commits in a branch - cursor pagination
+def test_branch_commits_cursor_pagination(client):
+    response = client.get("/repositories/1/branches/feature/commits?limit=10")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [commit["hash"] for commit in data["items"]] == ["feature0"]
+    assert data["items"][0]["created_at"] == "2024-01-01 00:00:00"
+    assert data["next_cursor"] is None
+
+# Test: 6. List all commits in a branch - Error: invalid cursor
+def test_branch_commits_invalid_cursor(client):
+    response = client.get("/repositories/1/branches/main/commits?after=garbage")
+    assert response.status_code == 400
+    assert response.json["message"] == "Invalid cursor"
+
+# Test: 6. List all commits in a branch - Error: unknown branch in cursor mode
+def test_branch_commits_cursor_unknown_branch(client):
+    response = client.get("/repositories/1/branches/unknown/commits?limit=2")
+    assert response.status_code == 404
+    assert response.json["message"] == "Repository or branch not found"
+
+# Test: NDJSON streaming of the full history, selected by query string or Accept header
+def test_commit_history_ndjson_stream(client):
+    for url, headers in (
+        ("/repositories/1/branches/main/commits?format=ndjson", {}),
+        ("/repositories/1/branches/main/commits", {"Accept": "application/x-ndjson"}),
+    ):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert response.is_streamed
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line)["hash"] for line in lines] == ["main4", "main3", "main2", "main1", "main0"]
+
+# Test: NDJSON streaming resumes after a cursor
+def test_commit_history_ndjson_resume(client):
+    cursor = client.get("/repositories/1/branches/main/commits?limit=2").get_json()["next_cursor"]
+    response = client.get(f"/repositories/1/branches/main/commits?format=ndjson&after={cursor}")
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["hash"] for line in lines] == ["main2", "main1", "main0"]
+
+# Test: NDJSON streaming - Error: repository not found
+def test_commit_history_ndjson_repository_not_found(client):
+    response = client.get("/repositories/99/branches/main/commits?format=ndjson")
+    assert response.status_code == 404
+    assert response.json["message"] == "Repository not found"
@@ -0,0 +1,111 @@
+import gzip
+import json
+
+import pytest
+import compression
+from app import create_app
+from models import db, Repository, Branch, Commit
+
+TREE = {"children": {f"file{n}.txt": {"content": "hello world " * 20} for n in range(20)}}
+TREE_URL = "/repositories/1/branches/main/commits/abc123/tree"
+
+def make_client(**config):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", **config})
+    with app.app_context():
+        db.create_all()
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commits = [Commit(hash="abc123", message="Initial commit", branch_id=1, tree_structure=TREE)]
+        commits += [Commit(hash=f"{n:06x}", message=f"Commit {n}", branch_id=1) for n in range(100)]
+        db.session.add_all([repository, branch_main, *commits])
+        db.session.commit()
+    return app, app.test_client()
+
+@pytest.fixture
+def client():
+    app, client = make_client()
+    yield client
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def gzip_json(response):
+    return json.loads(gzip.decompress(response.get_data()))
+
+# Test: large JSON responses are gzipped when the client accepts it
+@pytest.mark.parametrize("url", [TREE_URL, "/repositories/1/branches/main/commits"])
+def test_gzip(client, url):
+    plain = client.get(url)
+    response = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert int(response.headers["Content-Length"]) < int(plain.headers["Content-Length"])
+    assert gzip_json(response) == plain.get_json()
+
+# Test: no compression without Accept-Encoding, for refused encodings, or below the size threshold
+@pytest.mark.parametrize("url, accept", [
+    (TREE_URL, None),
+    (TREE_URL, "gzip;q=0, identity"),
+    (TREE_URL, "deflate"),
+    ("/repositories/1/branches", "gzip"),
+])
+def test_not_compressed(client, url, accept):
+    headers = {"Accept-Encoding": accept} if accept else {}
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+# Test: streamed NDJSON histories are sent as is
+def test_stream_not_compressed(client):
+    response = client.get("/repositories/1/branches/main/commits?format=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert len(response.get_data(as_text=True).splitlines()) == 101
+
+# Test: the client's preference (q-values) wins, ties go to the server's order
+def test_negotiation(client, monkeypatch):
+    monkeypatch.setitem(compression.CODECS, "br", lambda data: b"br:" + data)
+    assert client.get(TREE_URL, headers={"Accept-Encoding": "gzip, br"}).headers["Content-Encoding"] == "br"
+    assert client.get(TREE_URL, headers={"Accept-Encoding": "gzip, br;q=0.5"}).headers["Content-Encoding"] == "gzip"
+    monkeypatch.setitem(compression.CODECS, "br", None)
+    assert client.get(TREE_URL, headers={"Accept-Encoding": "br, gzip;q=0.1"}).headers["Content-Encoding"] == "gzip"
+
+# Test: immutable routes are compressed once and revalidate with the weakened ETag
+def test_immutable_compressed_once(client, monkeypatch):
+    calls = []
+    def counting_gzip(data):
+        calls.append(len(data))
+        return gzip.compress(data)
+    monkeypatch.setitem(compression.CODECS, "gzip", counting_gzip)
+
+    first = client.get(TREE_URL, headers={"Accept-Encoding": "gzip"})
+    second = client.get(TREE_URL, headers={"Accept-Encoding": "gzip"})
+    assert len(calls) == 1
+    assert second.get_data() == first.get_data()
+    etag, weak = first.get_etag()
+    assert weak
+
+    revalidated = client.get(TREE_URL, headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == first.headers["ETag"]
+    assert "Accept-Encoding" in revalidated.headers["Vary"]
+
+    # Mutable lists are compressed on every request
+    client.get("/repositories/1/branches/main/commits", headers={"Accept-Encoding": "gzip"})
+    client.get("/repositories/1/branches/main/commits", headers={"Accept-Encoding": "gzip"})
+    assert len(calls) == 3
+
+# Test: an uncompressed 200 keeps a strong ETag, and so does its 304
+def test_immutable_uncompressed_revalidates_strong(client):
+    first = client.get(TREE_URL)
+    assert "Content-Encoding" not in first.headers
+    assert not first.get_etag()[1]
+    revalidated = client.get(TREE_URL, headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == first.headers["ETag"]
+    assert "Accept-Encoding" in revalidated.headers["Vary"]
+
+# Test: COMPRESS_ENABLED turns compression off
+def test_compression_disabled():
+    _, client = make_client(COMPRESS_ENABLED=False)
+    assert "Content-Encoding" not in client.get(TREE_URL, headers={"Accept-Encoding": "gzip"}).headers
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+from app import create_app
+from counters import repair_counters
+from models import db, Repository, Branch, Commit, Issue, Comment
+
+def seed():
+    db.session.add_all([
+        Repository(name="Test Repo", description="A test repository", author_id=1, open_issue_count=1, closed_issue_count=1),
+        Branch(name="main", repository_id=1),
+        Commit(hash="abc123", message="Initial commit", branch_id=1),
+        Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1, comment_count=1),
+        Issue(repository_id=1, title="Closed Issue", description="A closed issue", status="Closed", submitter_id=1),
+        Comment(issue_id=1, content="Test comment for issue 1"),
+    ])
+    db.session.commit()
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+        seed()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def repository_counts(client):
+    repository = client.get('/repositories/1').get_json()["repository"]
+    return repository["open_issue_count"], repository["closed_issue_count"]
+
+def comment_counts(client):
+    return {issue["id"]: issue["comment_count"] for issue in client.get('/repositories/1/issues').get_json()}
+
+# Test: the default view and the issue list return the counters
+def test_counters_returned(client):
+    assert repository_counts(client) == (1, 1)
+    assert comment_counts(client) == {1: 1, 2: 0}
+
+# Test: new issues and comments bump the counters
+def test_routes_update_counters(client):
+    client.post('/repositories/1/issues', json={"description": "New", "submitter_id": 1})
+    client.post('/repositories/1/issues/2/comments', json={"content": "First"})
+    client.post('/repositories/1/issues/2/comments', json={"content": "Second"})
+    assert repository_counts(client) == (2, 1)
+    assert comment_counts(client) == {1: 1, 2: 2, 3: 0}
+
+# Test: batches bump the counters by the number of rows inserted, failed batches not at all
+def test_batches_update_counters(client):
+    client.post('/repositories/1/issues:batch', json=[{"description": "a", "submitter_id": 1}] * 3)
+    client.post('/repositories/1/issues/1/comments:batch', json=[{"content": "x"}] * 4)
+    client.post('/repositories/1/issues/1/comments:batch', json=[{"content": "x"}, {}])
+    assert repository_counts(client) == (4, 1)
+    assert comment_counts(client)[1] == 5
+
+# Test: the repair job recomputes stale counters and reports what it fixed
+def test_repair_counters(app):
+    Issue.query.filter_by(id=1).update({"comment_count": 7})
+    Repository.query.filter_by(id=1).update({"open_issue_count": 0, "closed_issue_count": 5})
+    db.session.commit()
+
+    with db.engine.begin() as connection:
+        assert repair_counters(connection, batch_size=1) == (1, 1)
+        assert repair_counters(connection) == (0, 0)
+    db.session.expire_all()
+    assert db.session.get(Issue, 1).comment_count == 1
+    repository = db.session.get(Repository, 1)
+    assert (repository.open_issue_count, repository.closed_issue_count) == (1, 1)
+
+# Test: the repair-counters command
+def test_repair_counters_command(app):
+    Issue.query.filter_by(id=2).update({"comment_count": 3})
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=["repair-counters", "--batch-size", "1"])
+    assert result.exit_code == 0
+    assert "Fixed counters on 1 issues and 0 repositories" in result.output
+    db.session.expire_all()
+    assert db.session.get(Issue, 2).comment_count == 0
+
+# Test: concurrent writers do not lose increments
+def test_concurrent_increments(tmp_path):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'counters.db'}"})
+    with app.app_context():
+        db.create_all()
+        seed()
+
+    def write():
+        client = app.test_client()
+        for _ in range(10):
+            assert client.post('/repositories/1/issues/1/comments', json={"content": "x"}).status_code == 201
+            assert client.post('/repositories/1/issues', json={"description": "x", "submitter_id": 1}).status_code == 201
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    client = app.test_client()
+    assert repository_counts(client) == (81, 1)
+    with app.app_context():
+        assert db.session.get(Issue, 1).comment_count == 81
+        db.engine.dispose()
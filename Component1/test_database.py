@@ -0,0 +1,49 @@
+from sqlalchemy import text
+from app import create_app
+from database import engine_options
+from models import db
+
+def pragma(app, name):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+# Test: DB_POOL_* settings become engine options; explicit SQLALCHEMY_ENGINE_OPTIONS win
+def test_engine_options_from_config():
+    options = engine_options({
+        "DB_POOL_SIZE": 20, "DB_MAX_OVERFLOW": 5, "DB_POOL_RECYCLE": 1800, "DB_POOL_TIMEOUT": None,
+        "DB_POOL_PRE_PING": True, "SQLALCHEMY_ENGINE_OPTIONS": {"pool_size": 30},
+    })
+    assert options == {"pool_size": 30, "max_overflow": 5, "pool_recycle": 1800, "pool_pre_ping": True}
+
+# Test: the database URI and pool size can be set from the environment
+def test_database_settings_from_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("BITHUB_SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'env.db'}")
+    monkeypatch.setenv("BITHUB_DB_POOL_SIZE", "12")
+    app = create_app()
+    with app.app_context():
+        assert db.engine.url.database == str(tmp_path / "env.db")
+        assert db.engine.pool.size() == 12
+
+# Test: SQLite connections are switched to WAL with the tuned pragmas
+def test_sqlite_tuning_pragmas(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'tuned.db'}"})
+    assert pragma(app, "journal_mode") == "wal"
+    assert pragma(app, "synchronous") == 1  # NORMAL
+    assert pragma(app, "cache_size") == -64 * 1024
+    assert pragma(app, "busy_timeout") == 5000
+
+# Test: SQLITE_TUNING can be turned off
+def test_sqlite_tuning_disabled(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'plain.db'}", "SQLITE_TUNING": False})
+    assert pragma(app, "journal_mode") == "delete"
+
+# Test: a config object can be passed to create_app
+def test_config_object(tmp_path):
+    class TestConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'object.db'}"
+        CACHE_DEFAULT_TIMEOUT = 5
+
+    app = create_app(TestConfig)
+    assert app.config["CACHE_DEFAULT_TIMEOUT"] == 5
+    assert app.config["SQLALCHEMY_DATABASE_URI"].endswith("object.db")
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import pytest
+from app import create_app
+from models import db, Repository, Branch, Commit, Issue, Comment
+
+@pytest.fixture
+def client():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        # The issue list's validators, as the issue routes maintain them
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1, issues_version=1,
+                                issues_updated_at=datetime(2024, 1, 1))
+        branch_main = Branch(name="main", repository_id=1)
+        commit = Commit(hash="abc123", message="Initial commit", branch_id=1,
+                        tree_structure={"children": {"file1.txt": {"content": "hello"}, "subdir": {"children": {}}}})
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1)
+        comment = Comment(issue_id=1, content="Test comment for issue 1")
+        db.session.add_all([repository, branch_main, commit, issue, comment])
+        db.session.commit()
+
+        yield app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+IMMUTABLE_URLS = [
+    "/repositories/1/commits/abc123",
+    "/repositories/1/branches/main/commits/abc123/tree",
+    "/repositories/1/branches/main/commits/abc123/tree/file1.txt",
+]
+
+# Test: commit-hash routes carry a strong ETag and a long-lived Cache-Control
+@pytest.mark.parametrize("url", IMMUTABLE_URLS)
+def test_immutable_route_headers(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    assert response.cache_control.max_age == 31536000
+    assert "immutable" in response.headers["Cache-Control"]
+
+# Test: If-None-Match on a commit-hash route is answered with 304 without any query
+@pytest.mark.parametrize("url", IMMUTABLE_URLS)
+def test_immutable_route_not_modified(client, record_queries, url):
+    etag = client.get(url).headers["ETag"]
+    with record_queries() as queries:
+        response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert queries == []
+
+# Test: different paths of the same commit have different ETags
+def test_immutable_etag_includes_path(client):
+    tree = client.get("/repositories/1/branches/main/commits/abc123/tree").headers["ETag"]
+    subtree = client.get("/repositories/1/branches/main/commits/abc123/tree/subdir").headers["ETag"]
+    assert tree != subtree
+
+# Test: Error responses are not marked cacheable
+def test_immutable_route_error_has_no_etag(client):
+    response = client.get("/repositories/1/commits/unknown")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+    assert "Cache-Control" not in response.headers
+
+# Test: issue lists revalidate with a weak ETag that changes when an issue is added
+def test_issue_list_weak_etag(client):
+    response = client.get("/repositories/1/issues")
+    etag, weak = response.get_etag()
+    assert weak
+    assert response.cache_control.no_cache
+    assert response.last_modified is not None
+
+    response = client.get("/repositories/1/issues", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    client.post("/repositories/1/issues", json={"description": "New issue", "submitter_id": 2})
+    response = client.get("/repositories/1/issues", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+    assert response.get_etag()[0] != etag
+
+# Test: posting a comment changes the listed comment_count, so the issue list's ETag changes
+def test_issue_list_etag_changes_with_comment_count(client):
+    response = client.get("/repositories/1/issues")
+    etag = response.headers["ETag"]
+    count = response.get_json()[0]["comment_count"]
+
+    client.post("/repositories/1/issues/1/comments", json={"content": "Another comment"})
+    response = client.get("/repositories/1/issues", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["comment_count"] == count + 1
+
+# Test: If-Modified-Since also sees the new comment, since both validators come from the repository
+def test_issue_list_last_modified_changes_with_comment(client):
+    last_modified = client.get("/repositories/1/issues").headers["Last-Modified"]
+    assert client.get("/repositories/1/issues", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    client.post("/repositories/1/issues/1/comments", json={"content": "Another comment"})
+    response = client.get("/repositories/1/issues", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    assert response.get_json()[0]["comment_count"] == 1
+    # Not sent until the second of the change has passed, as another change in it would not move it
+    assert response.last_modified is None
+
+# Test: each page of a list has its own ETag
+def test_issue_list_etag_depends_on_query(client):
+    first = client.get("/repositories/1/issues?page=1").headers["ETag"]
+    second = client.get("/repositories/1/issues?page=2").headers["ETag"]
+    assert first != second
+
+# Test: comment lists revalidate with a weak ETag that changes when a comment is added
+def test_comment_list_weak_etag(client):
+    etag = client.get("/repositories/1/issues/1/comments").headers["ETag"]
+    assert client.get("/repositories/1/issues/1/comments", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/repositories/1/issues/1/comments", json={"content": "Another comment"})
+    response = client.get("/repositories/1/issues/1/comments", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
@@ -60,6 +60,29 @@ def test_list_repository_issues_repository_not_found(client):
     data = response.get_json()
     assert data['message'] == 'Repository not found'
 
+# Test: 9 List repository issues - cursor pagination
+def test_list_repository_issues_cursor_pagination(client):
+    response = client.get('/repositories/1/issues?limit=1')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['items']) == 1
+    assert data['items'][0]['title'] == 'Open Issue'
+    assert data['next_cursor'] is not None
+
+    response = client.get(f"/repositories/1/issues?limit=1&after={data['next_cursor']}")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['items']) == 1
+    assert data['items'][0]['title'] == 'Closed Issue'
+    assert data['next_cursor'] is None
+
+# Test: 9 List repository issues - Error: invalid cursor
+def test_list_repository_issues_invalid_cursor(client):
+    response = client.get('/repositories/1/issues?after=not-a-cursor')
+    assert response.status_code == 400
+    data = response.get_json()
+    assert data['message'] == 'Invalid cursor'
+
 # Test: 10 View a specific issue details
 # shows the issue description and its data (submission date, submitter ID, status, etc), and one page of comments.
 def test_view_issue_details_happy_path(client):
@@ -128,6 +151,27 @@ def test_paginate_issue_comments_page_negative(client):
     data = response.get_json()
     assert data['message'] == 'Page and size must be positive integers'
 
+# Test: 12 Paginate comments for an issue - cursor pagination
+def test_paginate_issue_comments_cursor(client):
+    client.post('/repositories/1/issues/1/comments', json={'content': 'Second comment'})
+
+    response = client.get('/repositories/1/issues/1/comments?limit=1')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [comment['content'] for comment in data['items']] == ['Test comment for issue 1']
+
+    response = client.get(f"/repositories/1/issues/1/comments?limit=1&after={data['next_cursor']}")
+    data = response.get_json()
+    assert [comment['content'] for comment in data['items']] == ['Second comment']
+    assert data['next_cursor'] is None
+
+# Test: 12 Paginate comments for an issue - Error: limit is not positive
+def test_paginate_issue_comments_cursor_invalid_limit(client):
+    response = client.get('/repositories/1/issues/1/comments?limit=0')
+    assert response.status_code == 400
+    data = response.get_json()
+    assert data['message'] == 'Limit must be a positive integer'
+
 # Test: 13 Submit a new comment
 def test_submit_new_comment_happy_path(client):
     response = client.post('/repositories/1/issues/1/comments', json={
@@ -0,0 +1,75 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from app import create_app
+from json_provider import OrjsonJSONProvider, StdlibJSONProvider, json_provider_class, orjson
+from models import db, Repository, Branch, Commit, Issue
+
+PROVIDERS = [
+    "stdlib",
+    pytest.param("orjson", marks=pytest.mark.skipif(orjson is None, reason="orjson is not installed")),
+]
+
+@pytest.fixture(params=PROVIDERS)
+def app(request):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "JSON_PROVIDER": request.param})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commit = Commit(hash="abc123", message="Initial commit", branch_id=1, created_at=datetime(2024, 1, 31, 12, 0, 5, 250000),
+                        tree_structure={"children": {"file1.txt": {"content": "hello"}}})
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1,
+                      created_at=datetime(2024, 2, 1, 8, 30))
+        db.session.add_all([repository, branch_main, commit, issue])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+# Test: JSON_PROVIDER selects the provider; auto prefers orjson when installed
+def test_provider_selection():
+    assert json_provider_class("stdlib") is StdlibJSONProvider
+    assert json_provider_class("auto") is (OrjsonJSONProvider if orjson is not None else StdlibJSONProvider)
+    with pytest.raises(ValueError):
+        json_provider_class("simplejson")
+
+# Test: datetimes and dates are written as ISO 8601, other types as Flask does
+def test_dumps_types(app):
+    payload = {"at": datetime(2024, 1, 31, 12, 0, 5), "on": date(2024, 1, 31), "price": Decimal("1.50"), "files": {2: "int key"}}
+    assert app.json.loads(app.json.dumps(payload)) == {
+        "at": "2024-01-31T12:00:05", "on": "2024-01-31", "price": "1.50", "files": {"2": "int key"}
+    }
+
+# Test: both providers produce the same bytes for a route (keys sorted, compact, trailing newline)
+def test_response_bytes(app):
+    body = app.test_client().get("/repositories/1").get_data()
+    stdlib = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "JSON_PROVIDER": "stdlib"})
+    with stdlib.app_context():
+        expected = stdlib.json.response(app.json.loads(body)).get_data()
+    assert body == expected
+    assert body.endswith(b"}\n")
+    assert b'"latest_commit":{"created_at":"2024-01-31 12:00:05"' in body
+
+# Test: the issue submission date is serialized natively
+def test_native_datetime_in_route(app):
+    assert app.test_client().get("/repositories/1/issues/1").get_json()["submission_date"] == "2024-02-01T08:30:00"
+
+# Test: request bodies are parsed by the provider, and bad JSON is still a 400
+def test_request_parsing(app):
+    client = app.test_client()
+    response = client.post("/repositories/1/issues", data='{"description": "x", "submitter_id": 1}', content_type="application/json")
+    assert response.status_code == 201
+    response = client.post("/repositories/1/issues", data='{"description": ', content_type="application/json")
+    assert response.status_code == 400
+
+# Test: debug mode and compact=False indent the output
+def test_indent_in_debug(app):
+    app.debug = True
+    with app.app_context():
+        assert app.json.response({"a": 1}).get_data() == b'{\n  "a": 1\n}\n'
@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from migrations import MIGRATIONS, applied_versions, stamp, upgrade
+from models import db
+
+# Schema of a bithub.db created before any migration existed
+LEGACY_SCHEMA = """
+CREATE TABLE repositories (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description VARCHAR(500),
+    author_id INTEGER NOT NULL, created_at DATETIME, PRIMARY KEY (id));
+CREATE TABLE branches (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, repository_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(repository_id) REFERENCES repositories (id));
+CREATE TABLE issues (id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, description TEXT, status VARCHAR(10),
+    repository_id INTEGER NOT NULL, created_at DATETIME, submitter_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(repository_id) REFERENCES repositories (id));
+CREATE TABLE comments (id INTEGER NOT NULL, content TEXT NOT NULL, issue_id INTEGER NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(issue_id) REFERENCES issues (id));
+CREATE TABLE commits (id INTEGER NOT NULL, hash VARCHAR(40) NOT NULL, message VARCHAR(500), branch_id INTEGER NOT NULL,
+    created_at DATETIME, tree_structure JSON, PRIMARY KEY (id), UNIQUE (hash),
+    FOREIGN KEY(branch_id) REFERENCES branches (id));
+CREATE TABLE tags (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, commit_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(commit_id) REFERENCES commits (id));
+"""
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bithub.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA.split(';'):
+            if statement.strip():
+                connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+# Test: upgrade adds the route indexes to an existing database and records the version
+def test_upgrade_legacy_database(legacy_engine):
+    assert index_names(legacy_engine, 'branches') == set()
+
+    applied = upgrade(legacy_engine)
+    assert [version for version, _ in applied] == [version for version, _, _ in sorted(MIGRATIONS, key=lambda m: m[0])]
+    assert 'ix_branches_repository_id_name' in index_names(legacy_engine, 'branches')
+    assert 'ix_commits_branch_id_created_at' in index_names(legacy_engine, 'commits')
+    assert 'ix_issues_repository_id_status_created_at' in index_names(legacy_engine, 'issues')
+    assert 'ix_comments_issue_id_created_at' in index_names(legacy_engine, 'comments')
+    assert 'ix_tags_commit_id' in index_names(legacy_engine, 'tags')
+
+# Test: upgrade brings a legacy database to the columns the current models expect
+def test_upgrade_adds_model_columns(legacy_engine):
+    upgrade(legacy_engine)
+    inspector = inspect(legacy_engine)
+    for table in db.metadata.sorted_tables:
+        assert inspector.has_table(table.name)
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        assert set(table.columns.keys()) <= columns, table.name
+
+# Test: applied migrations are not run again
+def test_upgrade_is_idempotent(legacy_engine):
+    upgrade(legacy_engine)
+    assert upgrade(legacy_engine) == []
+
+# Test: upgrade builds the search index from the issues and comments already stored
+def test_upgrade_backfills_search_index(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO repositories (id, name, author_id) VALUES (1, 'Repo', 1)"))
+        connection.execute(text("INSERT INTO issues (id, title, description, status, repository_id, submitter_id) "
+                                "VALUES (1, 'Crash on start', NULL, 'Open', 1, 1)"))
+        connection.execute(text("INSERT INTO comments (id, content, issue_id) VALUES (1, 'segfault in parser', 1)"))
+    upgrade(legacy_engine)
+    with legacy_engine.begin() as connection:
+        assert connection.execute(text("SELECT rowid FROM issue_search WHERE issue_search MATCH 'segfault'")).scalar() == 1
+        # and the triggers keep it in sync from now on
+        connection.execute(text("INSERT INTO comments (id, content, issue_id) VALUES (2, 'deadlock', 1)"))
+        assert connection.execute(text("SELECT rowid FROM issue_search WHERE issue_search MATCH 'deadlock'")).scalar() == 1
+
+# Test: upgrade fills the new counters from the rows already stored
+def test_upgrade_backfills_counters(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO repositories (id, name, author_id) VALUES (1, 'Repo', 1)"))
+        connection.execute(text("INSERT INTO issues (id, title, status, repository_id, submitter_id) "
+                                "VALUES (1, 'A', 'Open', 1, 1), (2, 'B', 'Closed', 1, 1), (3, 'C', 'Closed', 1, 1)"))
+        connection.execute(text("INSERT INTO comments (id, content, issue_id) VALUES (1, 'x', 1), (2, 'y', 1)"))
+    upgrade(legacy_engine)
+    with legacy_engine.begin() as connection:
+        assert connection.execute(text("SELECT open_issue_count, closed_issue_count FROM repositories")).one() == (1, 2)
+        assert connection.execute(text("SELECT comment_count FROM issues ORDER BY id")).scalars().all() == [2, 0, 0]
+
+# Test: upgrade dates each repository's issue list from its newest issue
+def test_upgrade_backfills_issue_list_validators(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO repositories (id, name, author_id) VALUES (1, 'Repo', 1), (2, 'Empty', 1)"))
+        connection.execute(text("INSERT INTO issues (id, title, status, repository_id, submitter_id, created_at) VALUES "
+                                "(1, 'A', 'Open', 1, 1, '2024-01-02 00:00:00.000000'), (2, 'B', 'Open', 1, 1, '2024-01-01 00:00:00.000000')"))
+    upgrade(legacy_engine)
+    with legacy_engine.begin() as connection:
+        rows = connection.execute(text("SELECT issues_version, issues_updated_at FROM repositories ORDER BY id")).all()
+        assert rows == [(0, '2024-01-02 00:00:00.000000'), (0, None)]
+
+# Test: upgrade points each branch at its latest commit
+def test_upgrade_backfills_branch_heads(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO repositories (id, name, author_id) VALUES (1, 'Repo', 1)"))
+        connection.execute(text("INSERT INTO branches (id, name, repository_id) VALUES (1, 'main', 1), (2, 'empty', 1)"))
+        connection.execute(text("INSERT INTO commits (id, hash, branch_id, created_at) VALUES "
+                                "(1, 'a', 1, '2024-01-02 00:00:00'), (2, 'b', 1, '2024-01-01 00:00:00')"))
+    upgrade(legacy_engine)
+    with legacy_engine.begin() as connection:
+        assert connection.execute(text("SELECT head_commit_id FROM branches ORDER BY id")).scalars().all() == [1, None]
+
+# Test: upgrade adds the commit graph and numbers the existing (parentless) commits
+def test_upgrade_adds_commit_graph(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO repositories (id, name, author_id) VALUES (1, 'Repo', 1)"))
+        connection.execute(text("INSERT INTO branches (id, name, repository_id) VALUES (1, 'main', 1)"))
+        connection.execute(text("INSERT INTO commits (id, hash, branch_id) VALUES (1, 'a', 1), (2, 'b', 1)"))
+    upgrade(legacy_engine)
+    assert inspect(legacy_engine).has_table('commit_parents')
+    with legacy_engine.begin() as connection:
+        assert connection.execute(text("SELECT generation FROM commits ORDER BY id")).scalars().all() == [1, 1]
+
+# Test: a database created from the current models can be stamped as up to date
+def test_stamp_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    db.metadata.create_all(engine)
+    stamp(engine)
+    assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+    assert upgrade(engine) == []
+    engine.dispose()
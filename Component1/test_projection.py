@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from app import create_app
+from models import db, Repository, Branch, Commit, Issue
+
+@pytest.fixture
+def client():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commits = [
+            Commit(hash=f"abc12{n}", message=f"Commit {n}", branch_id=1,
+                   tree_structure={"children": {"big.txt": {"content": "x" * 1000}}})
+            for n in range(3)
+        ]
+        issue = Issue(repository_id=1, title="Open Issue", description="A long description", status="Open", submitter_id=1)
+        db.session.add_all([repository, branch_main, *commits, issue])
+        db.session.commit()
+
+        yield app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+def statements(queries):
+    return "\n".join(statement for statement, _ in queries)
+
+# Test: list and lookup routes never load the heavy columns
+@pytest.mark.parametrize("url, column", [
+    ("/repositories/1", "tree_structure"),
+    ("/repositories/1/branches/main/commits", "tree_structure"),
+    ("/repositories/1/branches/main/commits?limit=2", "tree_structure"),
+    ("/repositories/1/commits/abc120", "tree_structure"),
+    ("/repositories/1/issues", "description"),
+    ("/repositories/1/issues?limit=2", "description"),
+])
+def test_heavy_columns_not_loaded(client, record_queries, url, column):
+    with record_queries() as queries:
+        assert client.get(url).status_code == 200
+    assert column not in statements(queries)
+
+# Test: the routes that need a deferred column still load it in the same query
+def test_deferred_columns_undeferred_where_needed(client, record_queries):
+    with record_queries() as queries:
+        assert client.get("/repositories/1/issues/1").get_json()["description"] == "A long description"
+        assert client.get("/repositories/1/branches/main/commits/abc120/tree").get_json()["tree"]["children"]
+    assert len(queries) == 3
+
+# Test: ?fields= limits both the response and the selected columns
+def test_commit_fields(client, record_queries):
+    with record_queries() as queries:
+        response = client.get("/repositories/1/branches/main/commits?fields=hash")
+    assert response.get_json() == [{"hash": "abc120"}, {"hash": "abc121"}, {"hash": "abc122"}]
+    assert "commits.message" not in statements(queries)
+
+    page = client.get("/repositories/1/branches/main/commits?limit=2&fields=hash,created_at").get_json()
+    assert [sorted(item) for item in page["items"]] == [["created_at", "hash"]] * 2
+    assert page["next_cursor"]
+
+    lines = client.get("/repositories/1/branches/main/commits?format=ndjson&fields=commit%20id").get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [{"commit id": 3}, {"commit id": 2}, {"commit id": 1}]
+
+# Test: ?fields= on the issue list, in page and cursor mode
+def test_issue_fields(client):
+    assert client.get("/repositories/1/issues?fields=id,title").get_json() == [{"id": 1, "title": "Open Issue"}]
+    assert client.get("/repositories/1/issues?limit=5&fields=status").get_json()["items"] == [{"status": "Open"}]
+
+# Test: unknown or empty field lists are rejected
+@pytest.mark.parametrize("url", [
+    "/repositories/1/branches/main/commits?fields=tree_structure",
+    "/repositories/1/branches/main/commits?fields=,",
+    "/repositories/1/issues?fields=description",
+])
+def test_bad_fields(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert "field" in response.get_json()["message"]
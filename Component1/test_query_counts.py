@@ -0,0 +1,80 @@
+import pytest
+from app import create_app
+from models import db, Repository, Branch, Tag, Commit, Issue, Comment
+
+@pytest.fixture
+def client():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        empty_repository = Repository(name="Empty Repo", description="No branches yet", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        commit = Commit(hash="abc123", message="Initial commit", branch_id=1,
+                        tree_structure={"children": {"file1.txt": {}, "subdir": {"children": {}}}})
+        tag = Tag(name="v1.0", commit_id=1)
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1)
+        comment = Comment(issue_id=1, content="Test comment for issue 1")
+        db.session.add_all([repository, empty_repository, branch_main, commit, tag, issue, comment])
+        db.session.commit()
+
+        yield app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+# (method, url, body, expected status, expected number of SQL statements)
+ROUTES = [
+    ("GET", "/repositories/1", None, 200, 1),
+    ("GET", "/repositories/99", None, 404, 1),
+    ("GET", "/repositories/2", None, 404, 1),
+    ("GET", "/repositories/1/branches/main/commits", None, 200, 1),
+    ("GET", "/repositories/2/branches/main/commits", None, 404, 1),
+    ("GET", "/repositories/1/commits/abc123", None, 200, 1),
+    ("GET", "/repositories/1/commits/unknown", None, 404, 1),
+    ("POST", "/repositories/1/commits:lookup", ["abc123", "unknown"], 200, 1),
+    ("POST", "/repositories/99/commits:lookup", ["abc123"], 404, 1),
+    # one for the graph_version in the ETag, plus two to load the commit graph on first use
+    ("GET", "/repositories/1/compare/abc123...abc123", None, 200, 4),
+    ("GET", "/repositories/1/compare/abc123...unknown", None, 404, 2),
+    ("GET", "/repositories/1/merge-base/abc123...abc123", None, 200, 4),
+    ("GET", "/repositories/1/branches", None, 200, 1),
+    ("GET", "/repositories/2/branches", None, 200, 1),
+    ("GET", "/repositories/1/tags", None, 200, 1),
+    ("GET", "/repositories/99/tags", None, 404, 1),
+    ("GET", "/repositories/1/branches/unknown/commits", None, 404, 1),
+    ("GET", "/repositories/1/branches/main/commits?limit=1", None, 200, 2),
+    ("GET", "/repositories/1/branches/main/commits/abc123/tree", None, 200, 1),
+    # the commit with its root tree, then the subdir object
+    ("GET", "/repositories/1/branches/main/commits/abc123/tree/subdir", None, 200, 2),
+    ("GET", "/repositories/1/issues", None, 200, 2),
+    ("GET", "/repositories/1/issues/search?q=open", None, 200, 2),
+    ("GET", "/repositories/1/issues/1", None, 200, 2),
+    ("GET", "/repositories/1/issues/99", None, 404, 1),
+    ("POST", "/repositories/1/issues", {"description": "New issue", "submitter_id": 1}, 201, 3),
+    ("GET", "/repositories/1/issues/1/comments", None, 200, 2),
+    ("GET", "/repositories/99/issues/1/comments", None, 404, 1),
+    ("POST", "/repositories/1/issues/1/comments", {"content": "Another comment"}, 201, 4),
+    ("POST", "/repositories/1/issues:batch", [{"description": f"Issue {n}", "submitter_id": 1} for n in range(50)], 201, 3),
+    ("POST", "/repositories/1/issues/1/comments:batch", [{"content": f"Comment {n}"} for n in range(50)], 201, 4),
+]
+
+# Test: each route resolves repository, branch, commit and issue without extra round trips
+# (writes add one UPDATE for the counters, and comments another for the repository's issue list version)
+@pytest.mark.parametrize("method, url, body, status, expected", ROUTES)
+def test_route_query_count(client, record_queries, method, url, body, status, expected):
+    with record_queries() as queries:
+        response = client.open(url, method=method, json=body)
+    assert response.status_code == status
+    assert len(queries) == expected, "\n".join(statement for statement, _ in queries)
+
+# Test: the joined lookups still tell a missing repository apart from a missing child
+def test_missing_child_messages(client):
+    assert client.get("/repositories/2").json["message"] == "Main branch not found in the repository"
+    assert client.get("/repositories/2/branches/main/commits").json["message"] == "Main branch not found"
+    assert client.get("/repositories/2/branches").json == []
+    assert client.get("/repositories/1/commits/unknown").json["message"] == "Commit not found"
+    assert client.get("/repositories/99/issues/1/comments").json["message"] == "Repository not found"
+    assert client.get("/repositories/1/issues/99/comments").json["message"] == "Issue not found"
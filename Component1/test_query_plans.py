@@ -0,0 +1,76 @@
+import re
+
+import pytest
+from app import create_app
+from models import db, Repository, Branch, Tag, Commit, Issue, Comment
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        branch_feature = Branch(name="feature", repository_id=1)
+        commit = Commit(hash="abc123", message="Initial commit", branch_id=1,
+                        tree_structure={"children": {"file1.txt": {}, "subdir": {"children": {}}}})
+        tag = Tag(name="v1.0", commit_id=1)
+        issue = Issue(repository_id=1, title="Open Issue", description="An open issue", status="Open", submitter_id=1)
+        comment = Comment(issue_id=1, content="Test comment for issue 1")
+        db.session.add_all([repository, branch_main, branch_feature, commit, tag, issue, comment])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+ROUTES = [
+    ("GET", "/repositories/1", None),
+    ("GET", "/repositories/1/branches/main/commits", None),
+    ("GET", "/repositories/1/commits/abc123", None),
+    ("POST", "/repositories/1/commits:lookup", ["abc123", "unknown"]),
+    ("GET", "/repositories/1/compare/abc123...abc123", None),
+    ("GET", "/repositories/1/merge-base/abc123...abc123", None),
+    ("GET", "/repositories/1/branches", None),
+    ("GET", "/repositories/1/tags", None),
+    ("GET", "/repositories/1/branches/feature/commits", None),
+    ("GET", "/repositories/1/branches/main/commits?limit=1", None),
+    ("GET", "/repositories/1/branches/main/commits?format=ndjson", None),
+    ("GET", "/repositories/1/branches/main/commits/abc123/tree", None),
+    ("GET", "/repositories/1/branches/main/commits/abc123/tree/subdir", None),
+    ("GET", "/repositories/1/issues", None),
+    ("GET", "/repositories/1/issues?status=Open", None),
+    ("GET", "/repositories/1/issues?limit=1", None),
+    ("GET", "/repositories/1/issues/search?q=open", None),
+    ("GET", "/repositories/1/issues/1", None),
+    ("POST", "/repositories/1/issues", {"description": "New issue", "submitter_id": 1}),
+    ("GET", "/repositories/1/issues/1/comments", None),
+    ("GET", "/repositories/1/issues/1/comments?limit=1", None),
+    ("POST", "/repositories/1/issues/1/comments", {"content": "Another comment"}),
+]
+
+# EXPLAIN QUERY PLAN reports "SCAN <table>" for a full table scan, and
+# "SEARCH ..." or "SCAN <table> USING [COVERING] INDEX ..." otherwise.
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+def full_table_scans(connection, statement, parameters):
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in plan if FULL_SCAN.match(row[-1])]
+
+# Test: every route resolves its rows through an index rather than a full table scan
+@pytest.mark.parametrize("method, url, body", ROUTES)
+def test_route_queries_use_indexes(app, record_queries, method, url, body):
+    client = app.test_client()
+    with record_queries() as queries:
+        response = client.open(url, method=method, json=body)
+        response.get_data()  # run streamed responses to completion
+    assert response.status_code in (200, 201)
+
+    selects = [(statement, parameters) for statement, parameters in queries if statement.lstrip().upper().startswith("SELECT")]
+    assert selects
+    with db.engine.connect() as connection:
+        for statement, parameters in selects:
+            assert full_table_scans(connection, statement, parameters) == [], statement
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from app import create_app
+from database import STICKY_COOKIE
+from models import db, Repository, Issue
+
+# Stands in for replication: copies the primary file over the replica
+def replicate(primary, replica):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+class Copier(threading.Thread):
+    def __init__(self, primary, replica, interval=0.05):
+        super().__init__(daemon=True)
+        self.primary, self.replica, self.interval = primary, replica, interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            replicate(self.primary, self.replica)
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "primary.db"), str(tmp_path / "replica.db")
+
+def replica_app(primary, replica, **config):
+    return create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "REPLICA_DATABASE_URI": f"sqlite:///file:{replica}?mode=ro&uri=true",
+        "REPLICA_STICKY_SECONDS": 5,
+        **config,
+    })
+
+@pytest.fixture
+def app(paths):
+    primary, replica = paths
+    # Whole-file copies keep the primary's journal mode; without tuning both
+    # files use a rollback journal, as a replica the server cannot write would
+    app = replica_app(primary, replica, SQLITE_TUNING=False)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Repository(name="Test Repo", description="A test repository", author_id=1),
+            Issue(repository_id=1, title="First Issue", description="Seeded", status="Open", submitter_id=1),
+        ])
+        db.session.commit()
+    replicate(primary, replica)
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions["replica_engine"].dispose()
+
+def titles(response):
+    return [issue["title"] for issue in response.get_json()]
+
+def new_issue(client, title):
+    return client.post("/repositories/1/issues", json={"title": title, "description": "", "submitter_id": 2})
+
+# Test: GET requests read the replica
+def test_get_reads_replica(app, paths):
+    _, replica = paths
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE issues SET title = 'Replica Copy' WHERE id = 1")
+    assert titles(app.test_client().get("/repositories/1/issues")) == ["Replica Copy"]
+
+# Test: POST requests write to the primary, not the read-only replica
+def test_post_writes_primary(app):
+    response = new_issue(app.test_client(), "Second Issue")
+    assert response.status_code == 201
+    with app.app_context():
+        assert db.session.get(Issue, 2).title == "Second Issue"
+
+# Test: the writing client reads its own write before replication; other clients do not
+def test_read_your_writes(app):
+    writer, other = app.test_client(), app.test_client()
+    response = new_issue(writer, "Second Issue")
+    assert STICKY_COOKIE in response.headers["Set-Cookie"]
+
+    assert titles(writer.get("/repositories/1/issues")) == ["First Issue", "Second Issue"]
+    assert titles(other.get("/repositories/1/issues")) == ["First Issue"]
+
+# Test: with the response cache, a lagging replica's body cached after the
+# write neither hides the write from the writer nor outlives the lag window
+def test_read_your_writes_through_response_cache(app, paths):
+    primary, replica = paths
+    with sqlite3.connect(primary) as connection:
+        connection.execute("INSERT INTO branches (id, name, repository_id) VALUES (1, 'main', 1)")
+        connection.execute("INSERT INTO commits (id, hash, branch_id, created_at) VALUES (1, 'abc123', 1, '2024-01-01 00:00:00.000000')")
+        connection.execute("UPDATE branches SET head_commit_id = 1")
+    replicate(primary, replica)
+    cached_app = replica_app(primary, replica, SQLITE_TUNING=False, CACHE_TYPE="memory", CACHE_DEFAULT_TIMEOUT=300)
+    writer, other = cached_app.test_client(), cached_app.test_client()
+
+    assert new_issue(writer, "Second Issue").status_code == 201
+    # Read from the replica, which has not seen the new issue, and cached for the lag window only
+    assert other.get("/repositories/1").json["repository"]["open_issue_count"] == 0
+    (expires_at, _), = cached_app.extensions["response_cache"]._data.values()
+    assert expires_at - time.time() <= 5
+
+    # The writer skips the cache; the body it reads from the primary is cached for everyone
+    assert writer.get("/repositories/1").json["repository"]["open_issue_count"] == 1
+    assert other.get("/repositories/1").json["repository"]["open_issue_count"] == 1
+
+    with cached_app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    cached_app.extensions["replica_engine"].dispose()
+
+# Test: stickiness ends after REPLICA_STICKY_SECONDS
+def test_sticky_window_expires(app, paths):
+    _, replica = paths
+    client = app.test_client()
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE issues SET title = 'Replica Copy' WHERE id = 1")
+
+    client.set_cookie(STICKY_COOKIE, str(time.time() - 1))
+    assert titles(client.get("/repositories/1/issues")) == ["Replica Copy"]
+    client.set_cookie(STICKY_COOKIE, str(time.time() + 5))
+    assert titles(client.get("/repositories/1/issues")) == ["First Issue"]
+
+# Test: a read-only POST route reads the replica and does not pin the client to the primary
+def test_read_only_post_reads_replica(app, paths):
+    _, replica = paths
+    with sqlite3.connect(replica) as connection:
+        connection.execute("INSERT INTO branches (id, name, repository_id) VALUES (1, 'main', 1)")
+        connection.execute("INSERT INTO commits (id, hash, branch_id) VALUES (1, 'abc123', 1)")
+    response = app.test_client().post("/repositories/1/commits:lookup", json=["abc123"])
+    assert response.status_code == 200
+    assert [commit["hash"] for commit in response.json["found"]] == ["abc123"]
+    assert "Set-Cookie" not in response.headers
+
+# Test: failed writes do not pin the client to the primary
+def test_failed_write_not_sticky(app):
+    response = app.test_client().post("/repositories/99/issues", json={"title": "x", "description": "", "submitter_id": 1})
+    assert response.status_code == 404
+    assert "Set-Cookie" not in response.headers
+
+# Test: writes show up for every client once the copier has replicated them
+def test_background_replication(app, paths):
+    copier = Copier(*paths)
+    copier.start()
+    try:
+        client = app.test_client()
+        for n in range(5):
+            assert new_issue(app.test_client(), f"Issue {n}").status_code == 201
+
+        deadline = time.time() + 5
+        while client.get("/repositories/1/issues/6").status_code == 404:
+            assert time.time() < deadline, "replica never caught up"
+            time.sleep(0.05)
+    finally:
+        copier.stopped.set()
+        copier.join()
+
+# Test: SQLite tuning leaves the journal mode of the read-only replica alone
+def test_replica_tuning_read_only(app, paths):
+    primary, replica = paths
+    tuned = replica_app(primary, replica)
+    with tuned.app_context():
+        with tuned.extensions["replica_engine"].connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+            assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+    tuned.extensions["replica_engine"].dispose()
+
+# Test: without REPLICA_DATABASE_URI there is no replica engine and no sticky cookie
+def test_replica_disabled():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.app_context():
+        db.create_all()
+        assert app.extensions["replica_engine"] is None
+        db.session.add(Repository(name="Test Repo", description="", author_id=1))
+        db.session.commit()
+        response = app.test_client().post("/repositories/1/issues", json={"title": "x", "description": "", "submitter_id": 1})
+        assert response.status_code == 201
+        assert "Set-Cookie" not in response.headers
+        db.drop_all()
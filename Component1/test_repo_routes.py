@@ -86,6 +86,26 @@ def test_select_commit_by_hash_error(client):
     assert response.status_code == 404
     assert response.json["message"] == "Commit not found"
 
+# Test: 3d. Look up many commits by hash - found in request order, unknown hashes apart
+def test_lookup_commits_happy_path(client):
+    response = client.post("/repositories/1/commits:lookup", json=["unknown", "abc123", "abc123"])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["found"] == [client.get("/repositories/1/commits/abc123").get_json()]
+    assert data["missing"] == ["unknown"]
+
+# Test: 3d. Look up many commits by hash - Error: bad body, too many hashes, unknown repository
+def test_lookup_commits_error(client):
+    for body in ({"hashes": ["abc123"]}, [], ["abc123", 7]):
+        response = client.post("/repositories/1/commits:lookup", json=body)
+        assert response.status_code == 400
+    response = client.post("/repositories/1/commits:lookup", json=[f"{n:06x}" for n in range(1001)])
+    assert response.status_code == 413
+    assert response.json["message"] == "Too many hashes: at most 1000"
+    response = client.post("/repositories/99/commits:lookup", json=["abc123"])
+    assert response.status_code == 404
+    assert response.json["message"] == "Repository not found"
+
 
 # Test: 4. List all branches
 def test_list_all_branches_happy_path(client):
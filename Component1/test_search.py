@@ -0,0 +1,76 @@
+import pytest
+from app import create_app
+from models import db, Repository, Issue, Comment
+
+@pytest.fixture
+def client():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        db.session.add_all([
+            Repository(name="Test Repo", description="A test repository", author_id=1),
+            Repository(name="Other Repo", description="Another repository", author_id=1),
+            Issue(repository_id=1, title="Crash on startup", description="The app exits immediately", status="Open", submitter_id=1),
+            Issue(repository_id=1, title="Slow search", description="Searching crashes sometimes", status="Closed", submitter_id=2),
+            Issue(repository_id=1, title="Typo in docs", description="README spelling", status="Open", submitter_id=3),
+            Issue(repository_id=2, title="Crash in other repo", description="", status="Open", submitter_id=1),
+        ])
+        db.session.flush()
+        db.session.add(Comment(issue_id=3, content="Also seen with a crash report attached"))
+        db.session.commit()
+
+        yield app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+def ids(response):
+    return [issue["id"] for issue in response.get_json()["items"]]
+
+# Test: matches in the title rank above matches in the description and comments
+def test_search_ranked(client):
+    response = client.get('/repositories/1/issues/search?q=crash')
+    assert response.status_code == 200
+    assert ids(response) == [1, 2, 3]
+    assert response.get_json()["items"][0] == {"id": 1, "title": "Crash on startup", "status": "Open", "submitter_id": 1}
+
+# Test: every word must match, and results stay within the repository
+def test_search_all_terms(client):
+    assert ids(client.get('/repositories/1/issues/search?q=crash+report')) == [3]
+    assert ids(client.get('/repositories/1/issues/search?q=nothing+matches')) == []
+    assert 4 not in ids(client.get('/repositories/1/issues/search?q=crash'))
+
+# Test: FTS5 syntax in the query is treated as plain words
+def test_search_query_syntax_is_literal(client):
+    response = client.get('/repositories/1/issues/search?q="crash" OR NOT (typo* -"')
+    assert response.status_code == 200
+    assert ids(response) == []
+
+# Test: cursor pagination walks the ranked results in order
+def test_search_cursor(client):
+    first = client.get('/repositories/1/issues/search?q=crash&limit=2').get_json()
+    assert [issue["id"] for issue in first["items"]] == [1, 2]
+    assert first["next_cursor"]
+    second = client.get(f'/repositories/1/issues/search?q=crash&limit=2&after={first["next_cursor"]}').get_json()
+    assert [issue["id"] for issue in second["items"]] == [3]
+    assert second["next_cursor"] is None
+
+# Test: issues and comments created through the routes are searchable immediately
+def test_search_sees_new_rows(client):
+    client.post('/repositories/1/issues', json={"title": "Memory leak", "description": "grows", "submitter_id": 1})
+    assert ids(client.get('/repositories/1/issues/search?q=leak')) == [5]
+    client.post('/repositories/1/issues/3/comments:batch', json=[{"content": "fixed by upgrading tokenizer"}])
+    assert ids(client.get('/repositories/1/issues/search?q=tokenizer')) == [3]
+
+# Test: search errors
+@pytest.mark.parametrize("url, status", [
+    ('/repositories/99/issues/search?q=crash', 404),
+    ('/repositories/1/issues/search', 400),
+    ('/repositories/1/issues/search?q=%20!!', 400),
+    ('/repositories/1/issues/search?q=crash&after=bogus', 400),
+    ('/repositories/1/issues/search?q=crash&limit=0', 400),
+])
+def test_search_errors(client, url, status):
+    assert client.get(url).status_code == status
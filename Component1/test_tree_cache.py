@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from lru import LRUCache
+from models import db, Repository, Branch, Commit, TreeObject
+from tree_cache import ResolvedTree, _size
+from tree_store import write_tree
+
+TREE = {
+    "children": {
+        "README.md": {"content": "# Test Repo"},
+        "src": {"children": {
+            "app.py": {"content": "print('hello')"},
+            "lib": {"children": {"util.py": {"content": "def util(): pass"}}},
+        }},
+    }
+}
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        db.session.add_all([repository, branch_main])
+        db.session.flush()
+        db.session.add(Commit(hash="stored", message="Stored tree", branch_id=1, root_tree_hash=write_tree(TREE)))
+        # A Core INSERT, as rows written before the tree store were; added Commits are converted on flush
+        db.session.execute(insert(Commit), [{"hash": "legacy", "message": "Legacy tree", "branch_id": 1, "tree_structure": TREE}])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+# Test: LRUCache evicts least recently used entries to stay within its byte budget
+def test_lru_cache_evicts_by_bytes():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"  # "b" is now the least recently used
+    cache.put("c", "C", 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "entries": 2, "bytes": 80, "max_bytes": 100}
+
+# Test: LRUCache re-putting a key updates its size; values over budget are not stored
+def test_lru_cache_resize_and_oversized():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", "A", 10)
+    cache.put("a", "A", 60)
+    assert cache.stats()["bytes"] == 60
+    cache.put("huge", "H", 101)
+    assert cache.get("huge") is None
+    assert cache.get("a") == "A"
+
+# Test: a cached legacy tree answers every path without touching the database
+def test_legacy_tree_served_from_cache(app, client, record_queries):
+    assert client.get("/repositories/1/branches/main/commits/legacy/tree").status_code == 200
+    with record_queries() as queries:
+        response = client.get("/repositories/1/branches/main/commits/legacy/tree/src/lib/util.py")
+        assert client.get("/repositories/1/branches/main/commits/legacy/tree/src/missing.py").status_code == 404
+    assert response.get_json() == {"content": "def util(): pass"}
+    assert queries == []
+    stats = app.extensions["tree_cache"].stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+# Test: a stored tree is filled in lazily from the deepest cached path
+def test_stored_tree_filled_lazily(client, record_queries):
+    with record_queries() as queries:
+        client.get("/repositories/1/branches/main/commits/stored/tree/src")
+    assert len(queries) == 2  # commit with root tree, then src
+
+    with record_queries() as queries:
+        response = client.get("/repositories/1/branches/main/commits/stored/tree/src/lib/util.py")
+    assert response.get_json() == {"content": "def util(): pass"}
+    assert len(queries) == 2  # lib and util.py; src comes from the cache
+
+    with record_queries() as queries:
+        client.get("/repositories/1/branches/main/commits/stored/tree/src/lib/util.py")
+    assert queries == []
+
+# Test: threads filling the same entry at once cache each path, and count its size, once
+def test_stored_tree_filled_concurrently(app):
+    with app.app_context():
+        tree = ResolvedTree.from_store(db.session.get(TreeObject, Commit.query.filter_by(hash="stored").one().root_tree_hash))
+    paths = ["src/lib/util.py", "src/app.py", "src/lib", "README.md"] * 4
+    barrier = threading.Barrier(len(paths), timeout=5)
+    nodes = []
+
+    def lookup(path):
+        with app.app_context():
+            barrier.wait()
+            nodes.append(tree.lookup(path)[0])
+
+    threads = [threading.Thread(target=lookup, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert None not in nodes
+    assert sorted(tree.paths) == ["README.md", "src", "src/app.py", "src/lib", "src/lib/util.py"]
+    assert tree.size == _size("", tree.root) + sum(_size(path, node) for path, node in tree.paths.items())
+
+# Test: the byte budget comes from TREE_CACHE_MAX_BYTES
+def test_tree_cache_budget_from_config():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "TREE_CACHE_MAX_BYTES": 1234})
+    assert app.extensions["tree_cache"].max_bytes == 1234
+
+# Test: a missing commit is not cached - Error: commit not found
+def test_missing_commit_not_cached(app, client):
+    response = client.get("/repositories/1/branches/main/commits/unknown/tree/src")
+    assert response.status_code == 404
+    assert response.json["message"] == "Repository, branch, or commit not found"
+    assert app.extensions["tree_cache"].stats()["entries"] == 0
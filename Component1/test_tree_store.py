@@ -0,0 +1,145 @@
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from models import db, Repository, Branch, Commit, TreeObject
+from tree_store import write_tree
+
+TREE_V1 = {
+    "children": {
+        "README.md": {"content": "# Test Repo"},
+        "src": {"children": {
+            "app.py": {"content": "print('v1')"},
+            "lib": {"children": {"util.py": {"content": "def util(): pass"}}},
+        }},
+    }
+}
+
+# Only src/app.py changes between the two commits
+TREE_V2 = {
+    "children": {
+        "README.md": {"content": "# Test Repo"},
+        "src": {"children": {
+            "app.py": {"content": "print('v2')"},
+            "lib": {"children": {"util.py": {"content": "def util(): pass"}}},
+        }},
+    }
+}
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+
+    with app.app_context():
+        db.create_all()
+
+        repository = Repository(name="Test Repo", description="A test repository", author_id=1)
+        branch_main = Branch(name="main", repository_id=1)
+        db.session.add_all([repository, branch_main])
+        db.session.flush()
+        db.session.add(Commit(hash="aaa111", message="First", branch_id=1, root_tree_hash=write_tree(TREE_V1)))
+        db.session.add(Commit(hash="bbb222", message="Second", branch_id=1, root_tree_hash=write_tree(TREE_V2)))
+        # A Core INSERT, as rows written before the tree store were; added Commits are converted on flush
+        db.session.execute(insert(Commit), [{"hash": "ccc333", "message": "Legacy", "branch_id": 1, "tree_structure": TREE_V1}])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+# Test: unchanged nodes are stored once and shared between commits
+def test_write_tree_shares_unchanged_nodes(app):
+    # v1: root, README, src, app.py, lib, util.py; v2 adds new root, src and app.py
+    assert TreeObject.query.count() == 9
+    assert write_tree(TREE_V1) == Commit.query.filter_by(hash="aaa111").one().root_tree_hash
+
+# Test: the top-level tree lists entries without expanding them
+def test_top_level_tree_from_store(client):
+    response = client.get("/repositories/1/branches/main/commits/aaa111/tree")
+    assert response.status_code == 200
+    children = response.get_json()["tree"]["children"]
+    assert set(children) == {"README.md", "src"}
+    assert children["src"]["type"] == "tree"
+    assert children["README.md"]["type"] == "blob"
+    assert "children" not in children["src"]
+
+# Test: a file and a sub-tree resolved from the store
+def test_view_file_or_subtree_from_store(client):
+    response = client.get("/repositories/1/branches/main/commits/bbb222/tree/src/app.py")
+    assert response.status_code == 200
+    assert response.get_json() == {"content": "print('v2')"}
+
+    response = client.get("/repositories/1/branches/main/commits/bbb222/tree/src/lib")
+    assert response.status_code == 200
+    assert set(response.get_json()["children"]) == {"util.py"}
+
+# Test: missing path in a stored tree - Error: file or directory not found
+def test_view_file_or_subtree_from_store_not_found(client):
+    for path in ("src/missing.py", "README.md/child", "src//app.py"):
+        response = client.get(f"/repositories/1/branches/main/commits/aaa111/tree/{path}")
+        assert response.status_code == 404
+        assert response.json["message"] == "File or directory not found"
+
+# Test: only the objects on the requested path are loaded
+def test_view_file_loads_one_object_per_level(client, record_queries):
+    with record_queries() as queries:
+        response = client.get("/repositories/1/branches/main/commits/aaa111/tree/src/lib/util.py")
+    assert response.status_code == 200
+    # commit with its root tree, then src, lib and util.py
+    assert len(queries) == 4
+
+# Test: pack-trees moves legacy trees into the store
+def test_pack_trees_command(app, client):
+    result = app.test_cli_runner().invoke(args=["pack-trees"])
+    assert "Packed 1 commit trees" in result.output
+
+    legacy = Commit.query.filter_by(hash="ccc333").one()
+    assert legacy.tree_structure is None
+    assert legacy.root_tree_hash == Commit.query.filter_by(hash="aaa111").one().root_tree_hash
+    assert TreeObject.query.count() == 9
+
+    response = client.get("/repositories/1/branches/main/commits/ccc333/tree/src/app.py")
+    assert response.get_json() == {"content": "print('v1')"}
+
+# Test: tree responses are the same before and after pack-trees, as their immutable ETags promise
+def test_pack_trees_keeps_responses(app, client):
+    db.session.execute(insert(Commit), [{"hash": "ddd444", "message": "Empty", "branch_id": 1, "tree_structure": {}}])
+    db.session.commit()
+    urls = [f"/repositories/1/branches/main/commits/ccc333/tree{path}" for path in ("", "/src", "/src/lib", "/src/app.py", "/nope")]
+    urls.append("/repositories/1/branches/main/commits/ddd444/tree")
+    before = [(response.status_code, response.get_data(), response.headers.get("ETag"))
+              for response in map(client.get, urls)]
+    assert [status for status, _, _ in before] == [200, 200, 200, 200, 404, 404]
+
+    app.test_cli_runner().invoke(args=["pack-trees"])
+    app.extensions["tree_cache"].clear()
+    after = [(response.status_code, response.get_data(), response.headers.get("ETag"))
+             for response in map(client.get, urls)]
+    assert after == before
+    assert Commit.query.filter_by(hash="ddd444").one().root_tree_hash is None
+
+# Test: a new commit created with a tree_structure is stored as tree objects on flush, sharing them with
+# commits in the same flush and already stored
+def test_new_commit_tree_written_on_flush(app, client):
+    tree_v3 = {"children": {**TREE_V2["children"], "NEWS.md": {"content": "v3"}}}
+    db.session.add_all([
+        Commit(hash="eee555", message="New", branch_id=1, tree_structure=tree_v3),
+        Commit(hash="fff666", message="New again", branch_id=1, tree_structure=tree_v3),
+    ])
+    db.session.commit()
+
+    root_hashes = set()
+    for commit in Commit.query.filter(Commit.hash.in_(["eee555", "fff666"])):
+        root_hashes.add(commit.root_tree_hash)
+        assert commit.tree_structure is None
+    assert len(root_hashes) == 1 and None not in root_hashes
+    # only the new root and NEWS.md; src is shared with bbb222
+    assert TreeObject.query.count() == 11
+    assert "Packed 1 commit trees" in app.test_cli_runner().invoke(args=["pack-trees"]).output
+
+    response = client.get("/repositories/1/branches/main/commits/eee555/tree/src/app.py")
+    assert response.get_json() == {"content": "print('v2')"}
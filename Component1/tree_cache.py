@@ -0,0 +1,101 @@
+"""Per-process cache of resolved commit trees for the tree routes.
+
+Commits are immutable, so a tree resolved once for (repository_id, branch,
+hash) never needs invalidating. Each entry holds the tree's root plus a flat
+path -> node dict, which makes repeated path lookups O(1):
+
+* legacy ``tree_structure`` commits are flattened completely on first use,
+  since the whole JSON blob has been parsed anyway. Their nodes are rendered
+  from the objects ``pack-trees`` would store, so a response is the same
+  before and after packing, as the routes' immutable ETags require;
+* commits in the content-addressed store are filled in lazily, one node per
+  path segment, walking from the deepest path already cached. Request threads
+  share an entry, so new nodes are merged into it under the entry's lock.
+
+Entries live in an LRUCache bounded by TREE_CACHE_MAX_BYTES.
+"""
+import json
+import threading
+
+from flask import current_app
+
+from models import db, TreeObject
+from tree_store import collect_objects, render, render_object
+
+# Rough per-path cost of the dict slot and key, on top of the node's JSON size
+ENTRY_OVERHEAD = 100
+
+def _size(path, node):
+    return len(path) + len(json.dumps(node)) + ENTRY_OVERHEAD
+
+def _flatten(kind, data, prefix, objects, paths):
+    if kind != "tree":
+        return
+    for name, entry in data["entries"].items():
+        path = f"{prefix}/{name}" if prefix else name
+        child_kind, child_data = objects[entry["hash"]]
+        paths[path] = render_object(child_kind, child_data)
+        _flatten(child_kind, child_data, path, objects, paths)
+
+class ResolvedTree:
+    def __init__(self, root, paths, size, lazy):
+        self.root = root
+        self.paths = paths
+        self.size = size
+        self.lazy = lazy
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_legacy(cls, tree_structure):
+        objects = {}
+        kind, data = objects[collect_objects(tree_structure, objects)]
+        root = render_object(kind, data)
+        paths = {}
+        _flatten(kind, data, "", objects, paths)
+        size = _size("", root) + sum(_size(path, node) for path, node in paths.items())
+        return cls(root, paths, size, lazy=False)
+
+    @classmethod
+    def from_store(cls, root_object):
+        root = render(root_object)
+        return cls(root, {}, _size("", root), lazy=True)
+
+    def lookup(self, path):
+        """The node at `path`, or None. Returns (node, grew) where grew means new paths were cached."""
+        if path in self.paths or not self.lazy:
+            return self.paths.get(path), False
+
+        segments = path.split('/')
+        # Start from the deepest ancestor that is already cached
+        depth = len(segments) - 1
+        while depth > 0 and '/'.join(segments[:depth]) not in self.paths:
+            depth -= 1
+        node = self.paths['/'.join(segments[:depth])] if depth else self.root
+
+        # Resolved outside the lock, then merged, so other threads only wait for the merge
+        found = {}
+        for index in range(depth, len(segments)):
+            children = node.get("children") if isinstance(node, dict) else None
+            entry = children.get(segments[index]) if isinstance(children, dict) else None
+            if entry is None:
+                node = None
+                break
+            obj = db.session.get(TreeObject, entry["hash"])
+            if obj is None:
+                node = None
+                break
+            node = render(obj)
+            found['/'.join(segments[:index + 1])] = node
+
+        grew = False
+        with self._lock:
+            for child_path, child in found.items():
+                # Another thread may have cached the same path meanwhile
+                if child_path not in self.paths:
+                    self.paths[child_path] = child
+                    self.size += _size(child_path, child)
+                    grew = True
+        return node, grew
+
+def tree_cache():
+    return current_app.extensions['tree_cache']
@@ -0,0 +1,107 @@
+"""Content-addressed storage for commit trees.
+
+A commit's ``tree_structure`` is a nested dict: directories carry a
+``children`` mapping, anything else is a file node. ``write_tree`` splits it
+into one ``TreeObject`` per node, keyed by the SHA-1 of the node's canonical
+JSON, so unchanged directories and files are shared between commits instead
+of being copied into every commit row. A tree object stores its own
+attributes plus ``{name: {"type", "hash"}}`` for its entries, which lets a
+path be resolved, and a directory listed, without loading anything below it.
+
+New commits created with a ``tree_structure`` are written to the store when
+they are flushed, and keep only ``root_tree_hash``; ``pack-trees`` converts
+the commits stored before that.
+"""
+import hashlib
+import json
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, null, select
+from sqlalchemy.orm import undefer
+
+from database import RoutingSession
+from models import db, Commit, TreeObject
+
+# Number of hashes checked per IN query when writing a tree
+LOOKUP_CHUNK = 500
+
+def object_hash(kind, data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(f"{kind}\0{payload}".encode()).hexdigest()
+
+def collect_objects(node, objects):
+    """Add {hash: (kind, data)} for every node of a nested tree to `objects`; return the root hash."""
+    if isinstance(node, dict) and isinstance(node.get("children"), dict):
+        entries = {}
+        for name, child in node["children"].items():
+            child_hash = collect_objects(child, objects)
+            entries[name] = {"type": objects[child_hash][0], "hash": child_hash}
+        attrs = {key: value for key, value in node.items() if key != "children"}
+        kind, data = "tree", {"attrs": attrs, "entries": entries}
+    else:
+        kind, data = "blob", node
+    digest = object_hash(kind, data)
+    objects[digest] = (kind, data)
+    return digest
+
+def write_tree(node):
+    """Add the objects for a nested tree to the session, skipping ones already stored; return the root hash."""
+    objects = {}
+    root_hash = collect_objects(node, objects)
+
+    # The lookup autoflushes, so objects added by earlier calls count as stored;
+    # during a flush it does not, so pending objects are checked as well
+    hashes = list(objects)
+    existing = {obj.hash for obj in db.session.new if isinstance(obj, TreeObject)}
+    for start in range(0, len(hashes), LOOKUP_CHUNK):
+        chunk = hashes[start:start + LOOKUP_CHUNK]
+        existing.update(db.session.scalars(select(TreeObject.hash).where(TreeObject.hash.in_(chunk))))
+
+    for digest, (kind, data) in objects.items():
+        if digest not in existing:
+            db.session.add(TreeObject(hash=digest, kind=kind, data=data))
+    return root_hash
+
+@event.listens_for(RoutingSession, 'before_flush')
+def store_new_trees(session, flush_context, instances):
+    for commit in [obj for obj in session.new if isinstance(obj, Commit)]:
+        if commit.root_tree_hash is None and commit.tree_structure:
+            commit.root_tree_hash = write_tree(commit.tree_structure)
+            # SQL NULL rather than a JSON 'null', as in pack-trees
+            commit.tree_structure = null()
+
+def render_object(kind, data):
+    """A blob's file node, or a tree's attributes with its entries listed one level deep."""
+    if kind == "blob":
+        return data
+    return {
+        **data["attrs"],
+        "children": {name: dict(entry) for name, entry in data["entries"].items()}
+    }
+
+def render(obj):
+    return render_object(obj.kind, obj.data)
+
+
+@click.command('pack-trees')
+@click.option('--batch-size', default=100, show_default=True, help="Commits converted per transaction.")
+@with_appcontext
+def pack_trees_command(batch_size):
+    """Move legacy tree_structure blobs into the content-addressed tree store."""
+    packed = 0
+    while True:
+        commits = Commit.query.filter(
+            Commit.root_tree_hash.is_(None), Commit.tree_structure.isnot(None)
+        ).options(undefer(Commit.tree_structure)).order_by(Commit.id).limit(batch_size).all()
+        if not commits:
+            break
+        for commit in commits:
+            # An empty tree_structure has no tree to serve, before packing or after
+            if commit.tree_structure:
+                commit.root_tree_hash = write_tree(commit.tree_structure)
+            # SQL NULL rather than a JSON 'null', so the row is not selected again
+            commit.tree_structure = null()
+        db.session.commit()
+        packed += len(commits)
+    click.echo(f"Packed {packed} commit trees")
@@ -0,0 +1,105 @@
+"""Concurrent VirtualPairAssistant streams each server mode sustains.
+
+Usage: python benchmarks/bench_streams.py [--modes sync async] [--streams 5 10 20 100 1000] [--timeout 5]
+
+For each mode a server is started on a free port. At each level, that many
+conversations are opened at once; each sends its first request and then stays
+open. A stream counts as sustained if its first reply arrives within
+`--timeout` seconds while the others are held open. All conversations are then
+ended before the next level.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
+
+import grpc
+from ai_assistant_pb2 import ConversationContext, ConversationRequest
+import ai_assistant_pb2_grpc
+
+SERVER = os.path.join(os.path.dirname(__file__), '../server/server.py')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+def start_server(mode, port):
+    process = subprocess.Popen(
+        [sys.executable, SERVER, "--mode", mode, "--port", str(port), "--cache-report-interval", "0"],
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("localhost", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+async def conversation(stub, number, hold, timeout):
+    """Whether the first reply came within `timeout`; the stream stays open until `hold` is set."""
+    requests = asyncio.Queue()
+    await requests.put(ConversationRequest(context = ConversationContext(description = f"conversation {number}")))
+
+    async def request_iterator():
+        while True:
+            request = await requests.get()
+            yield request
+            if request.is_end:
+                return
+
+    call = stub.VirtualPairAssistant(request_iterator())
+    try:
+        await asyncio.wait_for(call.read(), timeout)
+        answered = True
+    except asyncio.TimeoutError:
+        answered = False
+    await hold.wait()
+    await requests.put(ConversationRequest(is_end = True))
+    if not answered:
+        call.cancel()
+    return answered
+
+async def sustained_streams(stub, streams, timeout):
+    hold = asyncio.Event()
+    tasks = [asyncio.create_task(conversation(stub, number, hold, timeout)) for number in range(streams)]
+    # Everyone has had `timeout` seconds to get a first reply
+    await asyncio.sleep(timeout)
+    hold.set()
+    return sum(await asyncio.gather(*tasks))
+
+# grpc.aio stays bound to the first event loop it runs on, so every level and
+# mode shares this one
+async def run(args):
+    print(f"{'mode':>6} {'open':>6} {'sustained':>10}")
+    for mode in args.modes:
+        port = free_port()
+        process = start_server(mode, port)
+        try:
+            async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+                for streams in args.streams:
+                    sustained = await sustained_streams(stub, streams, args.timeout)
+                    print(f"{mode:>6} {streams:>6} {sustained:>10}", flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--streams", nargs="+", type=int, default=[5, 10, 20, 100, 1000])
+    parser.add_argument("--timeout", type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""RPC throughput as supervisor.py runs more worker processes on one port.
+
+Usage: python benchmarks/bench_workers.py [--processes 1 2 4 8] [--clients 8] [--threads 4] [--duration 10] [--payload-bytes 1024]
+
+At each level the supervisor is started with that many workers and the response
+cache off, so every RPC is answered by server code. `--clients` processes, each
+running `--threads` threads with a connection of their own, call
+SmartAutoComplete with distinct requests for `--duration` seconds. Throughput
+grows with the workers until the machine's cores, or the clients, run out; on a
+machine with fewer cores than workers it stays flat.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
+
+import grpc
+from ai_assistant_pb2 import Context, SmartAutoCompleteRequest
+import ai_assistant_pb2_grpc
+
+SUPERVISOR = os.path.join(os.path.dirname(__file__), '../server/supervisor.py')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+def start_supervisor(processes, port):
+    process = subprocess.Popen(
+        [sys.executable, "-u", SUPERVISOR, "--processes", str(processes), "--port", str(port),
+         "--cache-max-bytes", "0", "--cache-report-interval", "0", "--grace", "1"],
+        stdout=subprocess.PIPE, text=True
+    )
+    serving = 0
+    for line in process.stdout:
+        if "is serving" in line:
+            serving += 1
+            if serving == processes:
+                break
+    # Keep reading so that the supervisor never blocks on a full pipe
+    threading.Thread(target=process.stdout.read, daemon=True).start()
+    return process
+
+def client(port, client_number, threads, duration, payload_bytes, start, results):
+    def worker(thread_number):
+        # A connection per thread, so the kernel can hand each to a different worker
+        channel = grpc.insecure_channel(f"localhost:{port}", options=[("grpc.use_local_subchannel_pool", 1)])
+        stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+        payload = "x" * payload_bytes
+        stub.SmartAutoComplete(SmartAutoCompleteRequest(), wait_for_ready=True)
+        start.wait()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            stub.SmartAutoComplete(SmartAutoCompleteRequest(
+                current_context=Context(repo_content=payload),
+                recent_edits=f"{client_number} {thread_number} {counts[thread_number]}"
+            ))
+            counts[thread_number] += 1
+        channel.close()
+
+    counts = [0] * threads
+    pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(sum(counts))
+
+def throughput(port, args):
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    clients = [context.Process(target=client, args=(port, number, args.threads, args.duration, args.payload_bytes, start, results))
+               for number in range(args.clients)]
+    for process in clients:
+        process.start()
+    # Give every client time to connect before the clock starts
+    time.sleep(2)
+    start.set()
+    total = sum(results.get() for _ in clients)
+    for process in clients:
+        process.join()
+    return total / args.duration
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--payload-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.clients} clients x {args.threads} threads")
+    print(f"{'workers':>8} {'RPCs/s':>9} {'speedup':>8}")
+    base = None
+    for processes in args.processes:
+        port = free_port()
+        supervisor = start_supervisor(processes, port)
+        try:
+            rate = throughput(port, args)
+        finally:
+            supervisor.send_signal(signal.SIGTERM)
+            supervisor.wait()
+        base = base or rate
+        print(f"{processes:>8} {rate:>9.0f} {rate / base:>7.2f}x", flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+# Cache of RPC responses for methods whose answer depends only on the request.
+#
+# Entries are keyed by a digest of the method name and the deterministically
+# serialized request, and hold the serialized response, so the byte budget
+# counts what is actually stored. An entry lives for ttl_seconds; when the
+# cache is over max_bytes the least recently used entries are dropped.
+#
+# Safe to share between the server's worker threads. Identical requests that
+# arrive while the first one is still being answered wait for that answer
+# instead of computing it again.
+class ResponseCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=300, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, data)
+        self._bytes = 0
+        self._in_flight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(method, request):
+        data = request.SerializeToString(deterministic=True)
+        return hashlib.blake2b(method.encode() + b"\0" + data, digest_size=16).digest()
+
+    # Must be called with the lock held
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self._bytes -= len(data)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    # Must be called with the lock held
+    def _store(self, key, data):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = (self.clock() + self.ttl_seconds, data)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def get_or_compute(self, method, request, response_class, compute):
+        """The response to `request`: a fresh `response_class` message parsed from the cache, or compute()'s."""
+        key = self.key(method, request)
+        with self._lock:
+            data = self._lookup(key)
+            if data is not None:
+                self.hits += 1
+                return response_class.FromString(data)
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.data is None:
+                # The first caller failed; compute our own answer
+                return compute()
+            with self._lock:
+                self.coalesced += 1
+            return response_class.FromString(flight.data)
+
+        try:
+            response = compute()
+            flight.data = response.SerializeToString()
+            with self._lock:
+                self._store(key, flight.data)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+
+# Invocation metadata with which a client asks for a freshly computed answer. Such
+# RPCs neither read nor fill the cache and are left out of its statistics; the
+# supervisor's health checks send it
+NO_CACHE = ("cache-control", "no-cache")
+
+# Serves a servicer method from self.response_cache (when it is not None).
+# The method must return a `response_class` message that depends only on the request.
+def cached_response(response_class):
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, request, context):
+            cache = self.response_cache
+            if cache is None or (context is not None and NO_CACHE in (context.invocation_metadata() or ())):
+                return method(self, request, context)
+            return cache.get_or_compute(method.__name__, request, response_class, lambda: method(self, request, context))
+        return wrapper
+    return decorate
@@ -1,28 +1,39 @@
 from concurrent import futures
+import asyncio
 import logging
 
 import argparse
+import copy
 
 import grpc
+import hashlib
 import sys
 import os 
-import random
-
-random.seed(7684)
+import signal
+import threading
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
 
 from ai_assistant_pb2 import WritePRDescriptionResponse, Context, SmartAutoCompleteResponse, ChatGPTForCodeResponse, ConversationContext, ConversationResponse
 from ai_assistant_pb2_grpc import AIAssistantServicer
 import ai_assistant_pb2_grpc
+from response_cache import ResponseCache, cached_response
 
-# Generatates a random int from the string in a deterministic manner
+# Generates an int in [min_val, max_val] from the string in a deterministic manner:
+# the string's blake2b digest modulo the size of the range. No shared state, so it
+# is safe in any worker thread, and unlike hash() it gives the same answer in every
+# process, replica and restart
 def generate_random_int_from_str(my_str, min_val, max_val):
-    hash_value = hash(my_str)
-    random.seed(hash_value)
-    return random.randint(min_val, max_val)
+    digest = hashlib.blake2b(my_str.encode(), digest_size=8).digest()
+    return min_val + int.from_bytes(digest, "big") % (max_val - min_val + 1)
 
 class AIAssistantServer(AIAssistantServicer):
+    # WritePRDescription, SmartAutoComplete and ChatGPTForCode answer from
+    # response_cache when one is given (shared by all worker threads)
+    def __init__(self, response_cache=None):
+        self.response_cache = response_cache
+
+    @cached_response(WritePRDescriptionResponse)
     def WritePRDescription(self, request, context):
         predefined_responses = [
             WritePRDescriptionResponse(
@@ -39,6 +50,7 @@ class AIAssistantServer(AIAssistantServicer):
         chosen_response = predefined_responses[generate_random_int_from_str(request.committed_changes, 0, 2)]
         return chosen_response
     
+    @cached_response(SmartAutoCompleteResponse)
     def SmartAutoComplete(self, request, context):
         predefined_responses = [
             # code_completion == "" means there is no plausible completion for the current piece of code
@@ -57,6 +69,7 @@ class AIAssistantServer(AIAssistantServicer):
         chosen_response = predefined_responses[generate_random_int_from_str(concat_str, 0, 2)]
         return chosen_response
     
+    @cached_response(ChatGPTForCodeResponse)
     def ChatGPTForCode(self, request, context):
         predefined_responses = [
             ChatGPTForCodeResponse(
@@ -78,20 +91,6 @@ class AIAssistantServer(AIAssistantServicer):
         return chosen_response
     
     def VirtualPairAssistant(self, request_iterator, context):
-        predefined_responses = [
-            ConversationResponse(
-                proposed_delta = "proposed delta 1",
-                description = "description 1"
-            ),
-            ConversationResponse(
-                proposed_delta = "proposed delta 2",
-                description = "description 2"
-            ),
-            ConversationResponse(
-                proposed_delta = "proposed delta 3",
-                description = "description 3"
-            )
-        ]
         # Since this is a conversation, the ai must take account previous
         # requests when forming a response
         previous_context = ""
@@ -99,29 +98,221 @@ class AIAssistantServer(AIAssistantServicer):
             # If end reached, terminate this service
             if request.is_end == True:
                 break
-            # Use provided context and previous context to determine response
-            concat_str = previous_context + request.context.existing_code + request.context.stack_trace + request.context.description
-            chosen_response = predefined_responses[generate_random_int_from_str(concat_str, 0, 2)]
-            previous_context = concat_str
+            chosen_response, previous_context = conversation_response(previous_context, request)
+            yield chosen_response
+
+# The reply to one request of a VirtualPairAssistant conversation, and the context
+# to carry to the next request
+def conversation_response(previous_context, request):
+    predefined_responses = [
+        ConversationResponse(
+            proposed_delta = "proposed delta 1",
+            description = "description 1"
+        ),
+        ConversationResponse(
+            proposed_delta = "proposed delta 2",
+            description = "description 2"
+        ),
+        ConversationResponse(
+            proposed_delta = "proposed delta 3",
+            description = "description 3"
+        )
+    ]
+    # Use provided context and previous context to determine response
+    concat_str = previous_context + request.context.existing_code + request.context.stack_trace + request.context.description
+    chosen_response = predefined_responses[generate_random_int_from_str(concat_str, 0, 2)]
+    return chosen_response, concat_str
+
+# The same service as coroutines, for the grpc.aio server. An open conversation
+# then costs a suspended coroutine instead of a worker thread, so the number of
+# concurrent VirtualPairAssistant streams is not capped by the thread pool.
+# The unary answers go through the response cache, whose lock and wait for an
+# identical request in flight block, so the thread versions compute them on the
+# loop's default executor rather than on the event loop
+class AsyncAIAssistantServer(AIAssistantServer):
+    async def WritePRDescription(self, request, context):
+        return await asyncio.to_thread(AIAssistantServer.WritePRDescription, self, request, context)
+
+    async def SmartAutoComplete(self, request, context):
+        return await asyncio.to_thread(AIAssistantServer.SmartAutoComplete, self, request, context)
+
+    async def ChatGPTForCode(self, request, context):
+        return await asyncio.to_thread(AIAssistantServer.ChatGPTForCode, self, request, context)
+
+    async def VirtualPairAssistant(self, request_iterator, context):
+        previous_context = ""
+        async for request in request_iterator:
+            if request.is_end == True:
+                break
+            chosen_response, previous_context = conversation_response(previous_context, request)
             yield chosen_response
 
 
-def serve(host, port):
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    ai_assistant_pb2_grpc.add_AIAssistantServicer_to_server(AIAssistantServer(), server)
+# Prints the cache's hit ratio every `interval` seconds
+def report_cache_stats(cache, interval, stopped):
+    while not stopped.wait(interval):
+        stats = cache.stats()
+        print(f"Response cache: {stats['hit_ratio']:.1%} hit ratio ({stats['hits']} hits, {stats['coalesced']} coalesced, "
+              f"{stats['misses']} misses), {stats['entries']} entries, {stats['bytes']} bytes")
+
+# How a server process is tuned; the defaults suit one process per machine
+class ServerSettings:
+    def __init__(self, workers=10, maximum_concurrent_rpcs=None, keepalive_time=7200, keepalive_timeout=20,
+                 max_receive_message_bytes=64 * 1024 * 1024, max_send_message_bytes=64 * 1024 * 1024,
+                 compression="none", reuse_port=False, grace=10):
+        # Threads of the sync server; each open RPC, streams included, holds one
+        self.workers = workers
+        # RPCs in progress before new ones are refused with RESOURCE_EXHAUSTED; None for no limit
+        self.maximum_concurrent_rpcs = maximum_concurrent_rpcs
+        # Seconds between keepalive pings to a client, and to wait for the answer before dropping the connection
+        self.keepalive_time = keepalive_time
+        self.keepalive_timeout = keepalive_timeout
+        # gRPC's own limit is 4 MB, too small for the repo_content of SmartAutoComplete requests
+        self.max_receive_message_bytes = max_receive_message_bytes
+        self.max_send_message_bytes = max_send_message_bytes
+        # Compression of responses unless an RPC chooses otherwise: "none", "deflate" or "gzip"
+        self.compression = compression
+        # Let several server processes bind the same port; the kernel spreads connections between them
+        self.reuse_port = reuse_port
+        # Seconds RPCs in progress get to finish after SIGTERM; new ones are refused meanwhile
+        self.grace = grace
+
+    def grpc_options(self):
+        return [
+            ("grpc.keepalive_time_ms", int(self.keepalive_time * 1000)),
+            ("grpc.keepalive_timeout_ms", int(self.keepalive_timeout * 1000)),
+            ("grpc.max_receive_message_length", self.max_receive_message_bytes),
+            ("grpc.max_send_message_length", self.max_send_message_bytes),
+            # gRPC turns SO_REUSEPORT on by default; only share the port when asked to
+            ("grpc.so_reuseport", int(self.reuse_port)),
+        ]
+
+    def grpc_compression(self):
+        return {"none": grpc.Compression.NoCompression, "deflate": grpc.Compression.Deflate, "gzip": grpc.Compression.Gzip}[self.compression]
+
+    @staticmethod
+    def add_arguments(parser):
+        defaults = ServerSettings()
+        parser.add_argument("--workers", type=int, default=defaults.workers, help="Worker threads of the sync server")
+        parser.add_argument("--max-concurrent-rpcs", type=int, default=None, help="RPCs served at once before new ones are refused")
+        parser.add_argument("--keepalive-time", type=float, default=defaults.keepalive_time, help="Seconds between keepalive pings")
+        parser.add_argument("--keepalive-timeout", type=float, default=defaults.keepalive_timeout, help="Seconds to wait for a ping's answer")
+        parser.add_argument("--max-receive-message-bytes", type=int, default=defaults.max_receive_message_bytes)
+        parser.add_argument("--max-send-message-bytes", type=int, default=defaults.max_send_message_bytes)
+        parser.add_argument("--compression", choices=["none", "deflate", "gzip"], default=defaults.compression,
+                            help="Default compression of responses")
+        parser.add_argument("--reuse-port", action="store_true", help="Set SO_REUSEPORT so that several processes can share the port")
+        parser.add_argument("--grace", type=float, default=defaults.grace, help="Seconds to finish RPCs in progress after SIGTERM")
+
+    @staticmethod
+    def from_args(args):
+        return ServerSettings(args.workers, args.max_concurrent_rpcs, args.keepalive_time, args.keepalive_timeout,
+                              args.max_receive_message_bytes, args.max_send_message_bytes, args.compression, args.reuse_port, args.grace)
+
+# health_fd, when given, is a file descriptor open for writing: see add_health_port
+def serve(host, port, cache_max_bytes=64 * 1024 * 1024, cache_ttl=300, cache_report_interval=60, mode="sync", settings=None,
+          health_fd=None):
+    settings = settings or ServerSettings()
+    cache = ResponseCache(cache_max_bytes, cache_ttl) if cache_max_bytes > 0 else None
+    stopped = threading.Event()
+    if cache is not None and cache_report_interval > 0:
+        threading.Thread(target=report_cache_stats, args=(cache, cache_report_interval, stopped), daemon=True).start()
+    try:
+        if mode == "async":
+            asyncio.run(serve_async(host, port, cache, settings, health_fd))
+        else:
+            serve_sync(host, port, cache, settings, health_fd)
+    finally:
+        stopped.set()
+
+# Every RPC, streams included, holds one of the worker threads until it ends
+def create_server(cache, settings):
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=settings.workers),
+        options=settings.grpc_options(),
+        maximum_concurrent_rpcs=settings.maximum_concurrent_rpcs,
+        compression=settings.grpc_compression()
+    )
+    ai_assistant_pb2_grpc.add_AIAssistantServicer_to_server(AIAssistantServer(cache), server)
+    return server
+
+# All RPCs run as coroutines on one event loop; settings.workers does not apply
+def create_async_server(cache, settings):
+    server = grpc.aio.server(
+        options=settings.grpc_options(),
+        maximum_concurrent_rpcs=settings.maximum_concurrent_rpcs,
+        compression=settings.grpc_compression()
+    )
+    ai_assistant_pb2_grpc.add_AIAssistantServicer_to_server(AsyncAIAssistantServer(cache), server)
+    return server
+
+# Settings of the server that answers supervisor.py's health checks on an extra
+# localhost port, which reaches this process alone even when it shares its main
+# port with others. Unlike the main port it never sets SO_REUSEPORT, so no other
+# process can bind it, and it has a thread of its own, so RPCs filling the worker
+# threads do not fail the checks
+def health_settings(settings):
+    health = copy.copy(settings)
+    health.workers = 1
+    health.maximum_concurrent_rpcs = None
+    health.reuse_port = False
+    return health
+
+# The kernel picks the health port; its number is written to the file descriptor health_fd
+def add_health_port(server, health_fd):
+    health_port = server.add_insecure_port("localhost:0")
+    with os.fdopen(health_fd, "w") as pipe:
+        pipe.write(f"{health_port}\n")
+
+# Both serve functions stop on SIGTERM: the server stops accepting RPCs and the
+# ones in progress get settings.grace seconds to finish
+def serve_sync(host, port, cache, settings, health_fd=None):
+    servers = [create_server(cache, settings)]
     server_address = f"{host}:{port}"
-    server.add_insecure_port(server_address)
-    server.start()
+    servers[0].add_insecure_port(server_address)
+    if health_fd is not None:
+        servers.append(create_server(cache, health_settings(settings)))
+        add_health_port(servers[1], health_fd)
+    for server in servers:
+        server.start()
+    def stop(signum, frame):
+        for server in servers:
+            server.stop(settings.grace)
+    signal.signal(signal.SIGTERM, stop)
     print("Server started, listening on " + server_address)
-    server.wait_for_termination()
+    servers[0].wait_for_termination()
 
+async def serve_async(host, port, cache, settings, health_fd=None):
+    servers = [create_async_server(cache, settings)]
+    server_address = f"{host}:{port}"
+    servers[0].add_insecure_port(server_address)
+    if health_fd is not None:
+        servers.append(create_async_server(cache, health_settings(settings)))
+        add_health_port(servers[1], health_fd)
+    for server in servers:
+        await server.start()
+    stop_tasks = []  # the loop keeps only weak references to tasks
+    def drain():
+        for server in servers:
+            stop_tasks.append(asyncio.ensure_future(server.stop(settings.grace)))
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, drain)
+    print("Async server started, listening on " + server_address)
+    await servers[0].wait_for_termination()
 
 if __name__ == "__main__":
     logging.basicConfig()
     parser = argparse.ArgumentParser()
     parser.add_argument("--host", type=str, default="localhost")
     parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--cache-max-bytes", type=int, default=64 * 1024 * 1024, help="Response cache size; 0 disables it")
+    parser.add_argument("--cache-ttl", type=float, default=300, help="Seconds a cached response is served")
+    parser.add_argument("--cache-report-interval", type=float, default=60, help="Seconds between hit ratio reports; 0 disables them")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync",
+                        help="sync: thread pool server; async: grpc.aio server, for many concurrent streams")
+    ServerSettings.add_arguments(parser)
+    parser.add_argument("--health-fd", type=int, default=None,
+                        help="File descriptor to write the number of an extra localhost port reaching only this process to")
     
     args = parser.parse_args()
-    serve(args.host, args.port)
-
+    serve(args.host, args.port, args.cache_max_bytes, args.cache_ttl, args.cache_report_interval, args.mode,
+          ServerSettings.from_args(args), args.health_fd)
@@ -0,0 +1,206 @@
+import argparse
+import logging
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import grpc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
+
+from ai_assistant_pb2 import WritePRDescriptionRequest
+import ai_assistant_pb2_grpc
+from response_cache import NO_CACHE
+
+SERVER = os.path.join(os.path.dirname(__file__), 'server.py')
+
+# One server.py process. Besides the port it shares with the other workers, it
+# listens on a health port of its own, so that health checks reach it and not
+# whichever worker the kernel picks. The worker binds that port itself and
+# writes its number to a pipe
+class Worker:
+    def __init__(self, number, command):
+        self.number = number
+        self.command = command
+        self.process = None
+        self.pipe = None
+        self.health_port = None
+        self.channel = None
+        self.failures = 0
+        self.healthy = False
+        self.crashes = 0  # exits in a row before serving
+        self.next_start = 0
+
+    def start(self):
+        read_fd, write_fd = os.pipe()
+        self.process = subprocess.Popen(self.command + ["--health-fd", str(write_fd)], pass_fds=(write_fd,))
+        os.close(write_fd)
+        self.pipe = read_fd
+        self.health_port = None
+        self.started_at = time.monotonic()
+        self.failures = 0
+        self.healthy = False
+
+    # Opens the channel to the health port once the worker has written it, waiting up to `timeout` seconds
+    def connect(self, timeout):
+        if self.pipe is None:
+            return False
+        if not select.select([self.pipe], [], [], timeout)[0]:
+            return False
+        data = os.read(self.pipe, 16)
+        os.close(self.pipe)
+        self.pipe = None
+        if not data:
+            # The worker exited before binding the port
+            return False
+        self.health_port = int(data)
+        # Reconnect quickly while the worker is still starting instead of gRPC's growing backoff
+        self.channel = grpc.insecure_channel(f"localhost:{self.health_port}", options=[
+            ("grpc.initial_reconnect_backoff_ms", 100),
+            ("grpc.min_reconnect_backoff_ms", 100),
+            ("grpc.max_reconnect_backoff_ms", 1000),
+        ])
+        self.stub = ai_assistant_pb2_grpc.AIAssistantStub(self.channel)
+        return True
+
+    def check(self, timeout):
+        # Any answer within the timeout means the worker is serving. The answer is
+        # computed afresh, so checks neither hit the response cache nor count in its hit ratio
+        deadline = time.monotonic() + timeout
+        if self.channel is None and not self.connect(timeout):
+            return False
+        try:
+            self.stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "health check"),
+                                         timeout=max(deadline - time.monotonic(), 0), metadata=[NO_CACHE],
+                                         wait_for_ready=True)
+        except grpc.RpcError:
+            return False
+        return True
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe)
+            self.pipe = None
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+
+# Runs `processes` workers on one port with SO_REUSEPORT, so the kernel spreads
+# connections between them and the service is not held to the one core a Python
+# process can use.
+#
+# Every `health_interval` seconds each worker answers a health check RPC; after
+# `health_failures` failed checks in a row it is killed and started again, as is
+# a worker that exits. A worker gets `startup_time` seconds to start answering.
+# On SIGTERM (or SIGINT) every worker is sent SIGTERM, stops accepting RPCs and
+# gets `grace` seconds to finish the ones in progress; clients still connected
+# then are disconnected, and a worker still running 5 seconds later is killed.
+class Supervisor:
+    def __init__(self, processes, host, port, server_args=(), health_interval=5, health_timeout=2, health_failures=3,
+                 startup_time=10, grace=10):
+        command = [sys.executable, SERVER, "--host", host, "--port", str(port), "--reuse-port", "--grace", str(grace)]
+        self.workers = [Worker(number, command + list(server_args)) for number in range(processes)]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.health_failures = health_failures
+        self.startup_time = startup_time
+        self.grace = grace
+        self.stopping = threading.Event()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def restart(self, worker, reason):
+        print(f"Worker {worker.number} (pid {worker.process.pid}) {reason}, restarting")
+        if worker.process.poll() is None:
+            worker.process.kill()
+            worker.process.wait()
+        worker.close()
+        # A worker that keeps dying before it serves is started again after 1, 2, 4... up to 30 seconds
+        if not worker.healthy:
+            worker.crashes += 1
+        else:
+            worker.crashes = 0
+        if worker.crashes:
+            worker.next_start = time.monotonic() + min(2 ** (worker.crashes - 1), 30)
+            worker.process = None
+        else:
+            worker.start()
+
+    # Restarts workers that exited; with `health_checks`, also those that stopped answering
+    def check(self, health_checks=True):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is None:
+                if now >= worker.next_start:
+                    worker.start()
+                continue
+            code = worker.process.poll()
+            if code is not None:
+                self.restart(worker, f"exited with code {code}")
+                continue
+            if not health_checks:
+                continue
+            if worker.check(self.health_timeout):
+                if not worker.healthy:
+                    print(f"Worker {worker.number} (pid {worker.process.pid}) is serving")
+                worker.healthy = True
+                worker.failures = 0
+            elif worker.healthy or now - worker.started_at >= self.startup_time:
+                worker.failures += 1
+                if worker.failures >= self.health_failures:
+                    self.restart(worker, f"failed {worker.failures} health checks")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+        self.start()
+        print(f"Supervisor started {len(self.workers)} workers")
+        last_health_check = 0
+        # Exits are noticed within half a second, failed health checks every health_interval
+        while not self.stopping.wait(0.5):
+            health_checks = time.monotonic() - last_health_check >= self.health_interval
+            self.check(health_checks)
+            if health_checks:
+                last_health_check = time.monotonic()
+        self.drain()
+
+    def drain(self):
+        print("Draining workers")
+        running = [worker for worker in self.workers if worker.process is not None]
+        for worker in running:
+            # A worker's shutdown waits for its open connections, this one included
+            worker.close()
+            worker.process.terminate()
+        deadline = time.monotonic() + self.grace + 5
+        for worker in running:
+            try:
+                worker.process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                print(f"Worker {worker.number} (pid {worker.process.pid}) did not stop in time, killing it")
+                worker.process.kill()
+                worker.process.wait()
+        print("All workers stopped")
+
+
+# Options not listed here (--mode, --workers, --cache-max-bytes...) are passed on to every server.py worker
+if __name__ == "__main__":
+    logging.basicConfig()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worker processes; defaults to one per core")
+    parser.add_argument("--health-interval", type=float, default=5, help="Seconds between health checks of each worker")
+    parser.add_argument("--health-timeout", type=float, default=2, help="Seconds a worker has to answer a health check")
+    parser.add_argument("--health-failures", type=int, default=3, help="Failed health checks in a row before a worker is restarted")
+    parser.add_argument("--startup-time", type=float, default=10, help="Seconds a new worker has to start answering")
+    parser.add_argument("--grace", type=float, default=10, help="Seconds workers get to finish RPCs in progress after SIGTERM")
+
+    args, server_args = parser.parse_known_args()
+    Supervisor(args.processes, args.host, args.port, server_args, args.health_interval, args.health_timeout,
+               args.health_failures, args.startup_time, args.grace).run()
@@ -1,6 +1,11 @@
+import argparse
+import asyncio
 import grpc
 import sys
 import os 
+import subprocess
+import threading
+import time
 import pytest
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
@@ -8,7 +13,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
 
 from ai_assistant_pb2 import WritePRDescriptionRequest, Context, SmartAutoCompleteRequest, ChatGPTForCodeRequest, ConversationContext, ConversationRequest
 from ai_assistant_pb2 import WritePRDescriptionResponse, SmartAutoCompleteResponse, ChatGPTForCodeResponse, ConversationResponse
-from server import AIAssistantServer
+from server import AIAssistantServer, AsyncAIAssistantServer, ServerSettings, create_server, generate_random_int_from_str
+from response_cache import ResponseCache
+import ai_assistant_pb2_grpc
 
 # Mocking the grpc context
 class MockContext:
@@ -20,6 +27,8 @@ class MockContext:
         return "Mocked Details"
     def trailing_metadata(self):
         return []
+    def invocation_metadata(self):
+        return ()
 
 # Mock input generator to always return 0 for deterministic results
 @pytest.fixture
@@ -98,4 +107,208 @@ class TestAIAssistantServer:
         assert len(responses) == 1
         assert responses[0].proposed_delta == "proposed delta 1"
 
+# Feeds requests to an async streaming RPC
+async def async_requests(requests):
+    for request in requests:
+        yield request
 
+async def collect(responses):
+    return [response async for response in responses]
+
+class TestAsyncAIAssistantServer:
+    def testUnaryRPCs(self, monkeypatch, mock_random):
+        server = AsyncAIAssistantServer()
+        monkeypatch.setattr("server.generate_random_int_from_str", mock_random)
+
+        response = asyncio.run(server.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc"), MockContext()))
+        assert response.pr_description == "Good PR Descrption"
+        response = asyncio.run(server.SmartAutoComplete(SmartAutoCompleteRequest(recent_edits = "abc"), MockContext()))
+        assert response.code_completion == ""
+        response = asyncio.run(server.ChatGPTForCode(ChatGPTForCodeRequest(task_description = "abc"), MockContext()))
+        assert response.clarification_request == "Description not clear"
+
+    def testCachedAnswersDoNotBlockTheEventLoop(self, monkeypatch):
+        release = threading.Event()
+        def slow_random(my_str, min_val, max_val):
+            release.wait(5)
+            return 0
+        monkeypatch.setattr("server.generate_random_int_from_str", slow_random)
+        server = AsyncAIAssistantServer(ResponseCache())
+
+        async def run():
+            # A slow first answer, and an identical request waiting for it in the cache
+            request = WritePRDescriptionRequest(committed_changes = "abc")
+            calls = [asyncio.create_task(server.WritePRDescription(request, MockContext())) for _ in range(2)]
+            start = time.monotonic()
+            await asyncio.sleep(0.1)
+            elapsed = time.monotonic() - start
+            release.set()
+            return elapsed, await asyncio.gather(*calls)
+
+        elapsed, responses = asyncio.run(run())
+        assert elapsed < 1
+        assert [response.pr_description for response in responses] == ["Good PR Descrption"] * 2
+        assert server.response_cache.stats()["misses"] == 1
+
+    def testSameAnswersAsSyncServer(self):
+        requests = [ChatGPTForCodeRequest(task_description = f"task {n}") for n in range(20)]
+        expected = [AIAssistantServer().ChatGPTForCode(request, MockContext()) for request in requests]
+        server = AsyncAIAssistantServer()
+        assert [asyncio.run(server.ChatGPTForCode(request, MockContext())) for request in requests] == expected
+
+        conversation = [ConversationRequest(context = ConversationContext(description = f"step {n}")) for n in range(5)]
+        expected = list(AIAssistantServer().VirtualPairAssistant(iter(conversation), MockContext()))
+        assert asyncio.run(collect(server.VirtualPairAssistant(async_requests(conversation), MockContext()))) == expected
+
+    def testVirtualPairAssistant(self, monkeypatch, mock_random):
+        server = AsyncAIAssistantServer()
+        monkeypatch.setattr("server.generate_random_int_from_str", mock_random)
+        requests = [
+            ConversationRequest(context = ConversationContext(existing_code = "test_existing_code"), is_end = False),
+            ConversationRequest(is_end = True),
+            ConversationRequest(context = ConversationContext(existing_code = "never read"), is_end = False)
+        ]
+        responses = asyncio.run(collect(server.VirtualPairAssistant(async_requests(requests), MockContext())))
+        assert len(responses) == 1
+        assert responses[0].proposed_delta == "proposed delta 1"
+
+    def testManyOpenConversations(self):
+        # More conversations than the sync server has threads, all open at the same time
+        async def run():
+            server = grpc.aio.server()
+            ai_assistant_pb2_grpc.add_AIAssistantServicer_to_server(AsyncAIAssistantServer(), server)
+            port = server.add_insecure_port("localhost:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                    stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+                    calls = [stub.VirtualPairAssistant() for _ in range(50)]
+                    for n, call in enumerate(calls):
+                        await call.write(ConversationRequest(context = ConversationContext(description = f"conversation {n}")))
+                    first = await asyncio.wait_for(asyncio.gather(*(call.read() for call in calls)), 10)
+                    for call in calls:
+                        await call.write(ConversationRequest(is_end = True))
+                        await call.done_writing()
+                    codes = [await call.code() for call in calls]
+                    return first, codes
+            finally:
+                await server.stop(None)
+
+        first, codes = asyncio.run(run())
+        assert all(response.description for response in first)
+        assert codes == [grpc.StatusCode.OK] * 50
+
+# A started sync server on a free port, and a stub connected to it
+@pytest.fixture
+def start_server():
+    servers = []
+    def start(settings, host = "localhost:0"):
+        server = create_server(None, settings)
+        port = server.add_insecure_port(host)
+        server.start()
+        servers.append(server)
+        channel = grpc.insecure_channel(f"localhost:{port}")
+        return port, ai_assistant_pb2_grpc.AIAssistantStub(channel)
+    yield start
+    for server in servers:
+        server.stop(None)
+
+def large_request(size):
+    return SmartAutoCompleteRequest(current_context = Context(repo_content = "x" * size))
+
+class TestServerSettings:
+    def testLargeRequestsAcceptedByDefault(self, start_server):
+        # Over gRPC's own 4 MB limit
+        _, stub = start_server(ServerSettings())
+        assert isinstance(stub.SmartAutoComplete(large_request(8 * 1024 * 1024)), SmartAutoCompleteResponse)
+
+    def testMaxReceiveMessageBytes(self, start_server):
+        _, stub = start_server(ServerSettings(max_receive_message_bytes = 1024 * 1024))
+        stub.SmartAutoComplete(large_request(1000))
+        with pytest.raises(grpc.RpcError) as error:
+            stub.SmartAutoComplete(large_request(2 * 1024 * 1024))
+        assert error.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+    def testMaximumConcurrentRpcs(self, start_server):
+        _, stub = start_server(ServerSettings(maximum_concurrent_rpcs = 1))
+        # An open conversation takes the only slot
+        requests = threading.Event()
+        def conversation():
+            yield ConversationRequest(context = ConversationContext(description = "open"))
+            requests.wait(10)
+            yield ConversationRequest(is_end = True)
+        responses = stub.VirtualPairAssistant(conversation())
+        next(responses)
+        with pytest.raises(grpc.RpcError) as error:
+            stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc"))
+        assert error.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        requests.set()
+        assert list(responses) == []
+        stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc"))
+
+    def testReusePort(self, start_server):
+        port, _ = start_server(ServerSettings(reuse_port = True))
+        _, stub = start_server(ServerSettings(reuse_port = True), f"localhost:{port}")
+        assert stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc")).pr_description
+
+        port, _ = start_server(ServerSettings())
+        with pytest.raises(RuntimeError):
+            start_server(ServerSettings(), f"localhost:{port}")
+
+    def testCommandLine(self):
+        parser = argparse.ArgumentParser()
+        ServerSettings.add_arguments(parser)
+        settings = ServerSettings.from_args(parser.parse_args(["--workers", "4", "--max-concurrent-rpcs", "100", "--compression", "gzip", "--reuse-port"]))
+        assert (settings.workers, settings.maximum_concurrent_rpcs, settings.compression, settings.reuse_port) == (4, 100, "gzip", True)
+        assert settings.grpc_compression() == grpc.Compression.Gzip
+        assert ("grpc.so_reuseport", 1) in settings.grpc_options()
+        defaults = ServerSettings.from_args(parser.parse_args([]))
+        assert defaults.grpc_options() == ServerSettings().grpc_options()
+
+class TestDeterministicSelector:
+    def testStaysInRange(self):
+        values = {generate_random_int_from_str(f"input {n}", 3, 6) for n in range(1000)}
+        assert values == {3, 4, 5, 6}
+        assert generate_random_int_from_str("anything", 2, 2) == 2
+
+    def testSameAcrossProcesses(self):
+        # hash() would differ between these processes; the selector must not
+        inputs = [f"input {n}" for n in range(20)]
+        expected = [generate_random_int_from_str(value, 0, 1000) for value in inputs]
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1]); sys.path.insert(0, sys.argv[2]);"
+            "from server import generate_random_int_from_str as pick;"
+            f"print([pick(value, 0, 1000) for value in {inputs!r}])"
+        )
+        here = os.path.dirname(__file__)
+        for seed in ("1", "2"):
+            output = subprocess.run(
+                [sys.executable, "-c", script, os.path.join(here, '../protos'), os.path.join(here, '../server')],
+                env={**os.environ, "PYTHONHASHSEED": seed}, capture_output=True, text=True, check=True
+            ).stdout
+            assert output.strip() == str(expected)
+
+    def testDeterministicUnderContention(self):
+        # Every thread asks for the same inputs at once and must get the serial answers
+        inputs = [f"context {n}" * (n % 7 + 1) for n in range(200)]
+        expected = [generate_random_int_from_str(value, 0, 3) for value in inputs]
+        server = AIAssistantServer()
+        requests = [ChatGPTForCodeRequest(task_description = value) for value in inputs]
+        expected_responses = [server.ChatGPTForCode(request, MockContext()) for request in requests]
+
+        start = threading.Barrier(16)
+        mismatches = []
+        def worker():
+            start.wait()
+            for _ in range(20):
+                if [generate_random_int_from_str(value, 0, 3) for value in inputs] != expected:
+                    mismatches.append("selector")
+                if [server.ChatGPTForCode(request, MockContext()) for request in requests] != expected_responses:
+                    mismatches.append("response")
+
+        threads = [threading.Thread(target = worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert mismatches == []
@@ -0,0 +1,190 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from ai_assistant_pb2 import WritePRDescriptionRequest, Context, SmartAutoCompleteRequest, ChatGPTForCodeRequest
+from ai_assistant_pb2 import WritePRDescriptionResponse, SmartAutoCompleteResponse, ChatGPTForCodeResponse
+from response_cache import ResponseCache, NO_CACHE
+from server import AIAssistantServer, ServerSettings, create_server, create_async_server
+import ai_assistant_pb2_grpc
+
+# Clock the tests move by hand
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+# Counts calls to the response generator, always choosing the first response
+@pytest.fixture
+def counting_random(monkeypatch):
+    calls = []
+    def mock_generate_random_int_from_str(my_str, min_val, max_val):
+        calls.append(my_str)
+        return 0
+    monkeypatch.setattr("server.generate_random_int_from_str", mock_generate_random_int_from_str)
+    return calls
+
+def pr_request(changes):
+    return WritePRDescriptionRequest(committed_changes = changes)
+
+def pr_response(text):
+    return lambda: WritePRDescriptionResponse(pr_description = text)
+
+class TestResponseCache:
+    def testRepeatedRequestsAreServedFromCache(self, counting_random):
+        server = AIAssistantServer(ResponseCache())
+        request = SmartAutoCompleteRequest(
+            current_context = Context(repo_content = "repo", curr_branch = "main"),
+            recent_edits = "edit"
+        )
+
+        first = server.SmartAutoComplete(request, None)
+        second = server.SmartAutoComplete(request, None)
+        assert first == second
+        assert len(counting_random) == 1
+
+        server.SmartAutoComplete(SmartAutoCompleteRequest(recent_edits = "other edit"), None)
+        assert len(counting_random) == 2
+        assert server.response_cache.stats()["hit_ratio"] == pytest.approx(1 / 3)
+
+    def testMethodsHaveSeparateEntries(self, counting_random):
+        server = AIAssistantServer(ResponseCache())
+        server.WritePRDescription(pr_request("abc"), None)
+        response = server.ChatGPTForCode(ChatGPTForCodeRequest(task_description = "abc"), None)
+        assert isinstance(response, ChatGPTForCodeResponse)
+        assert response.clarification_request == "Description not clear"
+        assert len(counting_random) == 2
+
+    def testNoCacheWithoutResponseCache(self, counting_random):
+        server = AIAssistantServer()
+        server.WritePRDescription(pr_request("abc"), None)
+        server.WritePRDescription(pr_request("abc"), None)
+        assert len(counting_random) == 2
+
+    def testNoCacheMetadataBypassesCache(self, counting_random):
+        # Over real RPCs, as supervisor.py's health checks send them, to both kinds of server
+        cache = ResponseCache()
+        server = create_server(cache, ServerSettings())
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        try:
+            with grpc.insecure_channel(f"localhost:{port}") as channel:
+                stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+                for _ in range(3):
+                    stub.WritePRDescription(pr_request("health check"), metadata = [NO_CACHE])
+                stub.WritePRDescription(pr_request("health check"))
+        finally:
+            server.stop(None)
+        assert len(counting_random) == 4
+        assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 0
+
+        async def run():
+            server = create_async_server(cache, ServerSettings())
+            port = server.add_insecure_port("localhost:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                    stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+                    await stub.WritePRDescription(pr_request("health check"), metadata = [NO_CACHE])
+                    await stub.WritePRDescription(pr_request("health check"))
+            finally:
+                await server.stop(None)
+        asyncio.run(run())
+        assert len(counting_random) == 5
+        assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+
+    def testCachedResponsesAreCopies(self):
+        cache = ResponseCache()
+        first = cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("Good"))
+        first.pr_description = "changed by the caller"
+        second = cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("Other"))
+        assert second.pr_description == "Good"
+
+    def testEntriesExpireAfterTtl(self):
+        clock = FakeClock()
+        cache = ResponseCache(ttl_seconds = 10, clock = clock)
+        cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("Good"))
+        clock.now = 9.9
+        assert cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("New")).pr_description == "Good"
+        clock.now = 10
+        assert cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("New")).pr_description == "New"
+        assert cache.stats()["expirations"] == 1
+
+    def testLeastRecentlyUsedEvictedOverByteBudget(self):
+        size = len(WritePRDescriptionResponse(pr_description = "x" * 100).SerializeToString())
+        cache = ResponseCache(max_bytes = 2 * size)
+        for name in ("a", "b"):
+            cache.get_or_compute("WritePRDescription", pr_request(name), WritePRDescriptionResponse, pr_response("x" * 100))
+        # Touch "a" so that "b" is the least recently used
+        cache.get_or_compute("WritePRDescription", pr_request("a"), WritePRDescriptionResponse, pr_response("y" * 100))
+        cache.get_or_compute("WritePRDescription", pr_request("c"), WritePRDescriptionResponse, pr_response("x" * 100))
+
+        stats = cache.stats()
+        assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 2 * size, 1)
+        assert cache.get_or_compute("WritePRDescription", pr_request("a"), WritePRDescriptionResponse, pr_response("new")).pr_description == "x" * 100
+        assert cache.get_or_compute("WritePRDescription", pr_request("b"), WritePRDescriptionResponse, pr_response("new")).pr_description == "new"
+
+    def testResponsesLargerThanBudgetAreNotStored(self):
+        cache = ResponseCache(max_bytes = 10)
+        cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("x" * 100))
+        assert cache.stats()["entries"] == 0
+
+    def testFailuresAreNotCached(self):
+        cache = ResponseCache()
+        def fail():
+            raise RuntimeError("model unavailable")
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, fail)
+        assert cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, pr_response("Good")).pr_description == "Good"
+
+    def testConcurrentIdenticalRequestsComputeOnce(self):
+        cache = ResponseCache()
+        calls = []
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return WritePRDescriptionResponse(pr_description = "Good")
+
+        with futures.ThreadPoolExecutor(max_workers = 10) as pool:
+            results = list(pool.map(
+                lambda _: cache.get_or_compute("WritePRDescription", pr_request("abc"), WritePRDescriptionResponse, slow),
+                range(10)
+            ))
+        assert [response.pr_description for response in results] == ["Good"] * 10
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] + stats["coalesced"] == 9
+        assert stats["hit_ratio"] == pytest.approx(0.9)
+
+    def testSharedBetweenThreads(self):
+        cache = ResponseCache(max_bytes = 2000)
+        errors = []
+        def worker(seed):
+            try:
+                for n in range(500):
+                    key = f"request {(seed * 7 + n) % 50}"
+                    response = cache.get_or_compute("WritePRDescription", pr_request(key), WritePRDescriptionResponse, pr_response(key))
+                    assert response.pr_description == key
+            except AssertionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target = worker, args = (seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        stats = cache.stats()
+        assert stats["bytes"] <= 2000
+        assert stats["hits"] + stats["misses"] + stats["coalesced"] == 8 * 500
@@ -0,0 +1,145 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import grpc
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../protos'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
+
+from ai_assistant_pb2 import WritePRDescriptionRequest, ConversationContext, ConversationRequest
+import ai_assistant_pb2_grpc
+from supervisor import Supervisor
+
+SUPERVISOR = os.path.join(os.path.dirname(__file__), '../server/supervisor.py')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def supervisor():
+    supervisors = []
+    def create(processes, server_args = (), **options):
+        supervisor = Supervisor(processes, "localhost", free_port(), ["--cache-report-interval", "0", *server_args], **options)
+        supervisors.append(supervisor)
+        return supervisor
+    yield create
+    for supervisor in supervisors:
+        supervisor.grace = 0
+        supervisor.drain()
+
+# Runs supervisor checks until every worker is serving
+def wait_until_serving(supervisor, timeout = 20):
+    deadline = time.monotonic() + timeout
+    while not all(worker.healthy for worker in supervisor.workers):
+        assert time.monotonic() < deadline, "workers did not start"
+        supervisor.check()
+        time.sleep(0.1)
+
+class TestSupervisor:
+    def testWorkersShareThePort(self, supervisor):
+        supervisor = supervisor(2)
+        supervisor.start()
+        wait_until_serving(supervisor)
+        assert len({worker.process.pid for worker in supervisor.workers}) == 2
+        port = supervisor.workers[0].command[supervisor.workers[0].command.index("--port") + 1]
+        stub = ai_assistant_pb2_grpc.AIAssistantStub(grpc.insecure_channel(f"localhost:{port}"))
+        assert stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc")).pr_description
+
+    def testWorkersReportTheirOwnHealthPorts(self, supervisor):
+        supervisor = supervisor(3)
+        supervisor.start()
+        wait_until_serving(supervisor)
+        ports = {worker.health_port for worker in supervisor.workers}
+        assert len(ports) == 3 and None not in ports
+        # Each health port is bound by its worker alone: no other process can join it
+        for port in ports:
+            with socket.socket() as sock:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                with pytest.raises(OSError):
+                    sock.bind(("localhost", port))
+
+    def testRestartsWorkerThatExits(self, supervisor):
+        supervisor = supervisor(1)
+        supervisor.start()
+        wait_until_serving(supervisor)
+        worker = supervisor.workers[0]
+        old_pid = worker.process.pid
+        worker.process.kill()
+        worker.process.wait()
+
+        supervisor.check()
+        assert worker.process is not None and worker.process.pid != old_pid
+        wait_until_serving(supervisor)
+
+    def testRestartsWorkerThatStopsAnswering(self, supervisor):
+        supervisor = supervisor(1, health_timeout = 0.2, health_failures = 2)
+        supervisor.start()
+        wait_until_serving(supervisor)
+        worker = supervisor.workers[0]
+        hung = worker.process
+        hung.send_signal(signal.SIGSTOP)
+        try:
+            supervisor.check()
+            assert worker.process is hung and worker.failures == 1
+            supervisor.check()
+            assert hung.poll() is not None
+            assert worker.process is not hung
+        finally:
+            if hung.poll() is None:
+                hung.kill()
+        wait_until_serving(supervisor)
+
+    def testBacksOffWorkerThatCrashesOnStartup(self, supervisor):
+        supervisor = supervisor(1, ["--mode", "unknown"])
+        supervisor.start()
+        worker = supervisor.workers[0]
+        worker.process.wait()
+        supervisor.check()
+        # Started again after 1 second, then 2
+        assert worker.process is None and 0 < worker.next_start - time.monotonic() <= 1
+        supervisor.check()
+        assert worker.process is None
+        worker.next_start = 0
+        supervisor.check()
+        worker.process.wait()
+        supervisor.check()
+        assert worker.process is None and 1 < worker.next_start - time.monotonic() <= 2
+
+    def testDrainsOnSigterm(self):
+        port = free_port()
+        process = subprocess.Popen([sys.executable, SUPERVISOR, "--processes", "2", "--port", str(port), "--health-interval", "0.5", "--grace", "2",
+                                    "--cache-report-interval", "0"], stdout = subprocess.PIPE, text = True)
+        try:
+            channel = grpc.insecure_channel(f"localhost:{port}")
+            stub = ai_assistant_pb2_grpc.AIAssistantStub(channel)
+            stub.WritePRDescription(WritePRDescriptionRequest(committed_changes = "abc"), wait_for_ready = True, timeout = 20)
+
+            # A conversation in progress when SIGTERM arrives still finishes
+            stop = [False]
+            def conversation():
+                yield ConversationRequest(context = ConversationContext(description = "first"))
+                while not stop[0]:
+                    time.sleep(0.05)
+                yield ConversationRequest(context = ConversationContext(description = "second"))
+                yield ConversationRequest(is_end = True)
+            responses = stub.VirtualPairAssistant(conversation())
+            next(responses)
+            process.send_signal(signal.SIGTERM)
+            time.sleep(1)
+            stop[0] = True
+            assert len(list(responses)) == 1
+            channel.close()
+
+            output, _ = process.communicate(timeout = 20)
+            assert process.returncode == 0
+            assert "All workers stopped" in output
+        finally:
+            if process.poll() is None:
+                process.kill()